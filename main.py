@@ -10,4 +10,5 @@ from web_service import create_app
 app = create_app()
 
 if __name__ == "__main__":
-    serve(app, host="0.0.0.0", port=5000)
+    # The requests waiting for status changes hold a thread, see max_waiting_requests
+    serve(app, host="0.0.0.0", port=5000, threads=app.project_config.get_server_threads())
@@ -0,0 +1,83 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import sqlite3
+from sqlalchemy import inspect
+from web_service.common import base, session_scope
+from web_service.entities import DocumentEntity
+
+# Schema of the document table of the first version of the web service
+BASELINE_SCHEMA = """
+CREATE TABLE document (
+    id INTEGER NOT NULL,
+    status VARCHAR(255),
+    uploaded_date VARCHAR(255),
+    author VARCHAR(255),
+    creator VARCHAR(255),
+    producer VARCHAR(255),
+    subject VARCHAR(255),
+    title VARCHAR(255),
+    number_of_pages INTEGER,
+    raw_info VARCHAR,
+    content VARCHAR,
+    named_entities VARCHAR,
+    PRIMARY KEY (id)
+)
+"""
+# Schema of the named_entity table before its page column
+NAMED_ENTITY_SCHEMA = """
+CREATE TABLE named_entity (
+    id INTEGER NOT NULL,
+    document_id INTEGER NOT NULL,
+    text VARCHAR(255),
+    type VARCHAR(32),
+    relationship VARCHAR(32),
+    score VARCHAR(32),
+    aws_score FLOAT,
+    begin_offset INTEGER,
+    end_offset INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(document_id) REFERENCES document (id)
+)
+"""
+
+def test_migration_of_the_baseline_schema(tmp_path, monkeypatch):
+    """Test a database created by the first version is migrated, without losing its rows"""
+    path = tmp_path / "database.db"
+    connection = sqlite3.connect(path)
+    connection.execute(BASELINE_SCHEMA)
+    connection.execute(NAMED_ENTITY_SCHEMA)
+    connection.execute(
+        "INSERT INTO document (id, status, title, content) "
+        "VALUES (1, 'SUCCESS', 'Baseline', 'Stored by the first version')"
+    )
+    connection.commit()
+    connection.close()
+
+    monkeypatch.setattr(base, "DATABASE_URL", f"sqlite:///{path}")
+    try:
+        # The second call must not fail on the columns already added
+        base.init_db()
+        base.init_db()
+
+        inspector = inspect(base.get_engine())
+        columns = {column["name"] for column in inspector.get_columns("document")}
+        assert {"content_hash", "page_offsets", "callback_url"} <= columns
+        indexes = {index["name"] for index in inspector.get_indexes("document")}
+        assert "ix_document_content_hash" in indexes
+        assert "page" in {column["name"] for column in inspector.get_columns("named_entity")}
+        indexes = {index["name"] for index in inspector.get_indexes("named_entity")}
+        assert "ix_named_entity_document_id_type" in indexes
+
+        with session_scope() as session:
+            document = session.query(DocumentEntity).get(1)
+            assert document.title == "Baseline"
+            assert document.content == "Stored by the first version"
+            assert document.content_hash is None
+        assert DocumentEntity.find_by_content_hash("0" * 64) is None
+    finally:
+        monkeypatch.undo()
+        base.init_db()
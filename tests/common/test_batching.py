@@ -0,0 +1,50 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import queue
+import time
+from web_service.common.batching import get_batch, iter_batches
+
+def _make_queue(items: list) -> queue.SimpleQueue:
+    """Returns a queue of the items"""
+    source_queue = queue.SimpleQueue()
+    for item in items:
+        source_queue.put(item)
+    return source_queue
+
+def test_get_batch():
+    """Test the batch takes the items already in the queue, up to the batch size"""
+    source_queue = _make_queue([1, 2, 3, 4, 5])
+    assert get_batch(source_queue, 3, 0) == [1, 2, 3]
+    assert get_batch(source_queue, 3, 0) == [4, 5]
+
+    # The None item ends the batch
+    source_queue = _make_queue([1, None, 2])
+    assert get_batch(source_queue, 3, 0) == [1, None]
+
+    # Without item before the timeout, the batch is empty
+    start = time.monotonic()
+    assert get_batch(source_queue, 3, 0) == [2]
+    assert get_batch(source_queue, 3, 0, timeout=0.1) == []
+    assert time.monotonic() - start >= 0.1
+
+def test_iter_batches():
+    """Test the batches are yielded until the None item, without it"""
+    source_queue = _make_queue([1, 2, 3, 4, 5, None, 6])
+    assert list(iter_batches(source_queue, 2, 0)) == [[1, 2], [3, 4], [5]]
+
+    source_queue = _make_queue([1, 2, None])
+    assert list(iter_batches(source_queue, 2, 0)) == [[1, 2]]
+
+def test_iter_batches_with_timeout():
+    """Test an empty batch is yielded when the timeout of the first item expires"""
+    source_queue = _make_queue([1])
+    batches = iter_batches(source_queue, 2, 0, lambda: 0.05)
+    assert next(batches) == [1]
+    assert next(batches) == []
+    source_queue.put(None)
+    assert next(batches) == []
+    assert next(batches, "stopped") == "stopped"
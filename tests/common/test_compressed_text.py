@@ -0,0 +1,58 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+from sqlalchemy import String, func, select, type_coerce
+from web_service.common import CompressedText, compress_rows, session_scope
+from web_service.entities import DocumentEntity
+
+TEXT = "Named Entity Recognition (NER), in Natural Language Processing (NLP). " * 1000
+
+def test_compression_round_trip():
+    """Test the texts are read back unchanged, with each algorithm"""
+    try:
+        for algorithm in ["zlib", "lzma"]:
+            CompressedText.configure(algorithm, 6)
+            value = CompressedText.compress(TEXT)
+            assert isinstance(value, bytes)
+            assert len(value) < len(TEXT) / 10
+            assert CompressedText.decompress(value) == TEXT
+
+        CompressedText.configure("off")
+        assert CompressedText.compress(TEXT) == TEXT
+    finally:
+        CompressedText.configure()
+
+def test_text_values_are_read_as_is():
+    """Test the values stored before the compression are still readable"""
+    assert CompressedText.decompress(TEXT) == TEXT
+    assert CompressedText.decompress(None) is None
+
+def test_compress_rows(app):
+    """Test the migration of the documents stored as text"""
+    document = DocumentEntity(app.project_config)
+    object_id = document.insert()
+    table = DocumentEntity.__table__
+    with session_scope() as session:
+        # The row is written as before the compression
+        session.execute(
+            table.update().where(table.c.id == object_id)
+            .values(content=type_coerce(TEXT, String))
+        )
+        session.commit()
+        assert session.execute(
+            select(func.typeof(table.c.content)).where(table.c.id == object_id)
+        ).scalar() == "text"
+
+        report = compress_rows(session, table, ["content", "named_entities"])
+        assert report["rows"] >= 1
+        assert report["ratio"] > 1
+
+        assert session.execute(
+            select(func.typeof(table.c.content)).where(table.c.id == object_id)
+        ).scalar() == "blob"
+        assert session.execute(
+            select(table.c.content).where(table.c.id == object_id)
+        ).scalar() == TEXT
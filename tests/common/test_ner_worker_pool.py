@@ -0,0 +1,53 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import multiprocessing
+import pytest
+from web_service.common import NerWorkerPool, ResultWriter
+
+class FailingDocument:
+    """Document class whose batch fails after the result of its first document"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def async_ner_batch(self, tasks: list, saved_ids: set):
+        """Save the result of the first document, then fail"""
+        self.save_result(tasks[0][1], "SUCCESS")
+        saved_ids.add(tasks[0][1])
+        raise ValueError("The NER failed")
+
+    def save_result(self, object_id: int, status: str):
+        """Send the result to the writer"""
+        ResultWriter.send(type(self), {"object_id": object_id, "status": status})
+
+@pytest.mark.usefixtures("app")
+def test_error_does_not_overwrite_the_saved_results(tmp_path):
+    """Test a failed batch sets the ERROR of the documents not saved yet only,
+    and removes the files of the batch"""
+    task_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    filenames = [tmp_path / f"{object_id}.pdf" for object_id in (1, 2, 3)]
+    for object_id, filename in enumerate(filenames, 1):
+        filename.write_bytes(b"%PDF-1.4")
+        task_queue.put((FailingDocument, None, filename, object_id))
+    task_queue.put(None)
+    try:
+        # pylint: disable=protected-access
+        NerWorkerPool._work(
+            task_queue, result_queue, multiprocessing.Value("i", 0),
+            multiprocessing.Value("i", 0), batch_size=3, batch_timeout=1
+        )
+    finally:
+        ResultWriter.connect(None)
+
+    results = [result_queue.get(timeout=1)[1] for _ in range(3)]
+    assert results == [
+        {"object_id": 1, "status": "SUCCESS"},
+        {"object_id": 2, "status": "ERROR"},
+        {"object_id": 3, "status": "ERROR"}
+    ]
+    assert not any(filename.exists() for filename in filenames)
@@ -0,0 +1,59 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import multiprocessing
+import time
+from web_service.common import RateLimiter
+
+def test_acquire_paces_the_requests():
+    """Test the requests are limited to the rate"""
+    limiter = RateLimiter(max_rate=20)
+    start = time.monotonic()
+    for _ in range(11):
+        assert limiter.acquire()
+    # The first token is given immediately, then one token every 50 ms
+    assert time.monotonic() - start >= 0.45
+    assert limiter.get_stats()["requests"] == 11
+
+    # Without token, the limiter gives up at the timeout
+    limiter = RateLimiter(max_rate=0.1, min_rate=0.1)
+    assert limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=0.1)
+
+def test_aimd():
+    """Test the rate is halved when throttled, then increases up to the maximum rate"""
+    limiter = RateLimiter(max_rate=10, increase=5, decrease_interval=60)
+    limiter.on_throttle()
+    assert limiter.get_stats()["rate"] == 5
+    # The throttles of the same burst decrease the rate only once
+    limiter.on_throttle()
+    assert limiter.get_stats()["rate"] == 5
+    assert limiter.get_stats()["throttled_requests"] == 2
+
+    limiter.on_success(1000)
+    assert limiter.get_stats()["rate"] == 6
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.get_stats()["rate"] == 10
+    assert limiter.get_stats()["sent_bytes"] == 1000
+
+def _acquire(limiter: RateLimiter):
+    """Acquire tokens in a forked process"""
+    for _ in range(5):
+        limiter.acquire()
+    limiter.on_throttle()
+
+def test_limiter_is_shared_by_the_forked_processes():
+    """Test the processes forked after the creation of the limiter share its state"""
+    limiter = RateLimiter(max_rate=1000)
+    process = multiprocessing.get_context("fork").Process(target=_acquire, args=(limiter,))
+    process.start()
+    process.join(10)
+
+    stats = limiter.get_stats()
+    assert stats["requests"] == 5
+    assert stats["throttled_requests"] == 1
+    assert stats["rate"] == 500
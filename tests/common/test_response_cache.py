@@ -0,0 +1,35 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+from web_service.common import ResponseCache
+
+def test_pending_documents_are_not_cached():
+    """Test only the finished documents are cached"""
+    cache = ResponseCache(1024)
+    response = cache.put(("metadata", 1), "PENDING", '{"id": 1, "status": "PENDING"}')
+
+    assert response.etag is not None
+    assert cache.get(("metadata", 1)) is None
+    cache.put(("metadata", 1), "SUCCESS", '{"id": 1, "status": "SUCCESS"}')
+    assert cache.get(("metadata", 1)).body == b'{"id": 1, "status": "SUCCESS"}'
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+def test_least_recently_used_responses_are_evicted():
+    """Test the total size of the cached bodies stays under the maximum size"""
+    cache = ResponseCache(250)
+    for doc_id in range(3):
+        cache.put(("content", doc_id), "SUCCESS", "x" * 100)
+    # The first response is evicted
+    assert cache.get(("content", 0)) is None
+    assert cache.get(("content", 1)) is not None
+
+    cache.put(("content", 3), "ERROR", "x" * 100)
+    # The second response has been used, so the third one is evicted
+    assert cache.get(("content", 2)) is None
+    assert cache.get(("content", 1)) is not None
+    assert cache.get_stats()["size"] <= 250
+    assert cache.get_stats()["evictions"] == 2
@@ -0,0 +1,68 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+from web_service.common import ResultWriter
+
+class FakeDocument:
+    """Document class recording the written results, the document 2 can't be written"""
+
+    # Results written by each call of write_results()
+    batches = []
+
+    @staticmethod
+    def write_results(_, results: list):
+        """Record the results, or fail if one of them is the SUCCESS of the document 2"""
+        for result in results:
+            if result["object_id"] == 2 and result["status"] == "SUCCESS":
+                raise ValueError("The document 2 can't be written")
+        FakeDocument.batches.append(results)
+
+def _write(results: list, batch_size: int) -> ResultWriter:
+    """Send the results to a writer, then stop the writer after their commit"""
+    FakeDocument.batches = []
+    writer = ResultWriter(batch_size, batch_timeout=1)
+    writer.start()
+    ResultWriter.connect(writer._queue) # pylint: disable=protected-access
+    try:
+        for result in results:
+            assert ResultWriter.send(FakeDocument, result)
+    finally:
+        ResultWriter.connect(None)
+    writer.stop()
+    return writer
+
+def test_results_are_committed_by_batch(app): # pylint: disable=unused-argument
+    """Test the results are written together, in the order of the queue"""
+    writer = _write([{"object_id": object_id, "status": "SUCCESS"} for object_id in (1, 3, 4)], 3)
+
+    assert FakeDocument.batches == [[
+        {"object_id": 1, "status": "SUCCESS"},
+        {"object_id": 3, "status": "SUCCESS"},
+        {"object_id": 4, "status": "SUCCESS"}
+    ]]
+    stats = writer.get_stats()
+    assert stats["batches"] == 1
+    assert stats["committed_results"] == 3
+    assert stats["max_batch_size"] == 3
+    assert stats["max_commit_latency_ms"] >= 0
+
+def test_failed_result_does_not_block_the_batch(app): # pylint: disable=unused-argument
+    """Test a result which can't be written sets the ERROR of its document only"""
+    writer = _write([{"object_id": object_id, "status": "SUCCESS"} for object_id in (1, 2, 3)], 3)
+
+    # The batch failed, so the results are written one by one
+    assert FakeDocument.batches == [
+        [{"object_id": 1, "status": "SUCCESS"}],
+        [{"object_id": 2, "status": "ERROR", "uploaded_date": None}],
+        [{"object_id": 3, "status": "SUCCESS"}]
+    ]
+    stats = writer.get_stats()
+    assert stats["committed_results"] == 2
+    assert stats["failed_results"] == 1
+
+def test_process_without_writer():
+    """Test the results are not sent outside of a worker process"""
+    assert not ResultWriter.send(FakeDocument, {"object_id": 1, "status": "SUCCESS"})
@@ -0,0 +1,53 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import pytest
+from web_service.common import StatusNotifier, TooManySubscribersError
+
+def test_subscribers_receive_their_documents_only():
+    """Test a subscriber is notified of the status of its documents only"""
+    notifier = StatusNotifier()
+    subscriber = notifier.subscribe([1, 2])
+    other_subscriber = notifier.subscribe([2])
+
+    notifier.notify(1, "SUCCESS")
+    notifier.notify(3, "SUCCESS")
+    notifier.notify(2, "ERROR")
+
+    assert subscriber.get_nowait() == (1, "SUCCESS")
+    assert subscriber.get_nowait() == (2, "ERROR")
+    assert subscriber.empty()
+    assert other_subscriber.get_nowait() == (2, "ERROR")
+    assert other_subscriber.empty()
+
+    notifier.unsubscribe(subscriber, [1, 2])
+    notifier.unsubscribe(other_subscriber, [2])
+    assert notifier.get_stats()["waited_documents"] == 0
+
+def test_listeners_receive_all_the_documents():
+    """Test a listener is called with the status changes of all the documents"""
+    notifier = StatusNotifier()
+    notifications = []
+    notifier.add_listener(lambda object_id, status: notifications.append((object_id, status)))
+
+    notifier.notify(1, "SUCCESS")
+    notifier.notify(2, "ERROR")
+
+    assert notifications == [(1, "SUCCESS"), (2, "ERROR")]
+
+def test_max_subscribers():
+    """Test the subscribers over max_subscribers are refused, until a queue is unsubscribed"""
+    notifier = StatusNotifier(max_subscribers=1)
+    subscriber = notifier.subscribe([1])
+    with pytest.raises(TooManySubscribersError):
+        notifier.subscribe([2])
+
+    # A queue unsubscribed twice is counted once
+    notifier.unsubscribe(subscriber, [1])
+    notifier.unsubscribe(subscriber, [1])
+    assert notifier.get_stats()["subscribers"] == 0
+    other_subscriber = notifier.subscribe([2])
+    notifier.unsubscribe(other_subscriber, [2])
@@ -0,0 +1,83 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import json
+from sqlalchemy import String, select, type_coerce
+from web_service.common import CompressedText, session_scope
+from web_service.entities import DocumentBlock, DocumentEntity
+
+CONTENT = "First page. Second page. Third."
+PAGE_OFFSETS = [0, 12, 25]
+
+def test_split():
+    """Test the content is cut at the pages, then every block_size characters"""
+    try:
+        DocumentBlock.configure(10)
+        blocks = DocumentBlock.split(CONTENT, PAGE_OFFSETS)
+        assert [(begin, end) for begin, end, _ in blocks] == [
+            (0, 10), (10, 12), (12, 22), (22, 25), (25, 31)
+        ]
+        assert "".join(CompressedText.decompress(text) for _, _, text in blocks) == CONTENT
+
+        # An empty content is a single empty block
+        blocks = DocumentBlock.split("", PAGE_OFFSETS)
+        assert [(begin, end) for begin, end, _ in blocks] == [(0, 0)]
+    finally:
+        DocumentBlock.configure()
+
+def test_part_decompresses_its_blocks_only(app, monkeypatch):
+    """Test a page or a range is read from the blocks of the part only"""
+    document = DocumentEntity(app.project_config)
+    doc_id = document.insert()
+    try:
+        DocumentBlock.configure(10)
+        document.update(doc_id, content=CONTENT, page_offsets=PAGE_OFFSETS)
+    finally:
+        DocumentBlock.configure()
+
+    decompressed = []
+    decompress = CompressedText.decompress
+    def _decompress(value):
+        decompressed.append(value)
+        return decompress(value)
+    monkeypatch.setattr(CompressedText, "decompress", staticmethod(_decompress))
+
+    part = DocumentEntity.find_content_part(doc_id, page=2)
+    assert part["content"] == "Second page. "
+    assert (part["begin_offset"], part["end_offset"]) == (12, 25)
+    assert len(decompressed) == 2
+
+    part = DocumentEntity.find_content_part(doc_id, begin_offset=6, end_offset=16)
+    assert part["content"] == CONTENT[6:16]
+    assert DocumentEntity.find_content_part(doc_id)["content"] == CONTENT
+
+    # After the end of the content, the part is empty
+    part = DocumentEntity.find_content_part(doc_id, begin_offset=100)
+    assert (part["content"], part["end_offset"]) == ("", 100)
+
+def test_move_contents_to_blocks(app):
+    """Test the contents stored by a previous version are moved to blocks, then copied"""
+    document = DocumentEntity(app.project_config)
+    doc_id = document.insert()
+    table = DocumentEntity.__table__
+    with session_scope() as session:
+        # The content is written as before the blocks
+        session.execute(
+            table.update().where(table.c.id == doc_id)
+            .values(content=type_coerce(CONTENT, String), page_offsets=json.dumps(PAGE_OFFSETS))
+        )
+        session.commit()
+        assert DocumentEntity.find_content_part(doc_id, page=2)["content"] == "Second page. "
+
+        report = DocumentEntity.move_contents_to_blocks(session)
+        assert report["documents"] >= 1
+        assert session.execute(
+            select(table.c.content).where(table.c.id == doc_id)
+        ).scalar() is None
+
+    assert DocumentEntity.find_content_part(doc_id, page=2)["content"] == "Second page. "
+    copy_id = DocumentEntity(app.project_config).clone(doc_id)
+    assert DocumentEntity.find_content_part(copy_id)["content"] == CONTENT
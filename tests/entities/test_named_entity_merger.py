@@ -0,0 +1,58 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+from web_service.entities import NamedEntity, NamedEntityMerger, NamedEntityScoreEnum
+
+def _named_entity(text: str, begin_offset: int, aws_score: float = None):
+    """Returns a NamedEntity with a LOW score"""
+    named_entity = NamedEntity()
+    named_entity.text = text
+    named_entity.begin_offset = begin_offset
+    named_entity.end_offset = begin_offset + len(text)
+    named_entity.score = NamedEntityScoreEnum.LOW
+    if aws_score is not None:
+        named_entity.aws_score = aws_score
+    return named_entity
+
+def test_merge_exact_matches():
+    """Test the named entities found by several services are merged with a higher score"""
+    merged = NamedEntityMerger().merge([
+        [_named_entity("Paris", 0, 0.9), _named_entity("Rennes", 20, 0.8)],
+        [_named_entity("Paris", 0), _named_entity("Rennes", 20), _named_entity("Nantes", 40)],
+        [_named_entity("Paris", 0)]
+    ])
+
+    assert [named_entity.text for named_entity in merged] == ["Paris", "Rennes", "Nantes"]
+    assert [named_entity.score for named_entity in merged] == [
+        NamedEntityScoreEnum.HIGH, NamedEntityScoreEnum.MEDIUM, NamedEntityScoreEnum.LOW
+    ]
+    assert merged[0].aws_score == 0.9
+
+def test_merge_overlapping_spans():
+    """Test the overlapping spans are merged if their overlap is large enough"""
+    named_entities_lists = [
+        [_named_entity("University of Rennes", 10), _named_entity("Jonathan", 50)],
+        [_named_entity("the University of Rennes", 6), _named_entity("Jonathan Cassaing", 50)]
+    ]
+
+    merged = NamedEntityMerger(0.5).merge(named_entities_lists)
+    assert [named_entity.text for named_entity in merged] == [
+        "the University of Rennes", "Jonathan", "Jonathan Cassaing"
+    ]
+    assert merged[0].score == NamedEntityScoreEnum.MEDIUM
+    # "Jonathan" covers less than the half of "Jonathan Cassaing"
+    assert merged[1].score == NamedEntityScoreEnum.LOW
+    assert merged[2].score == NamedEntityScoreEnum.LOW
+
+def test_merge_keeps_begin_offset_order():
+    """Test the merged list is sorted by begin_offset, even with an unsorted input"""
+    merged = NamedEntityMerger(1.0).merge([
+        [_named_entity("Cassaing", 9), _named_entity("Jonathan", 0)],
+        [_named_entity("Jonathan Cassaing", 0)]
+    ])
+
+    assert [named_entity.begin_offset for named_entity in merged] == [0, 0, 9]
+    assert all(named_entity.score == NamedEntityScoreEnum.LOW for named_entity in merged)
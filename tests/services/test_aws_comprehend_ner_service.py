@@ -0,0 +1,191 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import threading
+import time
+import boto3
+import pytest
+from botocore.stub import Stubber
+from web_service.common import RateLimiter
+from web_service.entities import NamedEntityRelationshipEnum, NamedEntityTypeEnum
+from web_service.services import AwsComprehendNerService, IncompleteExtractionError
+from web_service.services import NerResultCache
+
+def _make_client():
+    """Returns a Comprehend client which never connects to AWS"""
+    return boto3.client(
+        service_name="comprehend", region_name="us-east-1",
+        aws_access_key_id="testing", aws_secret_access_key="testing"
+    )
+
+class FakeComprehend:
+    """Comprehend client finding the word 'Cassaing' in each chunk,
+    and counting the concurrent requests"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def batch_detect_entities(self, TextList, LanguageCode): # pylint: disable=invalid-name
+        """Returns the entities of the chunks, after a delay"""
+        assert LanguageCode == "en" and len(TextList) <= 25
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.05)
+        with self.lock:
+            self.in_flight -= 1
+        return {
+            "ResultList": [
+                {"Index": index, "Entities": [{
+                    "Text": "Cassaing", "Type": "PERSON", "Score": 0.99,
+                    "BeginOffset": text.find("Cassaing"),
+                    "EndOffset": text.find("Cassaing") + len("Cassaing")
+                }] if "Cassaing" in text else []}
+                for index, text in enumerate(TextList)
+            ],
+            "ErrorList": []
+        }
+
+def test_extract_with_stubbed_client():
+    """Test the chunks are sent in one batch_detect_entities request"""
+    client = _make_client()
+    service = AwsComprehendNerService(
+        max_bytes_per_request=20, max_in_flight=1, client=client,
+        rate_limiter=RateLimiter(max_rate=1000)
+    )
+    with Stubber(client) as stubber:
+        stubber.add_response(
+            "batch_detect_entities",
+            {
+                "ResultList": [
+                    {"Index": 0, "Entities": []},
+                    {"Index": 1, "Entities": [{
+                        "Text": "Cassaing", "Type": "PERSON", "Score": 0.99,
+                        "BeginOffset": 0, "EndOffset": 8
+                    }]}
+                ],
+                "ErrorList": []
+            },
+            {"TextList": ["Named entities by ", "Cassaing"], "LanguageCode": "en"}
+        )
+        named_entities = service.extract(
+            "Named entities by Cassaing", NamedEntityRelationshipEnum.REFERENCED, 100
+        )
+        stubber.assert_no_pending_responses()
+
+    assert len(named_entities) == 1
+    assert named_entities[0].type == NamedEntityTypeEnum.PERSON
+    assert named_entities[0].relationship == NamedEntityRelationshipEnum.REFERENCED
+    # The offsets are located in the full text, without drift between the chunks
+    assert named_entities[0].begin_offset == 118
+    assert named_entities[0].aws_score == 0.99
+
+def test_extract_throttled():
+    """Test the throttled requests are retried, and slow down the next requests"""
+    client = _make_client()
+    rate_limiter = RateLimiter(max_rate=1000)
+    service = AwsComprehendNerService(client=client, rate_limiter=rate_limiter)
+    with Stubber(client) as stubber:
+        stubber.add_client_error("batch_detect_entities", "ThrottlingException")
+        stubber.add_response(
+            "batch_detect_entities",
+            {"ResultList": [{"Index": 0, "Entities": [{
+                "Text": "Cassaing", "Type": "PERSON", "Score": 0.99,
+                "BeginOffset": 18, "EndOffset": 26
+            }]}], "ErrorList": []}
+        )
+        named_entities = service.extract("Named entities by Cassaing")
+        stubber.assert_no_pending_responses()
+
+    assert [named_entity.text for named_entity in named_entities] == ["Cassaing"]
+    stats = rate_limiter.get_stats()
+    assert stats["requests"] == 2
+    assert stats["throttled_requests"] == 1
+    assert stats["rate"] < 1000
+
+def test_extract_incomplete():
+    """Test the segments whose chunks failed after the retries are reported"""
+    client = _make_client()
+    rate_limiter = RateLimiter(max_rate=1000)
+    service = AwsComprehendNerService(client=client, rate_limiter=rate_limiter, max_retries=1)
+    with Stubber(client) as stubber:
+        # The first segment is found, the chunk of the second one is always throttled
+        stubber.add_response(
+            "batch_detect_entities",
+            {
+                "ResultList": [{"Index": 0, "Entities": []}],
+                "ErrorList": [{"Index": 1, "ErrorCode": "ThrottlingException",
+                               "ErrorMessage": "Rate exceeded"}]
+            }
+        )
+        stubber.add_client_error("batch_detect_entities", "ThrottlingException")
+        with pytest.raises(IncompleteExtractionError) as err:
+            service.extract_batch([
+                ("First segment", NamedEntityRelationshipEnum.QUOTED, 0),
+                ("Second segment", NamedEntityRelationshipEnum.REFERENCED, 20)
+            ])
+        stubber.assert_no_pending_responses()
+
+    assert err.value.incomplete_segments == {1}
+    assert err.value.named_entities_list == [[], []]
+    assert rate_limiter.get_stats()["throttled_requests"] == 2
+
+    # A request refused for another reason is not retried
+    with Stubber(client) as stubber:
+        stubber.add_client_error("batch_detect_entities", "TextSizeLimitExceededException")
+        with pytest.raises(IncompleteExtractionError):
+            service.extract("Named entities by Cassaing")
+        stubber.assert_no_pending_responses()
+
+def test_extract_batch_concurrency():
+    """Test the batches are sent concurrently, at most max_in_flight at once"""
+    client = FakeComprehend()
+    service = AwsComprehendNerService(
+        max_bytes_per_request=30, max_in_flight=3, client=client,
+        rate_limiter=RateLimiter(max_rate=1000)
+    )
+    texts = [" ".join(["Written by Cassaing."] * 100) for _ in range(4)]
+
+    named_entities_list = service.extract_batch(
+        [(text, NamedEntityRelationshipEnum.QUOTED, 0) for text in texts]
+    )
+
+    # 4 texts of 100 chunks, so 16 requests of 25 chunks
+    assert client.requests == 16
+    assert 1 < client.max_in_flight <= 3
+    for text, named_entities in zip(texts, named_entities_list):
+        assert len(named_entities) == 100
+        for named_entity in named_entities:
+            assert text[named_entity.begin_offset:named_entity.end_offset] == "Cassaing"
+
+def test_extract_batch_with_result_cache(tmp_path):
+    """Test the cached chunks are not sent again, and their named entities are located"""
+    client = FakeComprehend()
+    service = AwsComprehendNerService(
+        max_bytes_per_request=30, client=client, rate_limiter=RateLimiter(max_rate=1000),
+        result_cache=NerResultCache(tmp_path / "ner_cache.db")
+    )
+    text = " ".join(["Written by Cassaing."] * 10)
+    service.extract(text)
+    assert client.requests == 1
+
+    # All the chunks are cached, the text is found at another offset of the document
+    named_entities = service.extract(text, NamedEntityRelationshipEnum.REFERENCED, 1000)
+    assert client.requests == 1
+    assert len(named_entities) == 10
+    for named_entity in named_entities:
+        assert text[named_entity.begin_offset - 1000:named_entity.end_offset - 1000] == "Cassaing"
+        assert named_entity.relationship == NamedEntityRelationshipEnum.REFERENCED
+        assert named_entity.aws_score == 0.99
+    assert service.result_cache.get_stats()["hit_ratio"] == 0.5
+
+    # Only the new chunks are sent
+    service.extract(text + " Thanks to Snook.")
+    assert client.requests == 2
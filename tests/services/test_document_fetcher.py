@@ -0,0 +1,82 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from web_service.services.document_fetcher import DocumentFetcher, FetchError
+from web_service.services.document_fetcher import PooledHttpTransport
+
+DOCUMENT = b"%PDF-1.4 my file content" * 100
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Local stub HTTP server, with keep-alive connections"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self): # pylint: disable=invalid-name
+        """Serve the document, a redirection or a 404"""
+        if self.path == "/pdf/article.pdf":
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(DOCUMENT)))
+            self.end_headers()
+            self.wfile.write(DOCUMENT)
+        elif self.path == "/abs/article.pdf":
+            self.send_response(302)
+            self.send_header("Location", "/pdf/article.pdf")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def log_message(self, *args): # pylint: disable=arguments-differ
+        """No logs in the tests"""
+
+@pytest.fixture
+def stub_url():
+    """Start the stub HTTP server, returns its URL"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_fetch(stub_url, tmp_path):
+    """Test the documents are downloaded through one kept-alive connection"""
+    transport = PooledHttpTransport(max_connections_per_host=1)
+    fetcher = DocumentFetcher(tmp_path, transport)
+
+    for _ in range(3):
+        filepath, content_hash = fetcher.fetch(stub_url + "/pdf/article.pdf").result()
+        assert filepath.read_bytes() == DOCUMENT
+        assert content_hash == hashlib.sha256(DOCUMENT).hexdigest()
+        assert filepath.name.endswith("article.pdf")
+
+    stats = fetcher.get_stats()
+    assert stats["completed_downloads"] == 3
+    assert stats["hosts"]["127.0.0.1"]["new_connections"] == 1
+    assert stats["hosts"]["127.0.0.1"]["reused_connections"] == 2
+
+def test_fetch_redirect(stub_url, tmp_path):
+    """Test the redirections are followed"""
+    fetcher = DocumentFetcher(tmp_path)
+    filepath, _ = fetcher.fetch(stub_url + "/abs/article.pdf").result()
+    assert filepath.read_bytes() == DOCUMENT
+
+def test_fetch_errors(stub_url, tmp_path):
+    """Test the incorrect URLs"""
+    fetcher = DocumentFetcher(tmp_path)
+
+    with pytest.raises(FetchError):
+        fetcher.fetch(stub_url + "/missing.pdf").result()
+
+    with pytest.raises(ValueError):
+        fetcher.fetch("ceciestunefichierabsent").result()
+
+    assert fetcher.get_stats()["failed_downloads"] == 2
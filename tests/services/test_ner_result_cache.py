@@ -0,0 +1,82 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import multiprocessing
+from web_service.entities import NamedEntity, NamedEntityTypeEnum, NamedEntityScoreEnum
+from web_service.services import NerResultCache
+
+def _named_entity(text: str, begin_offset: int) -> NamedEntity:
+    """Returns a named entity located from the beginning of its chunk"""
+    return NamedEntity(
+        text, NamedEntityScoreEnum.LOW, 0.5, NamedEntityTypeEnum.PERSON,
+        begin_offset, begin_offset + len(text)
+    )
+
+def test_get_many(tmp_path):
+    """Test the cached named entities are found by service, model version and text"""
+    cache = NerResultCache(tmp_path / "ner_cache.db")
+    assert cache.get_many("spacy", "v1", ["Jonathan Cassaing", "nothing"]) == [None, None]
+
+    cache.put_many(
+        "spacy", "v1", ["Jonathan Cassaing", "nothing"], [[_named_entity("Cassaing", 9)], []]
+    )
+    named_entities_list = cache.get_many("spacy", "v1", ["nothing", "Jonathan Cassaing", "new"])
+    assert named_entities_list[0] == []
+    assert named_entities_list[2] is None
+    named_entity = named_entities_list[1][0]
+    assert named_entity.text == "Cassaing"
+    assert named_entity.type == NamedEntityTypeEnum.PERSON
+    assert named_entity.score == NamedEntityScoreEnum.LOW
+    assert named_entity.aws_score == 0.5
+    assert (named_entity.begin_offset, named_entity.end_offset) == (9, 17)
+    assert named_entity.relationship is None
+
+    # Another model or another service doesn't find the same named entities
+    assert cache.get_many("spacy", "v2", ["Jonathan Cassaing"]) == [None]
+    assert cache.get_many("aws-comprehend", "v1", ["Jonathan Cassaing"]) == [None]
+
+    # The cache is kept on disk
+    cache = NerResultCache(tmp_path / "ner_cache.db")
+    assert cache.get_many("spacy", "v1", ["nothing"]) == [[]]
+
+def test_lru_eviction(tmp_path):
+    """Test the least recently used chunks are removed when the cache is too large"""
+    cache = NerResultCache(tmp_path / "ner_cache.db", max_size=1000)
+    cache.put_many("spacy", "v1", ["first"], [[_named_entity("first", 0)]])
+    cache.put_many("spacy", "v1", ["second"], [[_named_entity("second", 0)]])
+    # The first chunk is used again, so the second one is the least recently used
+    assert cache.get_many("spacy", "v1", ["first"])[0] is not None
+
+    for index in range(100):
+        text = f"text {index}"
+        cache.put_many("spacy", "v1", [text], [[_named_entity(text, 0)]])
+        cache.get_many("spacy", "v1", ["first"])
+
+    assert cache.get_many("spacy", "v1", ["second"]) == [None]
+    assert cache.get_many("spacy", "v1", ["first"])[0] is not None
+    stats = cache.get_stats()
+    assert 0 < stats["size"] <= 1000
+    assert stats["chunks"] < 102
+
+def _lookup(cache: NerResultCache):
+    """Look up the chunks in a forked process"""
+    cache.get_many("spacy", "v1", ["Jonathan Cassaing", "nothing"])
+
+def test_stats_are_shared_by_the_forked_processes(tmp_path):
+    """Test the hit ratio and the saved bytes include the lookups of the forked processes"""
+    cache = NerResultCache(tmp_path / "ner_cache.db")
+    cache.put_many("spacy", "v1", ["Jonathan Cassaing"], [[_named_entity("Cassaing", 9)]])
+    process = multiprocessing.get_context("fork").Process(target=_lookup, args=(cache,))
+    process.start()
+    process.join(10)
+    cache.get_many("spacy", "v1", ["Jonathan Cassaing", "other"])
+
+    stats = cache.get_stats()
+    assert stats["lookups"] == 4
+    assert stats["hits"] == 2
+    assert stats["hit_ratio"] == 0.5
+    assert stats["saved_bytes"] == 2 * len("Jonathan Cassaing")
+    assert stats["chunks"] == 1
@@ -0,0 +1,22 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+from web_service.services import SpacyModelRegistry
+
+def test_pipelines_by_excluded_components():
+    """Test a model loaded without other components is another pipeline"""
+    nlp = SpacyModelRegistry.get("en_core_web_sm", ["parser", "tagger"])
+    assert "parser" not in nlp.pipe_names
+    # The order of the excluded components doesn't matter
+    assert SpacyModelRegistry.get("en_core_web_sm", ["tagger", "parser"]) is nlp
+
+    full_nlp = SpacyModelRegistry.get("en_core_web_sm", [])
+    assert full_nlp is not nlp
+    assert "parser" in full_nlp.pipe_names
+    assert any(
+        stats["model_name"] == "en_core_web_sm" and stats["excluded_components"] == []
+        for stats in SpacyModelRegistry.get_stats()
+    )
@@ -0,0 +1,54 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import hashlib
+import io
+import pytest
+from web_service.services.stream_saver import StreamSaver, FileTooLargeError
+
+def test_save(tmp_path):
+    """Test the stream is saved and hashed chunk by chunk"""
+    content = b"my file content" * 1000
+    filepath = tmp_path / "file.pdf"
+
+    content_hash = StreamSaver(max_size=len(content), chunk_size=100).save(
+        io.BytesIO(content), filepath
+    )
+
+    assert filepath.read_bytes() == content
+    assert content_hash == hashlib.sha256(content).hexdigest()
+
+def test_save_too_large(tmp_path):
+    """Test a stream larger than the maximum size is refused"""
+    filepath = tmp_path / "file.pdf"
+
+    with pytest.raises(FileTooLargeError):
+        StreamSaver(max_size=1000, chunk_size=100).save(io.BytesIO(b"x" * 1001), filepath)
+
+    # The incomplete file is removed
+    assert not filepath.exists()
+
+class FailingStream:
+    """Stream failing after its first chunk, like a client disconnected during an upload"""
+
+    def __init__(self):
+        self.chunks = 0
+
+    def read(self, size: int) -> bytes:
+        """Returns a first chunk, then fails"""
+        self.chunks += 1
+        if self.chunks > 1:
+            raise ConnectionResetError("The client disconnected")
+        return b"x" * size
+
+def test_save_failing_stream(tmp_path):
+    """Test the incomplete file is removed when the stream fails"""
+    filepath = tmp_path / "file.pdf"
+
+    with pytest.raises(ConnectionResetError):
+        StreamSaver(chunk_size=100).save(FailingStream(), filepath)
+
+    assert not filepath.exists()
@@ -0,0 +1,76 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+from web_service.entities import NamedEntity
+from web_service.services.text_chunker import TextChunker, ByteBudgetChunker
+
+def _find_named_entities(chunk_text: str, word: str):
+    """Returns a NamedEntity for each occurrence of word in chunk_text"""
+    named_entities = []
+    index = chunk_text.find(word)
+    while index != -1:
+        named_entity = NamedEntity()
+        named_entity.text = word
+        named_entity.begin_offset = index
+        named_entity.end_offset = index + len(word)
+        named_entities.append(named_entity)
+        index = chunk_text.find(word, index + 1)
+    return named_entities
+
+def test_split():
+    """Test the chunks cover the text and are cut on paragraph boundaries"""
+    text = "\n\n".join(["Paragraph number " + str(i) + " of the document." for i in range(100)])
+    chunks = TextChunker(max_chunk_size=200, overlap=40).split(text)
+
+    assert len(chunks) > 1
+    assert chunks[0].begin_offset == 0
+    assert chunks[-1].end_offset == len(text)
+    for chunk in chunks:
+        assert len(chunk.text) <= 200
+        assert chunk.text == text[chunk.begin_offset:chunk.end_offset]
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # The chunks overlap, and the owned parts are contiguous
+        assert chunk.begin_offset < previous.end_offset
+        assert previous.own_end_offset == chunk.own_begin_offset
+        # The chunks are cut after a paragraph
+        assert previous.text.endswith("\n\n")
+
+def test_rebase():
+    """Test the named entities are located in the full text without duplicates"""
+    text = " ".join(["Jonathan Cassaing wrote page " + str(i) + "." for i in range(200)])
+    chunker = TextChunker(max_chunk_size=500, overlap=100)
+    chunks = chunker.split(text)
+
+    named_entities = chunker.rebase(
+        chunks,
+        [_find_named_entities(chunk.text, "Jonathan Cassaing") for chunk in chunks],
+        10
+    )
+
+    assert len(named_entities) == 200
+    for named_entity in named_entities:
+        begin_offset = named_entity.begin_offset - 10
+        assert text[begin_offset:named_entity.end_offset - 10] == "Jonathan Cassaing"
+    offsets = [named_entity.begin_offset for named_entity in named_entities]
+    assert offsets == sorted(set(offsets))
+
+def test_byte_budget_split():
+    """Test the chunks keep the exact text, within the byte budget, cut after the sentences"""
+    text = " ".join(["Phrase numéro " + str(i) + " du café de Zoë." for i in range(300)])
+    chunks = ByteBudgetChunker(max_chunk_bytes=200).split(text)
+
+    assert len(chunks) > 1
+    assert "".join(chunk.text for chunk in chunks) == text
+    for chunk in chunks:
+        assert len(chunk.text.encode("utf-8")) <= 200
+        assert chunk.text == text[chunk.begin_offset:chunk.end_offset]
+    for chunk in chunks[:-1]:
+        assert chunk.text.endswith(". ")
+
+def test_byte_budget_split_long_words():
+    """Test the words longer than the budget are cut between the characters"""
+    chunks = ByteBudgetChunker(max_chunk_bytes=5).split("🙂🙂🙂aaaaaaaaaaa bb")
+    assert [chunk.text for chunk in chunks] == ["🙂", "🙂", "🙂a", "aaaaa", "aaaaa", " bb"]
@@ -0,0 +1,137 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from web_service.entities import DocumentEntity
+from web_service.services.document_fetcher import PooledHttpTransport
+from web_service.services.webhook_sender import WebhookSender
+
+class StubReceiver(BaseHTTPRequestHandler):
+    """Local stub receiver of the completions, with keep-alive connections
+    The first request to /unavailable fails with a 503 status."""
+    protocol_version = "HTTP/1.1"
+    # Documents received, and number of requests, by path
+    documents = {}
+    requests = {}
+    received = threading.Condition()
+
+    def do_POST(self): # pylint: disable=invalid-name
+        """Receive the completions"""
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with StubReceiver.received:
+            StubReceiver.requests[self.path] = StubReceiver.requests.get(self.path, 0) + 1
+            failed = self.path == "/unavailable" and StubReceiver.requests[self.path] == 1
+            if not failed:
+                StubReceiver.documents.setdefault(self.path, []).extend(body["documents"])
+                StubReceiver.received.notify_all()
+        self.send_response(503 if failed else 204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args): # pylint: disable=arguments-differ
+        """No logs in the tests"""
+
+@pytest.fixture
+def stub_url():
+    """Start the stub receiver, returns its URL"""
+    StubReceiver.documents = {}
+    StubReceiver.requests = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubReceiver)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def wait_for_documents(path: str, number_of_documents: int) -> list:
+    """Wait for the documents received by the stub on a path"""
+    with StubReceiver.received:
+        StubReceiver.received.wait_for(
+            lambda: len(StubReceiver.documents.get(path, [])) >= number_of_documents, timeout=10
+        )
+        return StubReceiver.documents.get(path, [])
+
+def test_completions_are_sent_by_batch(app, stub_url):
+    """Test the completions are sent in one request per callback_url"""
+    sender = WebhookSender(PooledHttpTransport(max_connections_per_host=1), batch_timeout=0.5)
+    sender.start()
+    try:
+        document = DocumentEntity(app.project_config)
+        object_ids = [
+            DocumentEntity(app.project_config).insert(callback_url=stub_url + "/completions")
+            for _ in range(3)
+        ]
+        # A document without callback_url is not sent
+        no_callback_id = DocumentEntity(app.project_config).insert()
+
+        document.update(object_ids[0], "SUCCESS")
+        document.update(object_ids[1], "ERROR")
+        document.update(object_ids[2], "PENDING")
+        document.update(no_callback_id, "SUCCESS")
+        document.update(object_ids[2], "SUCCESS")
+
+        documents = wait_for_documents("/completions", 3)
+        assert documents == [
+            {"id": object_ids[0], "status": "SUCCESS"},
+            {"id": object_ids[1], "status": "ERROR"},
+            {"id": object_ids[2], "status": "SUCCESS"}
+        ]
+        assert StubReceiver.requests["/completions"] == 1
+    finally:
+        sender.stop()
+
+    assert sender.get_stats()["sent_documents"] == 3
+
+def test_failed_requests_are_retried(app, stub_url):
+    """Test a failed request is sent again, on the kept-alive connection"""
+    sender = WebhookSender(
+        PooledHttpTransport(max_connections_per_host=1), batch_timeout=0, retry_delay=0.1
+    )
+    sender.start()
+    try:
+        object_id = DocumentEntity(app.project_config).insert(
+            callback_url=stub_url + "/unavailable"
+        )
+        DocumentEntity(app.project_config).update(object_id, "SUCCESS")
+
+        documents = wait_for_documents("/unavailable", 1)
+        assert documents == [{"id": object_id, "status": "SUCCESS"}]
+        assert StubReceiver.requests["/unavailable"] == 2
+    finally:
+        sender.stop()
+
+    stats = sender.get_stats()
+    assert stats["failed_requests"] == 1
+    assert stats["retried_requests"] == 1
+    assert stats["hosts"]["127.0.0.1"]["new_connections"] == 1
+    assert stats["hosts"]["127.0.0.1"]["reused_connections"] == 1
+
+def test_unreachable_receiver(app):
+    """Test the completions are dropped after the last retry"""
+    sender = WebhookSender(batch_timeout=0, max_retries=2, retry_delay=0.05, timeout=1)
+    sender.start()
+    object_id = DocumentEntity(app.project_config).insert(callback_url="http://127.0.0.1:1/")
+    DocumentEntity(app.project_config).update(object_id, "ERROR")
+    for _ in range(100):
+        if sender.get_stats()["dropped_documents"] == 1:
+            break
+        threading.Event().wait(0.05)
+    sender.stop()
+
+    stats = sender.get_stats()
+    assert stats["dropped_documents"] == 1
+    assert stats["failed_requests"] == 3
+
+def test_is_allowed_url():
+    """Test the callback_url must be public, or allowed by the config file"""
+    assert WebhookSender.is_allowed_url("http://93.184.216.34/completions")
+    for url in ("http://127.0.0.1:8080/", "http://10.0.0.1/", "http://169.254.169.254/",
+                "http://[::1]/", "http://[::ffff:192.168.1.1]/", "http:///completions"):
+        assert not WebhookSender.is_allowed_url(url)
+    assert WebhookSender.is_allowed_url("http://127.0.0.1:8080/", ["127.0.0.1"])
@@ -0,0 +1,369 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import json
+import random
+import textwrap
+import time
+import tracemalloc
+
+import pytest
+from web_service.entities import NamedEntity, NamedEntityEncoder, NamedEntityMerger
+from web_service.entities import NamedEntityRelationshipEnum, NamedEntityScoreEnum
+from web_service.entities import NamedEntityTypeEnum
+from web_service.common import CompressedText
+from web_service.services import Api
+from web_service.services.text_chunker import ByteBudgetChunker
+
+# The timed benchmarks have the "benchmark" marker, they are not run by default
+# (see setup.cfg), run them with: pytest -m benchmark -s tests/test_benchmarks.py
+# The other tests check the results of the same code, on smaller inputs
+
+# Number of named entities of each NER service in the benchmarks
+NUMBER_OF_NAMED_ENTITIES = 50000
+# Number of named entities of each NER service in the tests of the results
+NUMBER_OF_TESTED_NAMED_ENTITIES = 2000
+
+def _legacy_binary_search(named_entities, target_begin_offset):
+    """Binary search of the previous DocumentEntity._merge(), used as baseline"""
+    aaa = 0
+    bbb = len(named_entities)
+    if bbb == 0:
+        return None, None
+    while bbb > aaa + 1:
+        mmm = (aaa + bbb) // 2
+        if named_entities[mmm].begin_offset > target_begin_offset:
+            bbb = mmm
+        else:
+            aaa = mmm
+
+    if named_entities[aaa].begin_offset == target_begin_offset:
+        return aaa, named_entities[aaa]
+
+    if named_entities[aaa].begin_offset > target_begin_offset:
+        nearest_index = aaa
+    else:
+        nearest_index = bbb
+
+    return nearest_index, None
+
+def _legacy_merge(named_entities_1, named_entities_2) -> list:
+    """Previous DocumentEntity._merge(), used as baseline
+    It inserts each named entity of the smallest list in the biggest list (O(n.m))."""
+    if len(named_entities_1) < len(named_entities_2):
+        smallest_list = named_entities_1
+        biggest_list = named_entities_2
+    else:
+        smallest_list = named_entities_2
+        biggest_list = named_entities_1
+
+    for named_entity in smallest_list:
+        index, named_entity_searched = _legacy_binary_search(
+            biggest_list,
+            named_entity.begin_offset
+            )
+        if index is not None:
+            if named_entity_searched is not None \
+                and (named_entity_searched.text == named_entity.text):
+                try:
+                    if named_entity.aws_score is not None:
+                        named_entity_searched.aws_score = named_entity.aws_score
+                except AttributeError:
+                    pass
+                if named_entity_searched.score == NamedEntityScoreEnum.LOW:
+                    named_entity_searched.score = NamedEntityScoreEnum.MEDIUM
+                elif named_entity_searched.score == NamedEntityScoreEnum.MEDIUM:
+                    named_entity_searched.score = NamedEntityScoreEnum.HIGH
+            else:
+                biggest_list.insert(index, named_entity)
+
+    return biggest_list
+
+def _generate_named_entities(seed: int, count: int = NUMBER_OF_NAMED_ENTITIES) -> list:
+    """Returns the sorted named entities of a fake NER service
+    Two services with different seeds find about the half of the same named entities."""
+    randomizer = random.Random(seed)
+    named_entities = []
+    for index in range(count):
+        # The begin offsets are multiple of 20, so the services share some named entities
+        begin_offset = (index * 2 + randomizer.randint(0, 1)) * 20
+        named_entity = NamedEntity()
+        named_entity.text = "Entity " + str(begin_offset)
+        named_entity.begin_offset = begin_offset
+        named_entity.end_offset = begin_offset + len(named_entity.text)
+        named_entity.score = NamedEntityScoreEnum.LOW
+        named_entities.append(named_entity)
+    return named_entities
+
+def _spans(named_entities: list) -> list:
+    """Returns the sorted spans and scores of the named entities"""
+    return sorted(
+        (named_entity.begin_offset, named_entity.end_offset, named_entity.score.name)
+        for named_entity in named_entities
+    )
+
+def test_merge_matches_legacy_merge():
+    """Test the k-way merge gives the named entities of the previous merge"""
+    legacy_merged = _legacy_merge(
+        _generate_named_entities(1, NUMBER_OF_TESTED_NAMED_ENTITIES),
+        _generate_named_entities(2, NUMBER_OF_TESTED_NAMED_ENTITIES)
+    )
+    merged = NamedEntityMerger(1.0).merge([
+        _generate_named_entities(1, NUMBER_OF_TESTED_NAMED_ENTITIES),
+        _generate_named_entities(2, NUMBER_OF_TESTED_NAMED_ENTITIES)
+    ])
+    # With exact matches only, both merges give the same named entities
+    assert _spans(merged) == _spans(legacy_merged)
+
+@pytest.mark.benchmark
+def test_benchmark_merge():
+    """Compare the k-way merge with the previous merge, on 2 x 50k named entities"""
+    named_entities_1 = _generate_named_entities(1)
+    named_entities_2 = _generate_named_entities(2)
+    start = time.perf_counter()
+    legacy_merged = _legacy_merge(named_entities_1, named_entities_2)
+    legacy_duration = time.perf_counter() - start
+
+    # The merges change the scores, so each merge gets its own named entities
+    named_entities_lists = [_generate_named_entities(1), _generate_named_entities(2)]
+    start = time.perf_counter()
+    merged = NamedEntityMerger(1.0).merge(named_entities_lists)
+    duration = time.perf_counter() - start
+
+    print(f"\nMerge of 2 x {NUMBER_OF_NAMED_ENTITIES} named entities: "
+          f"legacy {legacy_duration:.3f} s, k-way {duration:.3f} s")
+    # With exact matches only, both merges give the same named entities
+    assert _spans(merged) == _spans(legacy_merged)
+    assert duration < legacy_duration
+
+class _LegacyNamedEntity:
+    """Previous NamedEntity, with a __dict__, used as baseline"""
+
+class _LegacyNamedEntityEncoder(json.JSONEncoder):
+    """Previous NamedEntityEncoder, probing each field, used as baseline"""
+
+    def default(self, o):
+        if isinstance(o, _LegacyNamedEntity):
+            json_data = {
+                "text": o.text,
+                "begin_offset": o.begin_offset,
+                "end_offset": o.end_offset,
+                "relationship": o.relationship.name
+                }
+            try:
+                json_data["score"] = o.score.name
+            except AttributeError:
+                pass
+            try:
+                json_data["type"] = o.type.name
+            except AttributeError:
+                pass
+            try:
+                json_data["aws_score"] = o.aws_score
+            except AttributeError:
+                pass
+            return json_data
+        return super().default(o)
+
+def _generate_document_named_entities(named_entity_class,
+                                      count: int = NUMBER_OF_NAMED_ENTITIES) -> list:
+    """Returns the named entities of a document, the half of them found by AWS"""
+    named_entities = []
+    for index in range(count):
+        named_entity = named_entity_class()
+        named_entity.text = "Entity " + str(index)
+        named_entity.begin_offset = index * 20
+        named_entity.end_offset = index * 20 + len(named_entity.text)
+        named_entity.type = NamedEntityTypeEnum.PERSON
+        named_entity.score = NamedEntityScoreEnum.LOW
+        named_entity.relationship = NamedEntityRelationshipEnum.QUOTED
+        if index % 2 == 0:
+            named_entity.aws_score = 0.99
+        named_entities.append(named_entity)
+    return named_entities
+
+def _measure_memory(named_entity_class, count: int = NUMBER_OF_NAMED_ENTITIES) -> int:
+    """Returns the memory allocated by the named entities of a document, in bytes"""
+    tracemalloc.start()
+    named_entities = _generate_document_named_entities(named_entity_class, count)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del named_entities
+    return memory
+
+def test_named_entity_memory():
+    """Test the slotted named entities allocate less memory than the previous named entities"""
+    assert _measure_memory(NamedEntity, NUMBER_OF_TESTED_NAMED_ENTITIES) \
+        < _measure_memory(_LegacyNamedEntity, NUMBER_OF_TESTED_NAMED_ENTITIES)
+
+@pytest.mark.benchmark
+def test_benchmark_named_entity_memory():
+    """Compare the memory of the slotted named entities with the previous named entities"""
+    legacy_memory = _measure_memory(_LegacyNamedEntity)
+    memory = _measure_memory(NamedEntity)
+
+    print(f"\nMemory of {NUMBER_OF_NAMED_ENTITIES} named entities: "
+          f"legacy {legacy_memory / 1024 / 1024:.1f} MiB, slotted {memory / 1024 / 1024:.1f} MiB")
+    assert memory < legacy_memory
+
+def test_named_entity_encoding():
+    """Test the JSON of the named entities is the JSON of the previous encoder"""
+    legacy_json = json.dumps(
+        _generate_document_named_entities(_LegacyNamedEntity, NUMBER_OF_TESTED_NAMED_ENTITIES),
+        cls=_LegacyNamedEntityEncoder
+    )
+    encoded_json = json.dumps(
+        _generate_document_named_entities(NamedEntity, NUMBER_OF_TESTED_NAMED_ENTITIES),
+        cls=NamedEntityEncoder
+    )
+    assert encoded_json == legacy_json
+
+@pytest.mark.benchmark
+def test_benchmark_named_entity_encoding():
+    """Compare the JSON encoding of the named entities with the previous encoder"""
+    legacy_named_entities = {
+        "named_entities": _generate_document_named_entities(_LegacyNamedEntity)
+    }
+    start = time.perf_counter()
+    legacy_json = json.dumps(legacy_named_entities, cls=_LegacyNamedEntityEncoder)
+    legacy_duration = time.perf_counter() - start
+
+    named_entities = {"named_entities": _generate_document_named_entities(NamedEntity)}
+    start = time.perf_counter()
+    encoded_json = json.dumps(named_entities, cls=NamedEntityEncoder)
+    duration = time.perf_counter() - start
+
+    print(f"\nEncoding of {NUMBER_OF_NAMED_ENTITIES} named entities: "
+          f"legacy {legacy_duration:.3f} s, slotted {duration:.3f} s")
+    # The API JSON doesn't change. The durations are close, so they are only reported
+    assert encoded_json == legacy_json
+
+# Metadata of the document of the serialization tests
+METADATA = {
+    "id": 1, "status": "SUCCESS", "uploaded_date": "2022-03-21-10-00-00.000000",
+    "author": "Jonathan CASSAING", "creator": None, "producer": None, "subject": None,
+    "title": "Document", "number_of_pages": 10, "raw_info": "{}"
+}
+
+def test_metadata_serialization():
+    """Test the metadata built with the serialized named entities is the JSON
+    of the previous decoding and encoding of the named entities"""
+    named_entities_json = json.dumps(
+        _generate_document_named_entities(NamedEntity, NUMBER_OF_TESTED_NAMED_ENTITIES),
+        cls=NamedEntityEncoder
+    )
+    legacy_data = dict(METADATA)
+    legacy_data["named_entities"] = json.loads(named_entities_json)
+    assert Api.dumps_with_named_entities(METADATA, named_entities_json) \
+        == json.dumps(legacy_data, cls=NamedEntityEncoder)
+
+@pytest.mark.benchmark
+def test_benchmark_metadata_serialization():
+    """Compare the metadata built with the serialized named entities,
+    with the previous decoding and encoding of the named entities"""
+    data = METADATA
+    named_entities_json = json.dumps(
+        _generate_document_named_entities(NamedEntity), cls=NamedEntityEncoder
+    )
+
+    start = time.perf_counter()
+    legacy_data = dict(data)
+    legacy_data["named_entities"] = json.loads(named_entities_json)
+    legacy_json = json.dumps(legacy_data, cls=NamedEntityEncoder)
+    legacy_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    spliced_json = Api.dumps_with_named_entities(data, named_entities_json)
+    duration = time.perf_counter() - start
+
+    print(f"\nMetadata with {NUMBER_OF_NAMED_ENTITIES} named entities: "
+          f"decode/encode {legacy_duration * 1000:.1f} ms, splice {duration * 1000:.1f} ms")
+    # The response doesn't change
+    assert spliced_json == legacy_json
+    assert duration < legacy_duration
+
+def test_payload_compression():
+    """Test the named entities are smaller compressed, and decompressed unchanged,
+    with each algorithm"""
+    named_entities_json = json.dumps(
+        _generate_document_named_entities(NamedEntity, NUMBER_OF_TESTED_NAMED_ENTITIES),
+        cls=NamedEntityEncoder
+    )
+    try:
+        for algorithm in ["zlib", "lzma"]:
+            CompressedText.configure(algorithm, 6)
+            value = CompressedText.compress(named_entities_json)
+            assert len(value) < len(named_entities_json)
+            assert CompressedText.decompress(value) == named_entities_json
+    finally:
+        CompressedText.configure()
+
+@pytest.mark.benchmark
+def test_benchmark_payload_compression():
+    """Report the compression ratio and the decompression time of the named entities,
+    with each algorithm"""
+    named_entities_json = json.dumps(
+        _generate_document_named_entities(NamedEntity), cls=NamedEntityEncoder
+    )
+    try:
+        for algorithm in ["zlib", "lzma"]:
+            CompressedText.configure(algorithm, 6)
+            value = CompressedText.compress(named_entities_json)
+            start = time.perf_counter()
+            decompressed = CompressedText.decompress(value)
+            duration = time.perf_counter() - start
+
+            ratio = len(named_entities_json) / len(value)
+            print(f"\nCompression of {len(named_entities_json) / 1024 / 1024:.1f} MiB of "
+                  f"named entities with {algorithm}: ratio {ratio:.1f}, "
+                  f"decompression {duration * 1000:.1f} ms")
+            assert decompressed == named_entities_json
+            assert len(value) < len(named_entities_json)
+    finally:
+        CompressedText.configure()
+
+def _generate_text(number_of_words: int) -> str:
+    """Returns a text of sentences, with multi-bytes UTF-8 characters"""
+    randomizer = random.Random(3)
+    words = ["Named", "entity", "recognition", "of", "the", "café", "naïve", "Zoë", "日本"]
+    return " ".join(
+        randomizer.choice(words) + randomizer.choice(["", "", "", "", ".", ".\n"])
+        for _ in range(number_of_words)
+    )
+
+def test_byte_budget_chunker_keeps_the_text():
+    """Test the chunks keep the exact text, unlike textwrap.wrap,
+    previously used by the remote NER services"""
+    text = _generate_text(20000)
+    lines = textwrap.wrap(text, 4900, break_long_words=False)
+    chunks = list(ByteBudgetChunker(4900).iter_chunks(text))
+    # textwrap collapses the whitespaces, the chunks keep the exact text
+    assert "".join(lines) != text
+    assert "".join(chunk.text for chunk in chunks) == text
+    assert all(len(chunk.text.encode("utf-8")) <= 4900 for chunk in chunks)
+
+@pytest.mark.benchmark
+def test_benchmark_byte_budget_chunker():
+    """Compare the byte budget chunker with textwrap.wrap, previously used by the remote NER
+    services, on 2 MB of text"""
+    text = _generate_text(400000)
+
+    start = time.perf_counter()
+    lines = textwrap.wrap(text, 4900, break_long_words=False)
+    legacy_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = list(ByteBudgetChunker(4900).iter_chunks(text))
+    duration = time.perf_counter() - start
+
+    print(f"\nChunking of {len(text) / 1000000:.1f} M characters: "
+          f"textwrap {legacy_duration * 1000:.1f} ms ({len(lines)} lines), "
+          f"byte budget {duration * 1000:.1f} ms ({len(chunks)} chunks)")
+    # textwrap collapses the whitespaces, the chunks keep the exact text
+    assert "".join(lines) != text
+    assert "".join(chunk.text for chunk in chunks) == text
+    assert all(len(chunk.text.encode("utf-8")) <= 4900 for chunk in chunks)
+    assert duration < legacy_duration
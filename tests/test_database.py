@@ -0,0 +1,91 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import re
+import threading
+from sqlalchemy import event, text
+from web_service.common import get_engine, session_scope
+from web_service.entities import DocumentEntity
+
+# Number of concurrent writers and readers of the stress test
+NUMBER_OF_WRITERS = 4
+NUMBER_OF_READERS = 8
+# Number of documents written by each writer
+NUMBER_OF_DOCUMENTS = 10
+
+def test_wal_mode(app):
+    """Test the database is in WAL mode, with the pragmas of each connection"""
+    with session_scope() as session:
+        assert session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert session.execute(text("PRAGMA busy_timeout")).scalar() == int(
+            app.project_config.get_db_busy_timeout() * 1000
+        )
+
+def test_concurrent_reads_and_writes(app):
+    """Stress test: the readers are not blocked by the writers of large contents,
+    and all the sessions are released"""
+    errors = []
+    writers_done = threading.Event()
+
+    def write():
+        try:
+            for _ in range(NUMBER_OF_DOCUMENTS):
+                document = DocumentEntity(app.project_config)
+                object_id = document.insert()
+                # A large content, like a full article
+                DocumentEntity(app.project_config).update(
+                    object_id, "SUCCESS", content="Lorem ipsum dolor sit amet. " * 40000
+                )
+        except Exception as err: # pylint: disable=broad-except
+            errors.append(err)
+
+    def read():
+        client = app.test_client()
+        try:
+            while not writers_done.is_set():
+                response = client.get("/document/metadata/1")
+                assert response.status_code in (200, 404)
+                response = client.get("/entities/search?text=Jonathan")
+                assert response.status_code == 200
+        except Exception as err: # pylint: disable=broad-except
+            errors.append(err)
+
+    writers = [threading.Thread(target=write) for _ in range(NUMBER_OF_WRITERS)]
+    readers = [threading.Thread(target=read) for _ in range(NUMBER_OF_READERS)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    # All the connections are back in the pool
+    assert get_engine().pool.checkedout() == 0
+
+def test_metadata_does_not_read_the_content(app):
+    """Test the content is read only by the /document/content/<id> route"""
+    object_id = DocumentEntity(app.project_config).insert(content="Lorem ipsum " * 100000)
+    statements = []
+
+    def record(*args):
+        statements.append(args[2])
+
+    event.listen(get_engine(), "before_cursor_execute", record)
+    try:
+        client = app.test_client()
+        assert client.get(f"/document/metadata/{object_id}").status_code == 200
+        metadata_statements = list(statements)
+        assert client.get(f"/document/content/{object_id}").status_code == 200
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", record)
+
+    def reads_content(statement):
+        return re.search(r"document\.content(?!_hash)", statement) is not None
+
+    assert not any(reads_content(statement) for statement in metadata_statements)
+    assert any(reads_content(statement) for statement in statements)
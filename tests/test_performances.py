@@ -5,7 +5,6 @@ Web service specialized in Named Entity Recognition (NER), in Natural Language P
 """
 
 import json
-import time
 
 # PDF list used as references to compare
 # the extracted named entities
@@ -38,10 +37,8 @@ def get_medatadata(client, doc_url):
         status = "PENDING"
         # While the status is not SUCCESS or ERROR
         while status == "PENDING":
-            # Wait some seconds before request
-            time.sleep(2)
-            # Request metadata
-            response = client.get("/document/metadata/" + str(message["id"]))
+            # Request metadata, the response waits for the end of the processing
+            response = client.get("/document/metadata/" + str(message["id"]) + "?wait=30")
             if response is None:
                 print("GET /document/metadata/: \
                     Error while retrieving metadata of the file: %s", message["id"])
@@ -6,7 +6,13 @@ Web service specialized in Named Entity Recognition (NER), in Natural Language P
 
 import json
 import io
+import threading
 import time
+import uuid
+from web_service.common import NerWorkerPool, QueueFullError, StatusNotifier
+from web_service.entities import DocumentEntity, NamedEntity, NamedEntityTypeEnum
+from web_service.entities import NamedEntityScoreEnum, NamedEntityRelationshipEnum
+from web_service.services.webhook_sender import WebhookSender
 
 def test_post_document(client):
     """Test the index route"""
@@ -30,6 +36,35 @@ def test_post_document(client):
     response = client.post("/", data=data, content_type="multipart/form-data")
     assert response.status_code == 201
 
+    # Test an incorrect callback_url
+    data["file"] = (open("tests/article.pdf", 'rb'), "tests/article.pdf")
+    data["callback_url"] = "ftp://indexer/completions"
+    response = client.post("/", data=data, content_type="multipart/form-data")
+    assert response.status_code == 400
+
+    # Test a callback_url in the private network
+    data["file"] = (open("tests/article.pdf", 'rb'), "tests/article.pdf")
+    data["callback_url"] = "http://169.254.169.254/latest/meta-data"
+    response = client.post("/", data=data, content_type="multipart/form-data")
+    assert response.status_code == 400
+
+def test_post_document_deduplication(client):
+    """Test uploading the same file twice returns the same document"""
+    data = dict()
+    data["file"] = (open("tests/article.pdf", 'rb'), "tests/article.pdf")
+    response = client.post("/", data=data, content_type="multipart/form-data")
+    first_id = json.loads(response.get_data(as_text=True))["id"]
+
+    folder = client.application.project_config.get_upload_temp_folder()
+    copies = set(folder.glob("*_article_copy.pdf"))
+    data["file"] = (open("tests/article.pdf", 'rb'), "tests/article_copy.pdf")
+    response = client.post("/", data=data, content_type="multipart/form-data")
+    assert response.status_code == 201
+    # With the default config (deduplication = id), the existing document is returned
+    assert json.loads(response.get_data(as_text=True))["id"] == first_id
+    # and the uploaded copy is removed
+    assert set(folder.glob("*_article_copy.pdf")) <= copies
+
 def test_get_document(client):
     """Test the index route"""
     # Test indicating a wrong URL type
@@ -105,3 +140,344 @@ def test_get_document_content(client):
 
     response = client.post("/document/content/1")
     assert response.status_code == 405
+
+def test_get_document_content_part(app, client):
+    """Test the page and range parameters of the /document/content/<id> route"""
+    document = DocumentEntity(app.project_config)
+    doc_id = document.insert()
+    document.update(doc_id, content="First page. Second page. Third.", page_offsets=[0, 12, 25])
+
+    response = client.get(f"/document/content/{doc_id}?page=2")
+    data = json.loads(response.get_data(as_text=True))
+    assert response.status_code == 200
+    assert data["content"] == "Second page. "
+    assert (data["page"], data["begin_offset"], data["end_offset"]) == (2, 12, 25)
+
+    # The last page ends with the content
+    response = client.get(f"/document/content/{doc_id}?page=3")
+    assert json.loads(response.get_data(as_text=True))["content"] == "Third."
+
+    response = client.get(f"/document/content/{doc_id}?begin_offset=6&end_offset=10")
+    data = json.loads(response.get_data(as_text=True))
+    assert data["content"] == "page"
+    assert (data["begin_offset"], data["end_offset"]) == (6, 10)
+
+    # The metadata give the pages
+    response = client.get(f"/document/metadata/{doc_id}")
+    assert json.loads(response.get_data(as_text=True))["page_offsets"] == [0, 12, 25]
+
+    response = client.get(f"/document/content/{doc_id}?page=4")
+    assert response.status_code == 404
+    response = client.get(f"/document/content/{doc_id}?page=first")
+    assert response.status_code == 400
+    response = client.get(f"/document/content/{doc_id}?begin_offset=10&end_offset=6")
+    assert response.status_code == 400
+    response = client.get(f"/document/content/{doc_id}?page=1&begin_offset=6")
+    assert response.status_code == 400
+
+def _finish_later(app, doc_id: int, delay: float = 0.5):
+    """Set the SUCCESS of a document after a delay, from another thread"""
+    timer = threading.Timer(
+        delay, lambda: DocumentEntity(app.project_config).update(doc_id, "SUCCESS")
+    )
+    timer.start()
+    return timer
+
+def test_get_document_metadata_wait(app, client):
+    """Test the long-poll of the /document/metadata/<id> route"""
+    doc_id = DocumentEntity(app.project_config).insert()
+    timer = _finish_later(app, doc_id)
+    start = time.monotonic()
+    response = client.get(f"/document/metadata/{doc_id}?wait=10")
+    timer.join()
+
+    # The request is woken up by the update, before the end of the wait
+    assert json.loads(response.get_data(as_text=True))["status"] == "SUCCESS"
+    assert time.monotonic() - start < 10
+
+    response = client.get(f"/document/metadata/{doc_id}?wait=soon")
+    assert response.status_code == 400
+
+def test_get_documents_events(app, client):
+    """Test the server-sent events of the /documents/events route"""
+    doc_id = DocumentEntity(app.project_config).insert()
+    timer = _finish_later(app, doc_id)
+    response = client.get(f"/documents/events?ids={doc_id},1000000000")
+    # The stream ends when no document is PENDING anymore
+    events = response.get_data(as_text=True)
+    timer.join()
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert events.split("\n\n")[:4] == [
+        f'event: status\ndata: {{"id": {doc_id}, "status": "PENDING"}}',
+        'event: status\ndata: {"id": 1000000000, "status": null}',
+        f'event: status\ndata: {{"id": {doc_id}, "status": "SUCCESS"}}',
+        'event: end\ndata: {"pending": []}'
+    ]
+
+    response = client.get("/documents/events?ids=first")
+    assert response.status_code == 400
+
+def test_too_many_waiting_requests(app, client, monkeypatch):
+    """Test the waiting requests are refused over max_waiting_requests"""
+    doc_id = DocumentEntity(app.project_config).insert()
+    notifier = StatusNotifier.get_instance()
+    monkeypatch.setattr(notifier, "max_subscribers", 1)
+    # Another request is already waiting
+    subscriber = notifier.subscribe([doc_id])
+    try:
+        response = client.get(f"/document/metadata/{doc_id}?wait=10")
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+        response = client.get(f"/documents/events?ids={doc_id}")
+        assert response.status_code == 503
+    finally:
+        notifier.unsubscribe(subscriber, [doc_id])
+
+    # The requests without wait are not limited
+    response = client.get(f"/document/metadata/{doc_id}")
+    assert response.status_code == 200
+
+def test_post_documents_batch(client):
+    """Test the /documents/batch route"""
+    data = dict()
+    data["files"] = [
+        (open("tests/article.pdf", 'rb'), "article.pdf"),
+        (open("tests/article.pdf", 'rb'), "article_copy.pdf")
+    ]
+    response = client.post("/documents/batch", data=data, content_type="multipart/form-data")
+    batch = json.loads(response.get_data(as_text=True))
+    assert response.status_code == 201
+    assert len(batch["documents"]) == 2
+
+    # We wait 3 sec to let the process finish
+    time.sleep(3)
+
+    response = client.get("/documents/batch/" + str(batch["id"]))
+    data = json.loads(response.get_data(as_text=True))
+    assert response.status_code == 200
+    assert data["number_of_documents"] == 2
+    assert [document["id"] for document in data["documents"]] == batch["documents"]
+
+    # Test an incorrect batch
+    response = client.post("/documents/batch", json={"urls": []})
+    assert response.status_code == 400
+
+    response = client.post("/documents/batch", json={"urls": ["ceciestunefichierabsent"]})
+    assert response.status_code == 201
+
+    response = client.post(
+        "/documents/batch",
+        json={"urls": ["ceciestunefichierabsent"], "callback_url": "ceciestuneurlabsente"}
+    )
+    assert response.status_code == 400
+
+    response = client.get("/documents/batch/1000000000")
+    assert response.status_code == 404
+
+def test_post_documents_batch_queue_full(app, client, monkeypatch):
+    """Test the files refused by a full NER queue are reported, and removed"""
+    calls = []
+
+    def submit(_, document, filename, object_id, timeout=0): # pylint: disable=unused-argument
+        """Accept the first document only"""
+        calls.append((filename, object_id))
+        if len(calls) > 1:
+            raise QueueFullError("The NER queue is full")
+
+    # The same file is processed again, instead of being deduplicated
+    monkeypatch.setattr(app.project_config, "get_deduplication", lambda: "off")
+    monkeypatch.setattr(NerWorkerPool, "submit", submit)
+    data = dict()
+    data["files"] = [
+        (open("tests/article.pdf", 'rb'), "article.pdf"),
+        (open("tests/article.pdf", 'rb'), "article_copy.pdf")
+    ]
+    response = client.post("/documents/batch", data=data, content_type="multipart/form-data")
+    batch = json.loads(response.get_data(as_text=True))
+    assert response.status_code == 207
+    assert "Retry-After" in response.headers
+    assert batch["documents"] == [calls[0][1], None]
+    assert batch["rejected_files"] == ["article_copy.pdf"]
+    assert batch["message"].startswith("1 of 2 documents")
+    # The refused file is removed
+    assert not calls[1][0].exists()
+    calls[0][0].unlink()
+
+    # No document was accepted
+    calls.append(None)
+    data["files"] = [(open("tests/article.pdf", 'rb'), "article.pdf")]
+    response = client.post("/documents/batch", data=data, content_type="multipart/form-data")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+def test_post_documents_batch_too_large_file(app, client, monkeypatch):
+    """Test a file too large is refused, without refusing the other files of the batch"""
+    monkeypatch.setattr(app.project_config, "get_max_upload_size", lambda: 700000)
+    data = dict()
+    data["files"] = [
+        (io.BytesIO(b"%PDF-1.4" * 100000), "too_large.pdf"),
+        (open("tests/article.pdf", 'rb'), "article.pdf")
+    ]
+    response = client.post("/documents/batch", data=data, content_type="multipart/form-data")
+    batch = json.loads(response.get_data(as_text=True))
+    assert response.status_code == 207
+    assert batch["documents"][0] is None
+    assert batch["documents"][1] is not None
+    assert batch["rejected_files"] == ["too_large.pdf"]
+
+    # The status of the error is kept when no file is accepted
+    data["files"] = [(io.BytesIO(b"%PDF-1.4" * 100000), "too_large.pdf")]
+    response = client.post("/documents/batch", data=data, content_type="multipart/form-data")
+    assert response.status_code == 413
+
+def test_post_document_too_large_request(app, client, monkeypatch):
+    """Test a request larger than the MAX_CONTENT_LENGTH is refused"""
+    assert app.config["MAX_CONTENT_LENGTH"] > app.project_config.get_max_upload_size()
+    monkeypatch.setitem(app.config, "MAX_CONTENT_LENGTH", 100000)
+    data = dict()
+    data["file"] = (open("tests/article.pdf", 'rb'), "article.pdf")
+    response = client.post("/", data=data, content_type="multipart/form-data")
+    assert response.status_code == 413
+    assert "message" in json.loads(response.get_data(as_text=True))
+
+def test_get_document_conditional(client):
+    """Test the ETag and the 304 responses of a finished document"""
+    data = dict()
+    data["file"] = (open("tests/article.pdf", 'rb'), "article.pdf")
+    response = client.post("/", data=data, content_type="multipart/form-data")
+    doc_id = json.loads(response.get_data(as_text=True))["id"]
+    # We wait for the end of the process
+    for _ in range(30):
+        response = client.get("/document/metadata/" + str(doc_id))
+        if json.loads(response.get_data(as_text=True))["status"] != "PENDING":
+            break
+        time.sleep(1)
+
+    for route in ["/document/metadata/", "/document/content/"]:
+        response = client.get(route + str(doc_id))
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+
+        # The document is finished, so the response comes from the cache
+        response = client.get(route + str(doc_id), headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.get_data() == b""
+
+    response = client.get("/metrics")
+    data = json.loads(response.get_data(as_text=True))
+    assert data["response_cache"]["hits"] >= 2
+    assert data["response_cache"]["responses"] >= 2
+
+def _insert_with_named_entity(app, text: str, named_entity_type: NamedEntityTypeEnum,
+                              score: NamedEntityScoreEnum, count: int = 1) -> int:
+    """Insert a document mentioning a named entity, returns its id"""
+    named_entities = [
+        NamedEntity(
+            text, score, None, named_entity_type, index * 100, index * 100 + len(text),
+            NamedEntityRelationshipEnum.QUOTED
+        )
+        for index in range(count)
+    ]
+    return DocumentEntity(app.project_config).insert(named_entities=named_entities)
+
+def test_search_entities(app, client):
+    """Test the /entities/search route"""
+    # A name found in the documents of this test only
+    name = f"Jonathan Cassaing {uuid.uuid4().hex}"
+    document_ids = [
+        _insert_with_named_entity(
+            app, name, NamedEntityTypeEnum.PERSON, NamedEntityScoreEnum.LOW, index + 1
+        )
+        for index in range(5)
+    ]
+    # The same name in another type, and with a better score
+    other_id = _insert_with_named_entity(
+        app, name.upper(), NamedEntityTypeEnum.ORGANIZATION, NamedEntityScoreEnum.HIGH
+    )
+
+    response = client.get(
+        "/entities/search", query_string={"text": name.lower(), "type": "PERSON"}
+    )
+    data = json.loads(response.get_data(as_text=True))
+
+    # The status must be 200 OK
+    assert response.status_code == 200
+    assert data["text"] == name.lower()
+    assert data["documents"] == [
+        {"id": document_id, "count": index + 1, "score": "LOW"}
+        for index, document_id in enumerate(document_ids)
+    ]
+    assert data["next"] is None
+
+    # The score filter keeps the documents with a better score only
+    response = client.get("/entities/search", query_string={"text": name, "score": "HIGH"})
+    data = json.loads(response.get_data(as_text=True))
+    assert [document["id"] for document in data["documents"]] == [other_id]
+
+    # Keyset pagination: each page starts after the last id of the previous page,
+    # without duplicate nor skipped document
+    found_ids = []
+    pages = 0
+    query_string = {"text": name, "limit": 2}
+    while True:
+        response = client.get("/entities/search", query_string=query_string)
+        data = json.loads(response.get_data(as_text=True))
+        assert response.status_code == 200
+        assert len(data["documents"]) <= 2
+        found_ids += [document["id"] for document in data["documents"]]
+        pages += 1
+        if data["next"] is None:
+            break
+        assert data["next"] == data["documents"][-1]["id"]
+        query_string["after"] = data["next"]
+    assert found_ids == document_ids + [other_id]
+    # The third page is full, so the fourth one is read, empty
+    assert pages == 4
+
+    # A page after the last document is empty
+    response = client.get(
+        "/entities/search", query_string={"text": name, "after": other_id}
+    )
+    data = json.loads(response.get_data(as_text=True))
+    assert data["documents"] == []
+    assert data["next"] is None
+
+    # The text parameter is required
+    response = client.get("/entities/search")
+    assert response.status_code == 400
+
+    # The type must be a type of named entity
+    response = client.get("/entities/search?text=Jonathan&type=FOOD")
+    assert response.status_code == 400
+
+    response = client.post("/entities/search?text=Jonathan")
+    assert response.status_code == 405
+
+def test_get_metrics(client, monkeypatch):
+    """Test the /metrics route"""
+    # No upload with a callback_url yet
+    monkeypatch.setattr(WebhookSender, "_instance", None)
+    response = client.get("/metrics")
+    data = json.loads(response.get_data(as_text=True))
+
+    # The status must be 200 OK
+    assert response.status_code == 200
+    # The spaCy model is loaded one time, when the app is created
+    assert any(
+        stats["model_name"] == "en_core_web_sm" and "ner" in stats["components"]
+        for stats in data["spacy_models"]
+    )
+    # The NER worker pool is sized from the config.ini file
+    assert data["ner_worker_pool"]["workers"] > 0
+    assert data["ner_worker_pool"]["queue_size"] > 0
+    # The metrics don't start the webhook sender
+    assert data["webhook_sender"] is None
+    assert WebhookSender._instance is None # pylint: disable=protected-access
+    assert isinstance(data["rate_limiters"], dict)
+    assert 0 <= data["ner_result_cache"]["hit_ratio"] <= 1
+    assert data["ner_result_cache"]["saved_bytes"] >= 0
+
+    response = client.post("/metrics")
+    assert response.status_code == 405
@@ -5,12 +5,22 @@ Web service specialized in Named Entity Recognition (NER), in Natural Language P
 """
 
 import configparser
+import json
 import sys
 from pathlib import Path
+import click
 from flask import Flask, request
+from flask.cli import with_appcontext
 from flasgger import Swagger, LazyString, LazyJSONEncoder
 from web_service import router
-from web_service.common import Config
+from web_service.common import Config, init_db, session_scope, compress_rows, RateLimiter
+from web_service.common import NerWorkerPool, StatusNotifier
+from web_service.entities import DocumentEntity, DocumentBlock
+from web_service.services import SpacyModelRegistry, NerResultCache
+
+# Margin (in bytes) over max_upload_size for the multipart overhead of an upload request
+# (boundaries, headers of the parts and form fields)
+MULTIPART_OVERHEAD = 1048576
 
 def create_app(test_config=None):
     """Create and configure the flask app with the factory pattern"""
@@ -19,6 +29,9 @@ def create_app(test_config=None):
 
     # We load the config.ini file, one time
     app.project_config = Config()
+    # The larger requests are refused before their body is read (and stored on the disk)
+    app.config["MAX_CONTENT_LENGTH"] = \
+        app.project_config.get_max_upload_size() + MULTIPART_OVERHEAD
 
     if test_config is None:
         # load the instance config, if it exists, when not testing
@@ -29,6 +42,8 @@ def create_app(test_config=None):
 
     # Register the router
     app.register_blueprint(router.bp)
+    # Register the commands of the flask CLI
+    app.cli.add_command(compress_database_command)
 
     # We load the setup config file
     setup_config = configparser.ConfigParser()
@@ -47,16 +62,69 @@ def create_app(test_config=None):
         # If the folder doesn't exist, we create it
         path_folder.mkdir()
 
+    # We create the database schema one time, with the pool and pragmas of the config file
+    init_db(app.project_config)
+    DocumentBlock.configure(app.project_config.get_db_content_block_size())
+
+    # Each request waiting for status changes holds a thread of the server
+    StatusNotifier.get_instance().max_subscribers = \
+        app.project_config.get_max_waiting_requests()
+
     # We create the temp folder for uploaded files
     folder = app.project_config.get_upload_temp_folder()
     if False is folder.exists():
         # If the folder doesn't exist, we create it
         folder.mkdir()
 
+    # The commands of the flask CLI don't extract named entities,
+    # so they don't load the spaCy pipeline nor start the NER processes
+    start_ner = not _is_cli_command()
+
+    # We load the spaCy pipeline one time, before the NER processes are forked
+    if start_ner and "spacy" in app.project_config.get_ner_methods():
+        SpacyModelRegistry.get(
+            app.project_config.get_spacy_model(),
+            app.project_config.get_spacy_excluded_components()
+        )
+
+    # We create the AWS rate limiter one time, so the NER processes forked after share it
+    if "aws-comprehend" in app.project_config.get_ner_methods():
+        RateLimiter.get_instance(
+            "aws-comprehend", app.project_config.get_aws_max_requests_per_second()
+        )
+
+    # We open the NER cache one time, so the NER processes forked after share its statistics
+    NerResultCache.get_instance(app.project_config)
+
+    # We start the NER processes now, after the shared objects above are created
+    # and before any thread of the web service is started (a forked process would
+    # inherit the locks held by the other threads)
+    if start_ner:
+        NerWorkerPool.get_instance(app.project_config)
+
     Swagger(app, template=swagger_template, config=swagger_config)
 
     return app
 
+def _is_cli_command() -> bool:
+    """Returns True if the app is created for a command of the flask CLI, except flask run"""
+    context = click.get_current_context(silent=True)
+    return context is not None and context.info_name != "run"
+
+@click.command("compress-database")
+@with_appcontext
+def compress_database_command():
+    """Move the contents stored before the compression to compressed blocks,
+    compress the named entities, then print the compression ratio and the decompression time"""
+    with session_scope() as session:
+        report = {
+            "contents": DocumentEntity.move_contents_to_blocks(session),
+            "named_entities": compress_rows(
+                session, DocumentEntity.__table__, ["named_entities"]
+            )
+        }
+    click.echo(json.dumps(report, indent=4))
+
 swagger_template = {
     "swagger": "2.0",
     "info": {
@@ -119,10 +187,12 @@ swagger_template = {
                 },
                 "status": {
                     "type": "string",
-                    "description": "Status of the document processing",
+                    "description": "Status of the document processing "\
+                    "(PARTIAL: the named entities are incomplete, a NER service failed)",
                     "enum": [
                         "SUCCESS",
                         "PENDING",
+                        "PARTIAL",
                         "ERROR"
                     ]
                 },
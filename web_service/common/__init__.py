@@ -4,5 +4,12 @@ Authors: Jonathan CASSAING
 Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
 """
 
-from .base import Base, session_factory
+from .base import Base, session_factory, session_scope, init_db, get_engine
+from .base import copy_document_rows
 from .config import Config
+from .compressed_text import CompressedText, compress_rows
+from .ner_worker_pool import NerWorkerPool, QueueFullError
+from .result_writer import ResultWriter
+from .rate_limiter import RateLimiter
+from .status_notifier import StatusNotifier, TooManySubscribersError
+from .response_cache import ResponseCache, CachedResponse
@@ -4,20 +4,141 @@ Authors: Jonathan CASSAING
 Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
 """
 
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, insert, inspect, literal, select
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from .compressed_text import CompressedText
 
-engine = create_engine(
-    "sqlite:///instance/database.db",
-    connect_args={'check_same_thread': False}
-    )
-# use session_factory() to get a new Session
-_SessionFactory = sessionmaker(bind=engine)
+# URL of the database
+DATABASE_URL = "sqlite:///instance/database.db"
+
+# Engine of the database, replaced by init_db() with the settings of the config file
+engine = None # pylint: disable=invalid-name
+# use session_factory() or session_scope() to get a new Session
+_SessionFactory = sessionmaker()
 
 Base = declarative_base()
 
-def session_factory():
-    """Returns a session factory to simplify database access"""
+def _create_engine(pool_size: int = 5, max_overflow: int = 10, pool_timeout: float = 30,
+                   busy_timeout: float = 5, cache_size: int = 65536):
+    """Returns an engine with a pool of connections, and the SQLite pragmas
+    Args:
+        pool_size (int): number of connections kept in the pool.
+        max_overflow (int): number of connections opened over pool_size at peak time.
+        pool_timeout (float): maximum waiting time of a free connection, in seconds.
+        busy_timeout (float): maximum waiting time of a lock of the database, in seconds.
+        cache_size (int): size of the page cache of each connection, in KiB.
+    """
+    new_engine = create_engine(
+        DATABASE_URL,
+        connect_args={'check_same_thread': False},
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout
+    )
+
+    @event.listens_for(new_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        # With the Write-Ahead Log, the readers are not blocked by the writer
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode, the database stays consistent without a sync at each commit
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        # The writers wait for the lock instead of failing with "database is locked"
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(cache_size)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    return new_engine
+
+def _migrate_schema(bind):
+    """Add the columns and the indexes missing in the tables created by a previous version
+    Base.metadata.create_all() creates the missing tables only, it never alters a table.
+    The added columns are NULL in the existing rows. Nothing is done on an up-to-date database.
+    Args:
+        bind (Engine): engine of the database.
+    """
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            columns = {
+                row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info("{table.name}")')
+            }
+            for column in table.columns:
+                if column.name not in columns:
+                    column_type = column.type.compile(dialect=connection.dialect)
+                    connection.exec_driver_sql(
+                        f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                    )
+            # The indexes of an existing table are not created by create_all() either
+            indexes = {index["name"] for index in inspect(connection).get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+
+def init_db(config=None):
+    """Create the engine with the settings of the config file, and the schema of the database
+    The tables of a database created by a previous version are migrated, see _migrate_schema().
+    It must be called one time at startup, before the NER processes are forked.
+    Args:
+        config (Config): config of the web service, the default settings are used if None.
+    """
+    global engine # pylint: disable=global-statement
+    if engine is not None:
+        engine.dispose()
+    if config is None:
+        engine = _create_engine()
+    else:
+        engine = _create_engine(
+            config.get_db_pool_size(),
+            config.get_db_max_overflow(),
+            config.get_db_pool_timeout(),
+            config.get_db_busy_timeout(),
+            config.get_db_cache_size()
+        )
+        CompressedText.configure(config.get_db_compression(), config.get_db_compression_level())
+    _SessionFactory.configure(bind=engine)
     Base.metadata.create_all(engine)
+    _migrate_schema(engine)
+
+def copy_document_rows(session, table, columns: list, source_document_id: int,
+                       document_id: int):
+    """Copy the rows of a document to another document, with a single INSERT ... SELECT
+    The rows are copied in the order of the primary key. The caller must commit the session.
+    Args:
+        session (Session): session of the transaction.
+        table (Table): table of the rows, with a document_id column.
+        columns (list<str>): copied columns, other than document_id.
+        source_document_id (int): id of the copied document.
+        document_id (int): id of the document receiving the copy.
+    """
+    session.execute(
+        insert(table).from_select(
+            ["document_id"] + columns,
+            select(literal(document_id), *[table.c[column] for column in columns])
+            .where(table.c.document_id == source_document_id)
+            .order_by(*table.primary_key.columns)
+        )
+    )
+
+def get_engine():
+    """Returns the engine of the database"""
+    return engine
+
+def session_factory():
+    """Returns a new session, the caller must close it
+    Prefer session_scope(), which always closes the session."""
     return _SessionFactory()
+
+@contextmanager
+def session_scope():
+    """Returns a session scoped to a with block (a request or a task),
+    the session is always closed, and its connection released to the pool"""
+    session = _SessionFactory()
+    try:
+        yield session
+    finally:
+        session.close()
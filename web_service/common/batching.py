@@ -0,0 +1,62 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import queue
+import time
+
+def get_batch(source_queue, batch_size: int, batch_timeout: float,
+              timeout: float = None) -> list:
+    """Wait for an item, then take the next items of the queue to fill a batch
+    Args:
+        source_queue (queue.SimpleQueue or multiprocessing.Queue): queue to read.
+        batch_size (int): maximum number of items of the batch.
+        batch_timeout (float): time to wait for more items after the first one, in seconds.
+        With 0, only the items already in the queue are taken.
+        timeout (float): maximum waiting time of the first item, in seconds, no limit if None.
+    Returns:
+        list: the items of the batch, the last one is None if the consumer must stop,
+        empty if no item came before the timeout.
+    """
+    try:
+        batch = [source_queue.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+    deadline = time.monotonic() + batch_timeout
+    while len(batch) < batch_size and batch[-1] is not None:
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining > 0:
+                batch.append(source_queue.get(timeout=remaining))
+            else:
+                batch.append(source_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+def iter_batches(source_queue, batch_size: int, batch_timeout: float, get_timeout=None):
+    """Yield the batches of a queue, until a None item stops the consumer
+    The items before the None item are yielded in a last batch.
+    Args:
+        source_queue (queue.SimpleQueue or multiprocessing.Queue): queue to read.
+        batch_size (int): maximum number of items of a batch.
+        batch_timeout (float): time to wait for more items after the first one, in seconds.
+        get_timeout (callable): if not None, returns the maximum waiting time of the first item
+        of the next batch (None for no limit), and an empty batch is yielded when it expires.
+    Yields:
+        list: the items of each batch, without the None item.
+    """
+    while True:
+        batch = get_batch(
+            source_queue, batch_size, batch_timeout,
+            get_timeout() if get_timeout is not None else None
+        )
+        stopping = len(batch) > 0 and batch[-1] is None
+        if stopping:
+            batch.pop()
+        if len(batch) > 0 or get_timeout is not None:
+            yield batch
+        if stopping:
+            return
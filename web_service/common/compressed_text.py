@@ -0,0 +1,133 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import lzma
+import time
+import zlib
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+class CompressedText(TypeDecorator):
+    """Text column compressed with zlib or lzma, transparently
+    The compressed values are BLOB starting with a byte giving the algorithm,
+    and they are decompressed when the column is read (so not for a deferred column
+    which is not read). The values stored before the compression are TEXT,
+    they are read as is, see compress_rows() to compress them.
+    """
+
+    impl = String
+    cache_ok = True
+
+    # Algorithm used for the new values (zlib, lzma or off), see configure()
+    algorithm = "zlib"
+    # Compression level, from 0 to 9
+    level = 6
+
+    # First byte of a compressed value, for each algorithm
+    _PREFIXES = {"zlib": b"z", "lzma": b"x"}
+
+    @classmethod
+    def configure(cls, algorithm: str = "zlib", level: int = 6):
+        """Set the compression of the new values, for all the processes forked after
+        Args:
+            algorithm (str): zlib, lzma or off to store the new values as text.
+            level (int): compression level, from 0 (fastest) to 9 (smallest).
+        """
+        if algorithm not in cls._PREFIXES and algorithm != "off":
+            raise ValueError(f"Unknown compression algorithm: {algorithm}")
+        cls.algorithm = algorithm
+        cls.level = min(max(level, 0), 9)
+
+    @classmethod
+    def compress(cls, text):
+        """Returns the stored value of a text, already compressed values are returned as is"""
+        if text is None or isinstance(text, bytes) or cls.algorithm == "off":
+            return text
+        data = text.encode("utf-8")
+        if cls.algorithm == "lzma":
+            return cls._PREFIXES["lzma"] + lzma.compress(data, preset=cls.level)
+        return cls._PREFIXES["zlib"] + zlib.compress(data, cls.level)
+
+    @classmethod
+    def decompress(cls, value):
+        """Returns the text of a stored value, the text values are returned as is"""
+        if not isinstance(value, bytes):
+            return value
+        if value[:1] == cls._PREFIXES["lzma"]:
+            return lzma.decompress(value[1:]).decode("utf-8")
+        return zlib.decompress(value[1:]).decode("utf-8")
+
+    # The values are the same for all the dialects
+    # pylint: disable=unused-argument
+
+    def process_bind_param(self, value, dialect):
+        """Returns the stored value of a text, compressed with the configured algorithm"""
+        return CompressedText.compress(value)
+
+    def process_result_value(self, value, dialect):
+        """Returns the text of a stored value"""
+        return CompressedText.decompress(value)
+
+    def process_literal_param(self, value, dialect):
+        """Returns the text of a value rendered in a SQL statement, it is read as is"""
+        return CompressedText.decompress(value)
+
+def compress_rows(session, table, columns: list, batch_size: int = 100) -> dict:
+    """Compress the values stored as text in some CompressedText columns of a table
+    The rows are compressed by batch, one transaction per batch.
+    Args:
+        session (Session): session used for the queries.
+        table (Table): table to migrate, with an integer id primary key.
+        columns (list<str>): names of the CompressedText columns.
+        batch_size (int): number of rows per transaction.
+    Returns:
+        dict: number of rows, size before and after the compression,
+        and the time to decompress the values (the read cost of the compression).
+    """
+    report = {
+        "rows": 0, "text_bytes": 0, "compressed_bytes": 0,
+        "decompression_ms": 0.0, "max_decompression_ms": 0.0
+    }
+    last_id = 0
+    while True:
+        # The columns are read as stored, without decompression
+        rows = session.execute(
+            select(table.c.id, *[type_coerce(table.c[column], String) for column in columns])
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if len(rows) == 0:
+            break
+        last_id = rows[-1][0]
+
+        for row in rows:
+            values = {}
+            for column, value in zip(columns, row[1:]):
+                compressed = CompressedText.compress(value)
+                # The values already compressed, and the NULL values, are kept
+                if not isinstance(value, str) or not isinstance(compressed, bytes):
+                    continue
+                values[column] = compressed
+                report["text_bytes"] += len(value.encode("utf-8"))
+                report["compressed_bytes"] += len(compressed)
+                start = time.perf_counter()
+                CompressedText.decompress(compressed)
+                latency = (time.perf_counter() - start) * 1000
+                report["decompression_ms"] += latency
+                report["max_decompression_ms"] = max(report["max_decompression_ms"], latency)
+            if len(values) > 0:
+                session.execute(table.update().where(table.c.id == row[0]).values(values))
+                report["rows"] += 1
+        session.commit()
+
+    if report["compressed_bytes"] > 0:
+        report["ratio"] = round(report["text_bytes"] / report["compressed_bytes"], 3)
+    if report["rows"] > 0:
+        report["average_decompression_ms"] = round(report["decompression_ms"] / report["rows"], 3)
+    report["decompression_ms"] = round(report["decompression_ms"], 3)
+    report["max_decompression_ms"] = round(report["max_decompression_ms"], 3)
+    return report
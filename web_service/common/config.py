@@ -4,12 +4,70 @@ Authors: Jonathan CASSAING
 Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
 """
 
+import os
 import sys
 import configparser
 from pathlib import Path
 
 class Config:
-    """Class for accessing config.ini file"""
+    """Class for accessing config.ini file
+    The value of each option is returned by its getter, get_<option>(),
+    for example get_max_upload_size(), see OPTIONS.
+    """
+
+    # Parser and default value of each option of the config file
+    OPTIONS = {
+        "upload_temp_folder": (Path, Path("tmp")),
+        "allowed_extensions": (str.split, ["pdf"]),
+        "max_upload_size": (int, 104857600),
+        "download_timeout": (float, 60.0),
+        "download_chunk_size": (int, 65536),
+        "fetcher_workers": (int, 8),
+        "fetcher_connections_per_host": (int, 4),
+        "db_pool_size": (int, 5),
+        "db_max_overflow": (int, 10),
+        "db_pool_timeout": (float, 30.0),
+        "db_busy_timeout": (float, 5.0),
+        "db_cache_size": (int, 65536),
+        "db_compression": (str, "zlib"),
+        "db_compression_level": (int, 6),
+        "db_content_block_size": (int, 65536),
+        "response_cache_size": (int, 67108864),
+        "max_batch_size": (int, 1000),
+        "max_wait": (float, 60.0),
+        "max_waiting_requests": (int, 12),
+        "server_threads": (int, 16),
+        "webhook_batch_size": (int, 100),
+        "webhook_batch_timeout": (float, 1.0),
+        "webhook_timeout": (float, 10.0),
+        "webhook_max_retries": (int, 6),
+        "webhook_retry_delay": (float, 1.0),
+        "webhook_allowed_hosts": (str.split, []),
+        "deduplication": (str, "id"),
+        "ner_methods": (str.split, ["nltk", "spacy"]),
+        "spacy_model": (str, "en_core_web_sm"),
+        "spacy_excluded_components": (
+            str.split, ["tagger", "parser", "attribute_ruler", "lemmatizer"]
+        ),
+        "ner_chunk_size": (int, 20000),
+        "ner_chunk_overlap": (int, 200),
+        "ner_merge_min_overlap": (float, 0.5),
+        "ner_chunk_processes": (int, 1),
+        "ner_workers": (int, 0),
+        "ner_queue_size": (int, 100),
+        "ner_batch_size": (int, 16),
+        "ner_batch_timeout": (float, 0.0),
+        "ner_writer_batch_size": (int, 64),
+        "ner_writer_batch_timeout": (float, 0.05),
+        "ner_retry_after": (int, 10),
+        "ner_cache_path": (Path, Path("instance/ner_cache.db")),
+        "ner_cache_size": (int, 268435456),
+        "aws_region": (str, "us-east-1"),
+        "max_char_per_aws_request": (int, 4900),
+        "aws_max_in_flight": (int, 4),
+        "aws_max_requests_per_second": (float, 10.0),
+        "aws_max_retries": (int, 5),
+    }
 
     def __init__(self: object):
         """Initialize the object"""
@@ -17,52 +75,36 @@ class Config:
         # We load the global config file
         config.read('config/config.ini')
 
-        try:
-            self.upload_temp_folder = Path(config.get("DEFAULT","upload_temp_folder"))
-        except configparser.NoOptionError as err:
-            print(f"Error in file config/config.ini: {err=}, {type(err)=}", file=sys.stderr)
-            self.upload_temp_folder = Path("tmp")
+        self._values = {
+            option: Config._get(config, option, getter, default)
+            for option, (getter, default) in Config.OPTIONS.items()
+        }
 
-        try:
-            self.allowed_extensions = config.get("DEFAULT","allowed_extensions").split()
-        except configparser.NoOptionError as err:
-            print(f"Error in file config/config.ini: {err=}, {type(err)=}", file=sys.stderr)
-            self.allowed_extensions = "pdf"
+        # Each NER process runs its own chunk processes, so the CPUs are shared between them
+        if self._values["ner_chunk_processes"] <= 0:
+            ner_workers = self._values["ner_workers"]
+            if ner_workers <= 0:
+                ner_workers = os.cpu_count() or 1
+            self._values["ner_chunk_processes"] = max((os.cpu_count() or 1) // ner_workers, 1)
 
+    @staticmethod
+    def _get(config: configparser.ConfigParser, option: str, getter, default):
+        """Returns the value of an option of the config file
+        Args:
+            config (ConfigParser): the loaded config file.
+            option (str): name of the option.
+            getter (callable): parser of the value of the option.
+            default: value returned if the option is missing.
+        """
         try:
-            self.ner_methods = config.get("DEFAULT","ner_methods").split()
+            return getter(config.get("DEFAULT", option))
         except configparser.NoOptionError as err:
             print(f"Error in file config/config.ini: {err=}, {type(err)=}", file=sys.stderr)
-            self.ner_methods = "nltk spacy"
-
-        try:
-            self.aws_region = config.get("DEFAULT","aws_region")
-        except configparser.NoOptionError as err:
-            print(f"Error in file config/config.ini: {err=}, {type(err)=}", file=sys.stderr)
-            self.aws_region = "us-east-1"
-
-        try:
-            self.max_char_per_aws_request = int(config.get("DEFAULT","max_char_per_aws_request"))
-        except configparser.NoOptionError as err:
-            print(f"Error in file config/config.ini: {err=}, {type(err)=}", file=sys.stderr)
-            self.max_char_per_aws_request = int("4900")
-
-    def get_upload_temp_folder(self):
-        """Returns upload_temp_folder"""
-        return self.upload_temp_folder
-
-    def get_allowed_extensions(self):
-        """Returns allowed_extensions"""
-        return self.allowed_extensions
-
-    def get_ner_methods(self):
-        """Returns ner_methods"""
-        return self.ner_methods
-
-    def get_aws_region(self):
-        """Returns aws_region"""
-        return self.aws_region
+            return default
 
-    def get_max_char_per_aws_request(self):
-        """Returns max_char_per_aws_request"""
-        return self.max_char_per_aws_request
+    def __getattr__(self, name: str):
+        """Returns the getter of an option, get_<option>()"""
+        option = name[len("get_"):]
+        if name.startswith("get_") and option in Config.OPTIONS:
+            return lambda: self._values[option]
+        raise AttributeError(f"'Config' object has no attribute '{name}'")
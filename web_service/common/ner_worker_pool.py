@@ -0,0 +1,216 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import atexit
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from pathlib import Path
+from web_service.common.base import get_engine
+from web_service.common.batching import iter_batches
+from web_service.common.config import Config
+from web_service.common.result_writer import ResultWriter
+
+class QueueFullError(Exception):
+    """Raised when the queue of the worker pool is full"""
+
+class NerWorkerPool:
+    """Long-lived pool of processes extracting the named entities of the uploaded documents
+    The documents are sent to the workers through a bounded queue,
+    so a burst of uploads can't create an unlimited number of processes.
+    Each worker takes the documents waiting in the queue by batch,
+    so their named entities are extracted by the same NER calls.
+    The workers send their results to a single ResultWriter, which commits them by batch.
+    """
+
+    # Pool of the current process, see get_instance()
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self: object, number_of_workers: int = 0, queue_size: int = 100,
+                 batch_size: int = 16, batch_timeout: float = 0,
+                 writer_batch_size: int = 64, writer_batch_timeout: float = 0.05):
+        """Initialize the object
+        Args:
+            number_of_workers (int): number of processes, 0 to use the number of CPUs.
+            queue_size (int): maximum number of documents waiting for a worker.
+            batch_size (int): maximum number of documents processed together by a worker.
+            batch_timeout (float): time a worker waits for more documents to fill a batch,
+            in seconds. With 0, a worker only takes the documents already in the queue,
+            so a lone document is processed without delay.
+            writer_batch_size (int): maximum number of results committed in the same transaction.
+            writer_batch_timeout (float): time the writer waits for more results, in seconds.
+        """
+        if number_of_workers <= 0:
+            number_of_workers = os.cpu_count() or 1
+        self.number_of_workers = number_of_workers
+        self.queue_size = queue_size
+        self.batch_size = max(batch_size, 1)
+        self.batch_timeout = batch_timeout
+        self._queue = None
+        self._workers = []
+        # The results of the workers are sent to this writer, in the current process
+        self._writer = ResultWriter(writer_batch_size, writer_batch_timeout, queue_size)
+        # Number of workers processing a document
+        self._busy_workers = None
+        # Number of documents processed since the start
+        self._processed_documents = None
+        # Number of documents rejected because the queue was full
+        self._rejected_documents = None
+
+    @classmethod
+    def get_instance(cls, config: Config):
+        """Returns the worker pool of the current process, the pool is started at the first call
+        The first call must be done by create_app(), before any thread is started,
+        so the forked workers don't inherit a lock held by another thread.
+        The commands of the flask CLI don't start the pool, until they submit a document.
+        Args:
+            config (Config): config used to size the pool.
+        Returns:
+            NerWorkerPool: the started pool.
+        """
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = NerWorkerPool(
+                    config.get_ner_workers(),
+                    config.get_ner_queue_size(),
+                    config.get_ner_batch_size(),
+                    config.get_ner_batch_timeout(),
+                    config.get_ner_writer_batch_size(),
+                    config.get_ner_writer_batch_timeout()
+                )
+                cls._instance.start()
+                atexit.register(cls._instance.stop)
+            return cls._instance
+
+    def start(self):
+        """Start the worker processes and the writer of their results"""
+        self._queue = multiprocessing.Queue(self.queue_size)
+        result_queue = multiprocessing.Queue(self._writer.queue_size)
+        self._busy_workers = multiprocessing.Value("i", 0)
+        self._processed_documents = multiprocessing.Value("i", 0)
+        # The documents are rejected by the threads of the web service, under its lock
+        self._rejected_documents = multiprocessing.Value("i", 0)
+        for _ in range(self.number_of_workers):
+            # The workers are not daemonic, so they can use their own sub-processes
+            process = multiprocessing.Process(
+                target=self._work,
+                args=(
+                    self._queue, result_queue, self._busy_workers, self._processed_documents,
+                    self.batch_size, self.batch_timeout
+                )
+            )
+            process.start()
+            self._workers.append(process)
+        # The thread of the writer is started after the fork of the workers,
+        # so they don't inherit its locks
+        self._writer.start(result_queue)
+
+    def stop(self, timeout: float = 10):
+        """Stop the worker processes, after the documents already in the queue,
+        then the writer, after the results of the workers
+        Args:
+            timeout (float): time to wait for each worker, in seconds.
+        """
+        for _ in self._workers:
+            # A None task stops one worker
+            self._queue.put(None)
+        for process in self._workers:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._workers = []
+        self._writer.stop(timeout)
+
+    def submit(self, document, filename: Path, object_id: int, timeout: float = 0):
+        """Send a document to the workers
+        Args:
+            document (DocumentEntity): document whose async_ner_batch() method is called
+            by a worker.
+            filename (Path): filename of the target file.
+            object_id (int): id of the database line to update.
+            timeout (float): time to wait for a free place in the queue, in seconds.
+        Raises:
+            QueueFullError: if the queue is full.
+        """
+        try:
+            self._queue.put(
+                (type(document), document.config, filename, object_id), timeout > 0, timeout
+            )
+        except queue.Full as err:
+            with self._rejected_documents.get_lock():
+                self._rejected_documents.value += 1
+            raise QueueFullError("The NER queue is full") from err
+
+    def get_free_places(self):
+        """Returns the number of free places in the queue, or None if unknown"""
+        try:
+            return self.queue_size - self._queue.qsize()
+        except NotImplementedError:
+            # qsize() is not implemented on macOS
+            return None
+
+    def get_stats(self) -> dict:
+        """Returns the queue depth and the workers utilisation"""
+        try:
+            queue_depth = self._queue.qsize()
+        except NotImplementedError:
+            # qsize() is not implemented on macOS
+            queue_depth = None
+        busy_workers = self._busy_workers.value
+        return {
+            "workers": self.number_of_workers,
+            "busy_workers": busy_workers,
+            "utilisation": round(busy_workers / self.number_of_workers, 3),
+            "queue_depth": queue_depth,
+            "queue_size": self.queue_size,
+            "processed_documents": self._processed_documents.value,
+            "rejected_documents": self._rejected_documents.value,
+            "result_writer": self._writer.get_stats()
+        }
+
+    @staticmethod
+    def _work(task_queue, result_queue, busy_workers, processed_documents,
+              batch_size: int = 1, batch_timeout: float = 0):
+        """Main loop of a worker process"""
+        # The database connections inherited from the parent process must not be shared
+        get_engine().dispose()
+        # The results are committed by the writer of the parent process
+        ResultWriter.connect(result_queue)
+        # A None task stops the worker, after the current batch
+        for batch in iter_batches(task_queue, batch_size, batch_timeout):
+            with busy_workers.get_lock():
+                busy_workers.value += 1
+            # The documents are processed together by type of document
+            batch_by_class = {}
+            for document_class, config, filename, object_id in batch:
+                batch_by_class.setdefault(document_class, (config, []))[1].append(
+                    (filename, object_id)
+                )
+            for document_class, (config, tasks) in batch_by_class.items():
+                # Ids of the documents whose result is already sent to the writer
+                saved_ids = set()
+                try:
+                    document_class(config).async_ner_batch(tasks, saved_ids)
+                # The worker must survive to any error of a document
+                except Exception as err: # pylint: disable=broad-except
+                    for filename, object_id in tasks:
+                        # The files not extracted before the error will never be
+                        Path(filename).unlink(missing_ok=True)
+                        # The ERROR must not overwrite a result already saved
+                        if object_id in saved_ids:
+                            continue
+                        print(
+                            f"Error while processing the document {object_id}: {err}",
+                            file=sys.stderr
+                        )
+                        document_class(config).save_result(object_id, "ERROR")
+            with busy_workers.get_lock():
+                busy_workers.value -= 1
+            with processed_documents.get_lock():
+                processed_documents.value += len(batch)
@@ -0,0 +1,142 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import multiprocessing
+import threading
+import time
+
+class RateLimiter:
+    """Token bucket limiting the requests to a remote service, with an AIMD rate
+    The rate increases additively while the requests succeed, and it is divided
+    when the service throttles the requests (Additive Increase, Multiplicative Decrease).
+    The state is in shared memory, so a limiter created before the NER processes are forked
+    is shared by all the processes (and by all their threads).
+    """
+
+    # Limiters of the current process (and of its parent), by name, see get_instance()
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self: object, max_rate: float = 10, min_rate: float = 0.1,
+                 increase: float = 0.5, decrease: float = 0.5, decrease_interval: float = 1):
+        """Initialize the object
+        Args:
+            max_rate (float): initial and maximum rate, in requests per second.
+            min_rate (float): minimum rate, in requests per second.
+            increase (float): increase of the rate after each second of successful requests
+            at full rate, in requests per second.
+            decrease (float): factor applied to the rate when a request is throttled.
+            decrease_interval (float): minimum time between two decreases, in seconds,
+            so the concurrent requests throttled together decrease the rate only once.
+        """
+        self.max_rate = max(max_rate, min_rate)
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.decrease_interval = decrease_interval
+        self._lock = multiprocessing.Lock()
+        now = time.monotonic()
+        # The monotonic clock is shared by the processes
+        self._rate = multiprocessing.RawValue("d", self.max_rate)
+        self._tokens = multiprocessing.RawValue("d", 1)
+        self._last_refill = multiprocessing.RawValue("d", now)
+        self._last_decrease = multiprocessing.RawValue("d", 0)
+        self._first_request = multiprocessing.RawValue("d", 0)
+        self._requests = multiprocessing.RawValue("q", 0)
+        self._throttles = multiprocessing.RawValue("q", 0)
+        self._failures = multiprocessing.RawValue("q", 0)
+        self._sent_bytes = multiprocessing.RawValue("q", 0)
+        self._wait_time = multiprocessing.RawValue("d", 0)
+
+    @classmethod
+    def get_instance(cls, name: str, max_rate: float = 10):
+        """Returns the limiter of a service, created at the first call
+        Call it before the NER processes are forked, so they share the limiter.
+        Args:
+            name (str): name of the service.
+            max_rate (float): initial and maximum rate, used at the first call only.
+        """
+        with cls._instances_lock:
+            if name not in cls._instances:
+                cls._instances[name] = RateLimiter(max_rate)
+            return cls._instances[name]
+
+    @classmethod
+    def get_all_stats(cls) -> dict:
+        """Returns the statistics of all the limiters, by name"""
+        with cls._instances_lock:
+            return {name: limiter.get_stats() for name, limiter in cls._instances.items()}
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Wait for a token, before sending a request
+        Args:
+            timeout (float): maximum waiting time, in seconds, no limit if None.
+        Returns:
+            bool: False if no token was given before the timeout.
+        """
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                rate = self._rate.value
+                # The bucket holds at most one second of requests
+                self._tokens.value = min(
+                    self._tokens.value + (now - self._last_refill.value) * rate, max(rate, 1)
+                )
+                self._last_refill.value = now
+                if self._tokens.value >= 1:
+                    self._tokens.value -= 1
+                    self._requests.value += 1
+                    if self._first_request.value == 0:
+                        self._first_request.value = now
+                    self._wait_time.value += now - start
+                    return True
+                delay = (1 - self._tokens.value) / rate
+            if timeout is not None and now + delay - start > timeout:
+                return False
+            time.sleep(delay)
+
+    def on_success(self, sent_bytes: int = 0):
+        """Increase the rate after a successful request"""
+        with self._lock:
+            rate = self._rate.value
+            self._rate.value = min(rate + self.increase / rate, self.max_rate)
+            self._sent_bytes.value += sent_bytes
+
+    def on_throttle(self):
+        """Decrease the rate after a throttled request"""
+        with self._lock:
+            self._throttles.value += 1
+            now = time.monotonic()
+            if now - self._last_decrease.value >= self.decrease_interval:
+                self._last_decrease.value = now
+                self._rate.value = max(self._rate.value * self.decrease, self.min_rate)
+                # The requests already allowed are delayed too
+                self._tokens.value = min(self._tokens.value, 0)
+
+    def on_failure(self):
+        """Count a request failed for another reason than the throttling"""
+        with self._lock:
+            self._failures.value += 1
+
+    def get_stats(self) -> dict:
+        """Returns the current rate, the throughput and the number of throttled requests"""
+        with self._lock:
+            elapsed = time.monotonic() - self._first_request.value
+            active = self._first_request.value > 0 and elapsed > 0
+            requests = self._requests.value
+            return {
+                "rate": round(self._rate.value, 3),
+                "max_rate": self.max_rate,
+                "requests": requests,
+                "throttled_requests": self._throttles.value,
+                "failed_requests": self._failures.value,
+                "sent_bytes": self._sent_bytes.value,
+                "requests_per_second": round(requests / elapsed, 3) if active else 0,
+                "bytes_per_second": round(self._sent_bytes.value / elapsed, 3) if active else 0,
+                "average_wait_ms":
+                    round(self._wait_time.value * 1000 / requests, 3) if requests else 0
+            }
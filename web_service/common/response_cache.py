@@ -0,0 +1,117 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from .config import Config
+
+class CachedResponse:
+    """Rendered response of a finished document, with its validators"""
+
+    __slots__ = ("body", "etag", "last_modified")
+
+    def __init__(self, body: bytes, last_modified: datetime = None):
+        self.body = body
+        # The ETag is computed once, from the rendered body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = last_modified
+
+class ResponseCache:
+    """LRU of the rendered responses of the finished documents (SUCCESS, PARTIAL or ERROR),
+    bounded by the total size of the bodies
+    The finished documents never change, so their responses are never invalidated.
+    The PENDING documents must not be cached, their response changes at the end of the NER.
+    """
+
+    # Cache of the current process, see get_instance()
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    # Statuses of the documents which never change anymore
+    FINISHED_STATUSES = ("SUCCESS", "PARTIAL", "ERROR")
+
+    def __init__(self: object, max_size: int = 64 * 1024 * 1024):
+        """Initialize the object
+        Args:
+            max_size (int): maximum total size of the cached bodies, in bytes, 0 to disable.
+        """
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._responses = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @classmethod
+    def get_instance(cls, config: Config):
+        """Returns the cache of the current process, configured at the first call"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = ResponseCache(config.get_response_cache_size())
+            return cls._instance
+
+    @staticmethod
+    def parse_date(date: str):
+        """Returns the datetime of a date of the database (local time), or None"""
+        try:
+            return datetime.strptime(date, "%Y-%m-%d-%H-%M-%S.%f").astimezone()
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, key: tuple):
+        """Returns the CachedResponse of the key, otherwise - returns None"""
+        with self._lock:
+            response = self._responses.get(key)
+            if response is None:
+                self._misses += 1
+                return None
+            self._responses.move_to_end(key)
+            self._hits += 1
+            return response
+
+    def put(self, key: tuple, status: str, body: str, last_modified: datetime = None):
+        """Render a response, and cache it if the document is finished
+        Args:
+            key (tuple): key of the response, for example ("metadata", doc_id).
+            status (str): status of the document, only the finished documents are cached.
+            body (str): body of the response.
+            last_modified (datetime): date of the last modification of the document.
+        Returns:
+            CachedResponse: the rendered response, with its ETag.
+        """
+        response = CachedResponse(body.encode("utf-8"), last_modified)
+        if status not in self.FINISHED_STATUSES or len(response.body) > self.max_size:
+            return response
+
+        with self._lock:
+            previous_response = self._responses.pop(key, None)
+            if previous_response is not None:
+                self._size -= len(previous_response.body)
+            self._responses[key] = response
+            self._size += len(response.body)
+            # We remove the least recently used responses
+            while self._size > self.max_size:
+                _, evicted_response = self._responses.popitem(last=False)
+                self._size -= len(evicted_response.body)
+                self._evictions += 1
+        return response
+
+    def get_stats(self) -> dict:
+        """Returns the statistics of the cache"""
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                "responses": len(self._responses),
+                "size": self._size,
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / requests, 3) if requests > 0 else 0.0,
+                "evictions": self._evictions
+            }
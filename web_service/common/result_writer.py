@@ -0,0 +1,181 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import multiprocessing
+import sys
+import threading
+import time
+from web_service.common.base import session_scope
+from web_service.common.batching import iter_batches
+from web_service.common.status_notifier import StatusNotifier
+
+class ResultWriter:
+    """Single writer of the results of the NER workers
+    SQLite allows only one writer at a time, so the workers don't write their results:
+    they send them to the writer through a queue, and the writer commits them by batch,
+    one transaction per batch.
+    A result is a dict of the columns to update, with the "object_id" and "status" keys.
+    It is written by the write_results(session, results) static method of its document class,
+    so all the updates of a document are in the same transaction.
+    """
+
+    # Queue of the writer, in the worker processes, see connect()
+    _worker_queue = None
+
+    def __init__(self: object, batch_size: int = 64, batch_timeout: float = 0.05,
+                 queue_size: int = 100):
+        """Initialize the object
+        Args:
+            batch_size (int): maximum number of results committed in the same transaction.
+            batch_timeout (float): time the writer waits for more results to fill a batch,
+            in seconds.
+            queue_size (int): maximum number of results waiting for the writer,
+            the workers wait for a free place when the queue is full.
+        """
+        self.batch_size = max(batch_size, 1)
+        self.batch_timeout = batch_timeout
+        self.queue_size = queue_size
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._results = 0
+        self._failed_results = 0
+        self._max_batch_size = 0
+        self._total_commit_latency = 0.0
+        self._max_commit_latency = 0.0
+
+    def start(self, result_queue=None):
+        """Start the thread of the writer
+        Args:
+            result_queue (multiprocessing.Queue): queue of the results, created if None.
+        """
+        if result_queue is None:
+            result_queue = multiprocessing.Queue(self.queue_size)
+        self._queue = result_queue
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Stop the writer, after the results already in the queue
+        Args:
+            timeout (float): time to wait for the writer, in seconds.
+        """
+        if self._thread is not None:
+            # A None result stops the writer
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    @classmethod
+    def connect(cls, result_queue):
+        """Send the results of the current (worker) process to the writer of this queue"""
+        cls._worker_queue = result_queue
+
+    @classmethod
+    def send(cls, document_class, result: dict) -> bool:
+        """Send a result to the writer, if the current process is connected to a writer
+        Args:
+            document_class (type): class whose write_results() method writes the result.
+            result (dict): columns to update, see ResultWriter.
+        Returns:
+            bool: False if the current process has no writer, so the caller must write itself.
+        """
+        if cls._worker_queue is None:
+            return False
+        cls._worker_queue.put((document_class, result))
+        return True
+
+    def get_stats(self) -> dict:
+        """Returns the batch size and the commit latency of the writer"""
+        try:
+            queue_depth = self._queue.qsize()
+        except NotImplementedError:
+            # qsize() is not implemented on macOS
+            queue_depth = None
+        with self._lock:
+            batches = self._batches
+            return {
+                "queue_depth": queue_depth,
+                "batches": batches,
+                "committed_results": self._results,
+                "failed_results": self._failed_results,
+                "average_batch_size": round(self._results / batches, 3) if batches else 0,
+                "max_batch_size": self._max_batch_size,
+                "average_commit_latency_ms":
+                    round(self._total_commit_latency * 1000 / batches, 3) if batches else 0,
+                "max_commit_latency_ms": round(self._max_commit_latency * 1000, 3)
+            }
+
+    def _run(self):
+        """Main loop of the writer thread"""
+        # A None result stops the writer, after the current batch
+        for batch in iter_batches(self._queue, self.batch_size, self.batch_timeout):
+            start = time.perf_counter()
+            try:
+                self._commit(batch)
+                committed_results = len(batch)
+            # The writer must survive to any error of a result
+            except Exception as err: # pylint: disable=broad-except
+                print(f"Error while committing a batch of results: {err}", file=sys.stderr)
+                # We don't know which result failed, so we commit them one by one
+                committed_results = 0
+                for result in batch:
+                    if self._commit_one(result):
+                        committed_results += 1
+            latency = time.perf_counter() - start
+
+            with self._lock:
+                self._batches += 1
+                self._results += committed_results
+                self._failed_results += len(batch) - committed_results
+                self._max_batch_size = max(self._max_batch_size, len(batch))
+                self._total_commit_latency += latency
+                self._max_commit_latency = max(self._max_commit_latency, latency)
+
+    @staticmethod
+    def _commit(batch: list):
+        """Write the results of a batch in a single transaction"""
+        # The results are written together by document class, in the order of the batch
+        results_by_class = {}
+        for document_class, result in batch:
+            results_by_class.setdefault(document_class, []).append(result)
+        with session_scope() as session:
+            for document_class, results in results_by_class.items():
+                document_class.write_results(session, results)
+            session.commit()
+        # The requests waiting for the documents are notified after the commit
+        notifier = StatusNotifier.get_instance()
+        for _, result in batch:
+            notifier.notify(result["object_id"], result["status"])
+
+    @staticmethod
+    def _commit_one(result: tuple) -> bool:
+        """Write a result in its own transaction, or set the ERROR status of its document
+        Returns:
+            bool: True if the result has been written.
+        """
+        document_class, values = result
+        try:
+            ResultWriter._commit([result])
+            return True
+        except Exception as err: # pylint: disable=broad-except
+            print(
+                f"Error while committing the document {values['object_id']}: {err}",
+                file=sys.stderr
+            )
+        try:
+            ResultWriter._commit([(document_class, {
+                "object_id": values["object_id"],
+                "status": "ERROR",
+                "uploaded_date": values.get("uploaded_date")
+            })])
+        except Exception as err: # pylint: disable=broad-except
+            print(
+                f"Error while setting the ERROR of the document {values['object_id']}: {err}",
+                file=sys.stderr
+            )
+        return False
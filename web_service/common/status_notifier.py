@@ -0,0 +1,105 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import queue
+import threading
+
+class TooManySubscribersError(Exception):
+    """Raised when the maximum number of subscribers of the notifier is reached"""
+
+class StatusNotifier:
+    """In-process notifications of the status changes of the documents
+    The writers of the statuses (the ResultWriter, the updates of the current process)
+    notify the requests waiting for these documents, so the requests don't poll the database.
+    """
+
+    # Notifier of the current process, see get_instance()
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self: object, max_subscribers: int = 0):
+        """Initialize the object
+        Args:
+            max_subscribers (int): maximum number of queues subscribed at once, 0 for no limit.
+        """
+        self._lock = threading.Lock()
+        self.max_subscribers = max_subscribers
+        # Queues of the subscribers of each document
+        self._subscribers = {}
+        # All the subscribed queues
+        self._queues = set()
+        # Functions called with the status changes of all the documents, see add_listener()
+        self._listeners = []
+
+    @classmethod
+    def get_instance(cls):
+        """Returns the notifier of the current process"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = StatusNotifier()
+            return cls._instance
+
+    def subscribe(self, object_ids: list) -> queue.SimpleQueue:
+        """Returns a queue receiving the (object_id, status) tuples of the documents
+        The caller must unsubscribe() the queue.
+        Raises:
+            TooManySubscribersError: if max_subscribers queues are already subscribed.
+        """
+        subscriber = queue.SimpleQueue()
+        with self._lock:
+            if 0 < self.max_subscribers <= len(self._queues):
+                raise TooManySubscribersError(
+                    f"The maximum of {self.max_subscribers} subscribers is reached"
+                )
+            self._queues.add(subscriber)
+            for object_id in object_ids:
+                self._subscribers.setdefault(object_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.SimpleQueue, object_ids: list):
+        """Stop the notifications of the documents to a queue returned by subscribe()
+        A queue already unsubscribed is ignored.
+        """
+        with self._lock:
+            self._queues.discard(subscriber)
+            for object_id in object_ids:
+                subscribers = self._subscribers.get(object_id)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if len(subscribers) == 0:
+                        del self._subscribers[object_id]
+
+    def add_listener(self, listener):
+        """Call a function with the (object_id, status) of all the status changes
+        The listener is called by the thread of the writer of the status, it must return quickly.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Stop the calls of a function given to add_listener()"""
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def notify(self, object_id: int, status: str):
+        """Send the new status of a document to its subscribers and to the listeners"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(object_id, ()))
+            listeners = list(self._listeners)
+        for subscriber in subscribers:
+            subscriber.put((object_id, status))
+        for listener in listeners:
+            listener(object_id, status)
+
+    def get_stats(self) -> dict:
+        """Returns the number of documents waited by the requests, and of these requests"""
+        with self._lock:
+            return {
+                "waited_documents": len(self._subscribers),
+                "subscribers": len(self._queues),
+                "max_subscribers": self.max_subscribers
+            }
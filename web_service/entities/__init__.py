@@ -5,6 +5,12 @@ Web service specialized in Named Entity Recognition (NER), in Natural Language P
 """
 
 from .document_entity import DocumentEntity, DocumentEncoder
+from .batch_entity import BatchEntity
+from .document_block import DocumentBlock
+from .document_named_entity import DocumentNamedEntity
+from .named_entity_index import NamedEntityIndex
+from .named_entity_merger import NamedEntityMerger
 from .named_entity import NamedEntity, NamedEntityEncoder, NamedEntityScoreEnum, NamedEntityTypeEnum
+from .named_entity import NamedEntityRelationshipEnum
 from .pdf_entity import PdfEntity
 from .message_entity import MessageEntity, MessageEncoder
@@ -0,0 +1,94 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, ForeignKey, Table, insert, select
+from web_service.common.base import Base, session_scope
+from .document_entity import DocumentEntity
+
+# Documents of each batch, in the order of the submission
+# A document can be in several batches, when the same file is uploaded again
+batch_document_table = Table(
+    "batch_document",
+    Base.metadata,
+    Column("batch_id", Integer, ForeignKey("batch.id"), primary_key=True),
+    Column("position", Integer, primary_key=True),
+    Column("document_id", Integer, ForeignKey("document.id"), index=True)
+)
+
+class BatchEntity(Base):
+    """Class for representing a batch of documents submitted in one request,
+    and his Data Access Object
+    """
+
+    # Table name in the database
+    __tablename__ = "batch"
+    # Internal ID is used to store the real ID (in database) after the session close
+    internal_id = None
+    # ID primary key in the database
+    id = Column("id", Integer, primary_key=True)
+    # Submission date and time column in the database
+    created_date = Column("created_date", String(255))
+    # Number of documents in the batch
+    number_of_documents = Column("number_of_documents", Integer)
+
+    def insert(self, document_ids: list):
+        """Insert a new batch with its documents to the database
+        Args:
+            document_ids (list<int>): ids of the documents, in the order of the submission.
+        Returns:
+            int: ID of the batch in the database.
+        """
+
+        with session_scope() as session:
+            self.created_date = datetime.today().strftime("%Y-%m-%d-%H-%M-%S.%f")
+            self.number_of_documents = len(document_ids)
+            session.add(self)
+            # We need the ID of the batch for its documents
+            session.flush()
+            if len(document_ids) > 0:
+                session.execute(
+                    insert(batch_document_table),
+                    [{"batch_id": self.id, "position": position, "document_id": document_id}
+                     for position, document_id in enumerate(document_ids)]
+                )
+            session.commit()
+            # We save the ID cause it will wiped after the session.close()
+            self.internal_id = self.id
+
+        return self.internal_id
+
+    @staticmethod
+    def get_status(batch_id: int):
+        """Returns the aggregate progress of a batch, otherwise - returns None if not found"""
+
+        with session_scope() as session:
+            batch = session.query(BatchEntity).get(batch_id)
+            if batch is None:
+                return None
+
+            stmt = select(DocumentEntity.id, DocumentEntity.status) \
+                .join(batch_document_table,
+                      batch_document_table.c.document_id == DocumentEntity.id) \
+                .where(batch_document_table.c.batch_id == batch_id) \
+                .order_by(batch_document_table.c.position)
+            documents = [
+                {"id": document_id, "status": status}
+                for document_id, status in session.execute(stmt)
+            ]
+
+        statuses = {"PENDING": 0, "SUCCESS": 0, "PARTIAL": 0, "ERROR": 0}
+        for document in documents:
+            statuses[document["status"]] = statuses.get(document["status"], 0) + 1
+        finished = statuses["SUCCESS"] + statuses["PARTIAL"] + statuses["ERROR"]
+        return {
+            "id": batch.id,
+            "created_date": batch.created_date,
+            "number_of_documents": batch.number_of_documents,
+            "statuses": statuses,
+            "progress": round(finished / len(documents), 3) if len(documents) > 0 else 1.0,
+            "documents": documents
+        }
@@ -0,0 +1,130 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+from sqlalchemy import Column, Integer, ForeignKey, insert, select
+from web_service.common.base import Base, copy_document_rows
+from web_service.common.compressed_text import CompressedText
+
+class DocumentBlock(Base):
+    """Class for representing a compressed block of the content of a document in the database
+    The content is cut at the boundaries of its pages, and every block_size characters
+    in the longer pages, then each block is compressed. So a page or a range
+    of the content only decompresses its own blocks.
+    """
+
+    # Table name in the database
+    __tablename__ = "document_block"
+    # ID of the document of the block
+    document_id = Column("document_id", Integer, ForeignKey("document.id"), primary_key=True)
+    # Offset of the first character of the block in the content
+    begin_offset = Column("begin_offset", Integer, primary_key=True)
+    # Offset after the last character of the block
+    end_offset = Column("end_offset", Integer)
+    # Text of the block, compressed
+    content = Column("content", CompressedText)
+
+    # Maximum number of characters of a block, see configure()
+    block_size = 65536
+
+    @classmethod
+    def configure(cls, block_size: int = 65536):
+        """Set the maximum size of the new blocks, for all the processes forked after
+        Args:
+            block_size (int): maximum number of characters of a block.
+        """
+        cls.block_size = max(block_size, 1)
+
+    @staticmethod
+    def split(content: str, page_offsets: list = None) -> list:
+        """Returns the compressed blocks of a content
+        Args:
+            content (str): content of a document.
+            page_offsets (list<int>): offset of the first character of each page,
+            the content is a single page if None.
+        Returns:
+            list<tuple>: begin offset, end offset and compressed text of each block,
+            a single empty block for an empty content.
+        """
+        boundaries = {0}
+        if page_offsets is not None:
+            boundaries.update(offset for offset in page_offsets if 0 < offset < len(content))
+        boundaries = sorted(boundaries)
+
+        blocks = []
+        for begin, end in zip(boundaries, boundaries[1:] + [len(content)]):
+            for block_begin in range(begin, max(end, begin + 1), DocumentBlock.block_size):
+                block_end = min(block_begin + DocumentBlock.block_size, end)
+                blocks.append((
+                    block_begin, block_end,
+                    CompressedText.compress(content[block_begin:block_end])
+                ))
+        return blocks
+
+    @staticmethod
+    def insert_blocks(session, document_id: int, blocks: list):
+        """Replace the blocks of a document with a single bulk INSERT
+        The caller must commit the session.
+        Args:
+            session (Session): session of the transaction.
+            document_id (int): id of the document.
+            blocks (list<tuple>): blocks returned by split().
+        """
+        session.query(DocumentBlock) \
+            .filter(DocumentBlock.document_id == document_id) \
+            .delete(synchronize_session=False)
+        session.execute(
+            insert(DocumentBlock.__table__),
+            [{
+                "document_id": document_id,
+                "begin_offset": begin_offset,
+                "end_offset": end_offset,
+                "content": content
+            } for begin_offset, end_offset, content in blocks]
+        )
+
+    @staticmethod
+    def copy_blocks(session, source_document_id: int, document_id: int):
+        """Copy the blocks of a document to another document, in SQL, without decompressing them
+        The caller must commit the session.
+        """
+        copy_document_rows(
+            session, DocumentBlock.__table__, ["begin_offset", "end_offset", "content"],
+            source_document_id, document_id
+        )
+
+    @staticmethod
+    def read(session, document_id: int, begin_offset: int = 0, end_offset: int = None):
+        """Returns a range of the content of a document, from the blocks of the range only
+        Args:
+            session (Session): session used for the queries.
+            document_id (int): id of the document.
+            begin_offset (int): offset of the first character of the range.
+            end_offset (int): offset after the last character of the range,
+            None for the end of the content.
+        Returns:
+            str: text of the range, None if the content of the document is not in blocks.
+        """
+        stmt = select(DocumentBlock.begin_offset, DocumentBlock.content) \
+            .where(DocumentBlock.document_id == document_id) \
+            .where(DocumentBlock.end_offset > begin_offset) \
+            .order_by(DocumentBlock.begin_offset)
+        if end_offset is not None:
+            stmt = stmt.where(DocumentBlock.begin_offset < end_offset)
+        rows = session.execute(stmt).all()
+        if len(rows) == 0:
+            # The range is after the end of the content, or the content is not in blocks
+            stored = session.execute(
+                select(DocumentBlock.document_id)
+                .where(DocumentBlock.document_id == document_id)
+                .limit(1)
+            ).first()
+            return "" if stored is not None else None
+
+        text = "".join(row.content for row in rows)
+        first_offset = rows[0].begin_offset
+        if end_offset is None:
+            return text[begin_offset - first_offset:]
+        return text[begin_offset - first_offset:max(end_offset - first_offset, 0)]
@@ -4,17 +4,30 @@ Authors: Jonathan CASSAING
 Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
 """
 
+import hashlib
 import json
 import sys
+from bisect import bisect_right
 from datetime import datetime
-from multiprocessing import Process
 from pathlib import Path
-from sqlalchemy import Column, Integer, String
-from web_service.common.base import Base, session_factory
+from sqlalchemy import Column, Integer, String, func, select
+from sqlalchemy.orm import deferred, undefer
+from web_service.common.base import Base, session_scope
+from web_service.common.compressed_text import CompressedText
 from web_service.common.config import Config
+from web_service.common.ner_worker_pool import NerWorkerPool, QueueFullError
+from web_service.common.rate_limiter import RateLimiter
+from web_service.common.result_writer import ResultWriter
+from web_service.common.status_notifier import StatusNotifier
 from web_service.services.spacy_ner_service import SpacyNerService
 from web_service.services.aws_comprehend_ner_service import AwsComprehendNerService
-from .named_entity import NamedEntityRelationshipEnum, NamedEntityScoreEnum, NamedEntityEncoder
+from web_service.services.ner_interface import IncompleteExtractionError
+from web_service.services.ner_result_cache import NerResultCache
+from .named_entity import NamedEntityRelationshipEnum, NamedEntityEncoder
+from .named_entity_merger import NamedEntityMerger
+from .document_block import DocumentBlock
+from .document_named_entity import DocumentNamedEntity
+from .named_entity_index import NamedEntityIndex
 
 class DocumentEntity(Base):
     """Class for representing a generic document entity and his Data Access Object
@@ -27,7 +40,8 @@ class DocumentEntity(Base):
     # ID primary key in the database
     # Nota: this id is wiped after a session.close()
     id = Column("id", Integer, primary_key=True)
-    # Status column in the database
+    # Status column in the database: PENDING, then SUCCESS, PARTIAL (a NER service failed on a
+    # part of the document, so the named entities are incomplete) or ERROR
     status = Column("status", String(255))
     # Uploaded date and time column in the database
     uploaded_date = Column("uploaded_date", String(255))
@@ -45,100 +59,28 @@ class DocumentEntity(Base):
     number_of_pages = Column("number_of_pages", Integer)
     # Raw informations PDF meta data
     raw_info = Column("raw_info", String())
-    # Content column in the database
-    content = Column("content", String)
-    # Named entities extracted in json format
-    named_entities = Column("named_entities", String())
+    # Content column of the documents stored by a previous version, NULL for the new documents
+    # whose content is stored in compressed blocks, see DocumentBlock and find_content_part().
+    # The compress-database command moves these contents to blocks.
+    # The content is deferred: it is loaded (and decompressed) only when the attribute is read,
+    # so the queries of the metadata and of the status never read the text
+    content = deferred(Column("content", CompressedText))
+    # Named entities extracted in json format, serialized once when the document is processed,
+    # so the metadata are served without encoding the named entities at each request.
+    # The named entities are also stored in the named_entity table, see DocumentNamedEntity
+    named_entities = Column("named_entities", CompressedText)
+    # SHA-256 of the uploaded file, used to detect the documents uploaded several times
+    content_hash = Column("content_hash", String(64), index=True)
+    # Offset of the first character of each page in the content, in json format,
+    # so a page is read from the content without reading the other pages
+    page_offsets = Column("page_offsets", String())
+    # URL receiving the completion of the document (SUCCESS or ERROR), see WebhookSender
+    callback_url = Column("callback_url", String(2048))
 
     def __init__(self: object, config: Config):
         """Initialize the object"""
         self.config = config
 
-    @staticmethod
-    def _binary_search(named_entities, target_begin_offset):
-        """This algorithm is a binary search
-        It search in the named_entities list,
-        the named entity which match with target_begin_offset.
-        The named_entities list must be sorted by begin_offset field
-        Args:
-            named_entities (list<NamedEntity>): list where search the offset.
-            target_begin_offset (int): offset to search in the list.
-        Returns:
-            index: the index of the offset searched,
-            otherwise the nearest index if the offset was not found,
-            None in case of error.
-            named_entity: the named_entity matching with the specified offset,
-            otherwise - returns None.
-        """
-        aaa = 0
-        bbb = len(named_entities)
-        if bbb == 0:
-            # If the list is empty, we leave
-            return None, None
-        while bbb > aaa + 1:
-            mmm = (aaa + bbb) // 2
-            if named_entities[mmm].begin_offset > target_begin_offset:
-                bbb = mmm
-            else:
-                aaa = mmm
-
-        if named_entities[aaa].begin_offset == target_begin_offset:
-            return aaa, named_entities[aaa]
-
-        if named_entities[aaa].begin_offset > target_begin_offset:
-            nearest_index = aaa
-        else:
-            nearest_index = bbb
-
-        return nearest_index, None
-
-    def _merge(self, named_entities_1, named_entities_2) -> list:
-        """Merge distinct the two named_entities_1 and named_entities_2 lists
-        These two lists must be sorted by begin_offset field
-        Args:
-            named_entities_1 (list<NamedEntity>): list to merge.
-            named_entities_2 (list<NamedEntity>): list to merge.
-        Returns:
-            list<NamedEntity>: merged list.
-        """
-        # First, we search the smallest list
-        if len(named_entities_1) < len(named_entities_2):
-            smallest_list = named_entities_1
-            biggest_list = named_entities_2
-        else:
-            smallest_list = named_entities_2
-            biggest_list = named_entities_1
-
-        # We merge each element of the smallest list in the biggest list
-        for named_entity in smallest_list:
-            # We search the named_entity in the biggest list
-            index, named_entity_searched = self._binary_search(
-                biggest_list,
-                named_entity.begin_offset
-                )
-            if index is not None:
-                # If we have found it and the text match the current named entity
-                # No need to insert
-                if named_entity_searched is not None \
-                    and (named_entity_searched.text == named_entity.text):
-                    # But we just keep the aws_score (if exist)
-                    try:
-                        if named_entity.aws_score is not None:
-                            named_entity_searched.aws_score = named_entity.aws_score
-                    except AttributeError:
-                        pass
-                    # Also, we increment the score
-                    if named_entity_searched.score == NamedEntityScoreEnum.LOW:
-                        named_entity_searched.score = NamedEntityScoreEnum.MEDIUM
-                    elif named_entity_searched.score == NamedEntityScoreEnum.MEDIUM:
-                        named_entity_searched.score = NamedEntityScoreEnum.HIGH
-                # Else, we have no found the named entity
-                else:
-                    # So, we insert it as new element in the biggest list
-                    biggest_list.insert(index, named_entity)
-
-        return biggest_list
-
     def insert(
             self,
             uploaded_date: str = None,
@@ -150,40 +92,81 @@ class DocumentEntity(Base):
             number_of_pages: int = None,
             raw_info: str = None,
             content: str = None,
-            named_entities: str = None):
+            named_entities: list = None,
+            content_hash: str = None,
+            callback_url: str = None):
         """Insert a new object to the database"""
 
-        session = session_factory()
-        self.status = "PENDING"
-        if uploaded_date is not None:
-            self.uploaded_date = str(uploaded_date)
-        if author is not None:
-            self.author = str(author)
-        if creator is not None:
-            self.creator = str(creator)
-        if producer is not None:
-            self.producer = str(producer)
-        if subject is not None:
-            self.subject = str(subject)
-        if title is not None:
-            self.title = str(title)
-        if number_of_pages is not None:
-            self.number_of_pages = number_of_pages
-        if raw_info is not None:
-            self.raw_info = str(raw_info)
-        if content is not None:
-            self.content = str(content)
-        if named_entities is not None:
-            self.named_entities = str(named_entities)
-        session.add(self)
-        session.commit()
+        with session_scope() as session:
+            self.status = "PENDING"
+            if uploaded_date is not None:
+                self.uploaded_date = str(uploaded_date)
+            if author is not None:
+                self.author = str(author)
+            if creator is not None:
+                self.creator = str(creator)
+            if producer is not None:
+                self.producer = str(producer)
+            if subject is not None:
+                self.subject = str(subject)
+            if title is not None:
+                self.title = str(title)
+            if number_of_pages is not None:
+                self.number_of_pages = number_of_pages
+            if raw_info is not None:
+                self.raw_info = str(raw_info)
+            if content_hash is not None:
+                self.content_hash = str(content_hash)
+            if callback_url is not None:
+                self.callback_url = str(callback_url)
+            session.add(self)
+            if content is not None:
+                # We need the ID of the document for its blocks
+                session.flush()
+                DocumentBlock.insert_blocks(session, self.id, DocumentBlock.split(str(content)))
+            if named_entities is not None:
+                # We need the ID of the document for its named entities
+                session.flush()
+                self.named_entities = json.dumps(named_entities, cls=NamedEntityEncoder)
+                DocumentNamedEntity.insert_named_entities(session, self.id, named_entities)
+                NamedEntityIndex.index_named_entities(session, self.id, named_entities)
+            session.commit()
+            # We save the ID cause it will wiped after the session.close()
+            self.internal_id = self.id
+
+        return self.internal_id
+
+    def update(
+            self,
+            object_id: int,
+            status: str = "SUCCESS",
+            uploaded_date: str = None,
+            author: str = None,
+            creator: str = None,
+            producer: str = None,
+            subject: str = None,
+            title: str = None,
+            number_of_pages: int = None,
+            raw_info: str = None,
+            content: str = None,
+            named_entities: list = None,
+            content_hash: str = None,
+            page_offsets: list = None):
+        """Update an object in the database
+        The named entities (list<NamedEntity>) are inserted in the named_entity table,
+        in the same transaction."""
+
+        result = DocumentEntity._make_result(
+            object_id, status, uploaded_date, author, creator, producer, subject, title,
+            number_of_pages, raw_info, content, named_entities, content_hash, page_offsets
+        )
+        type(self).commit_results([result])
         # We save the ID cause it will wiped after the session.close()
         self.internal_id = self.id
-        session.close()
 
         return self.internal_id
 
-    def update(
+    def save_result(
             self,
             object_id: int,
             status: str = "SUCCESS",
@@ -196,39 +179,327 @@ class DocumentEntity(Base):
             number_of_pages: int = None,
             raw_info: str = None,
             content: str = None,
-            named_entities: str = None):
-        """Update an object in the database"""
+            named_entities: list = None,
+            content_hash: str = None,
+            page_offsets: list = None):
+        """Save the result of the NER of a document, see update() for the arguments
+        In a NER worker process, the result is sent to the ResultWriter, which commits it
+        with the results of the other workers, otherwise the object is updated immediately."""
+
+        result = DocumentEntity._make_result(
+            object_id, status, uploaded_date, author, creator, producer, subject, title,
+            number_of_pages, raw_info, content, named_entities, content_hash, page_offsets
+        )
+        if not ResultWriter.send(type(self), result):
+            type(self).commit_results([result])
+
+    @classmethod
+    def commit_results(cls, results: list):
+        """Write the results in a transaction, then notify the requests waiting for them
+        Args:
+            results (list<dict>): results returned by _make_result().
+        """
+        with session_scope() as session:
+            cls.write_results(session, results)
+            session.commit()
+        notifier = StatusNotifier.get_instance()
+        for result in results:
+            notifier.notify(result["object_id"], result["status"])
 
-        session = session_factory()
-        pdf_entity = session.query(DocumentEntity).get(object_id)
-        pdf_entity.status = status
+    @staticmethod
+    def _make_result(
+            object_id: int,
+            status: str,
+            uploaded_date: str = None,
+            author: str = None,
+            creator: str = None,
+            producer: str = None,
+            subject: str = None,
+            title: str = None,
+            number_of_pages: int = None,
+            raw_info: str = None,
+            content: str = None,
+            named_entities: list = None,
+            content_hash: str = None,
+            page_offsets: list = None) -> dict:
+        """Returns the columns to update, for write_results()
+        The None arguments are not updated. The named entities are serialized,
+        and the payloads are compressed here, so a worker process does it instead of the writer.
+        The content is cut in blocks at the page offsets, see DocumentBlock."""
+
+        result = {"object_id": object_id, "status": status}
         if uploaded_date is not None:
-            pdf_entity.uploaded_date = str(uploaded_date)
+            result["uploaded_date"] = str(uploaded_date)
         if author is not None:
-            pdf_entity.author = str(author)
+            result["author"] = str(author)
         if creator is not None:
-            pdf_entity.creator = str(creator)
+            result["creator"] = str(creator)
         if producer is not None:
-            pdf_entity.producer = str(producer)
+            result["producer"] = str(producer)
         if subject is not None:
-            pdf_entity.subject = str(subject)
+            result["subject"] = str(subject)
         if title is not None:
-            pdf_entity.title = str(title)
+            result["title"] = str(title)
         if number_of_pages is not None:
-            pdf_entity.number_of_pages = number_of_pages
+            result["number_of_pages"] = number_of_pages
         if raw_info is not None:
-            pdf_entity.raw_info = str(raw_info)
+            result["raw_info"] = str(raw_info)
         if content is not None:
-            pdf_entity.content = str(content)
+            result["content_blocks"] = DocumentBlock.split(str(content), page_offsets)
+        if content_hash is not None:
+            result["content_hash"] = str(content_hash)
+        if page_offsets is not None:
+            result["page_offsets"] = json.dumps(page_offsets)
         if named_entities is not None:
-            pdf_entity.named_entities = str(named_entities)
-        session.commit()
-        # We save the ID cause it will wiped after the session.close()
-        self.internal_id = self.id
-        session.close()
+            result["named_entities"] = CompressedText.compress(
+                json.dumps(named_entities, cls=NamedEntityEncoder)
+            )
+            result["named_entity_list"] = named_entities
+        return result
+
+    @staticmethod
+    def write_results(session, results: list):
+        """Write the results of several documents, see ResultWriter
+        Each document is updated by a single UPDATE, without loading its current content,
+        its content blocks are inserted in the document_block table,
+        and its named entities are inserted in the named_entity table.
+        The caller must commit the session.
+        Args:
+            session (Session): session of the transaction.
+            results (list<dict>): results returned by _make_result().
+        """
+        table = DocumentEntity.__table__
+        for result in results:
+            object_id = result["object_id"]
+            values = {
+                column: value for column, value in result.items() if column in table.c
+            }
+            session.execute(table.update().where(table.c.id == object_id).values(values))
+            content_blocks = result.get("content_blocks")
+            if content_blocks is not None:
+                DocumentBlock.insert_blocks(session, object_id, content_blocks)
+            named_entities = result.get("named_entity_list")
+            if named_entities is not None:
+                DocumentNamedEntity.insert_named_entities(session, object_id, named_entities)
+                # The inverted index is updated incrementally, document by document
+                NamedEntityIndex.index_named_entities(session, object_id, named_entities)
+
+    @staticmethod
+    def find_by_content_hash(content_hash: str):
+        """Returns the last document uploaded with the same content hash,
+        and not in ERROR or PARTIAL, otherwise - returns None"""
+
+        with session_scope() as session:
+            document = session.query(DocumentEntity) \
+                .filter(DocumentEntity.content_hash == content_hash) \
+                .filter(DocumentEntity.status.notin_(("ERROR", "PARTIAL"))) \
+                .order_by(DocumentEntity.id.desc()) \
+                .first()
+        return document
+
+    @staticmethod
+    def find_statuses(object_ids: list) -> dict:
+        """Returns the status of the documents found, by id"""
+
+        with session_scope() as session:
+            rows = session.execute(
+                select(DocumentEntity.id, DocumentEntity.status)
+                .where(DocumentEntity.id.in_(object_ids))
+            )
+            return dict(rows)
+
+    @staticmethod
+    def find_callbacks(object_ids: list) -> dict:
+        """Returns the (status, callback_url) of the documents found with a callback_url, by id"""
+
+        with session_scope() as session:
+            rows = session.execute(
+                select(DocumentEntity.id, DocumentEntity.status, DocumentEntity.callback_url)
+                .where(DocumentEntity.id.in_(object_ids))
+                .where(DocumentEntity.callback_url.isnot(None))
+            )
+            return {object_id: (status, callback_url) for object_id, status, callback_url in rows}
+
+    @staticmethod
+    def find_content_part(object_id: int, page: int = None,
+                          begin_offset: int = 0, end_offset: int = None):
+        """Returns a part of the content of a document, without loading the rest of the content
+        Only the blocks of the part are read and decompressed, see DocumentBlock.
+        The content of a document stored by a previous version is cut by SQLite,
+        or decompressed then cut if it is compressed.
+        Args:
+            object_id (int): id of the document.
+            page (int): page to return, numbered from 1, or None to return a range.
+            begin_offset (int): offset of the first character of the range.
+            end_offset (int): offset after the last character of the range,
+            None for the end of the content.
+        Returns:
+            dict: status, uploaded_date, page, begin_offset, end_offset and content of the part,
+            otherwise - returns None if the document or the page is not found.
+        """
+
+        with session_scope() as session:
+            document = session.execute(
+                select(
+                    DocumentEntity.status, DocumentEntity.uploaded_date,
+                    DocumentEntity.page_offsets
+                ).where(DocumentEntity.id == object_id)
+            ).first()
+            if document is None:
+                return None
+
+            if page is not None:
+                # Without page offsets, the whole content is the first page
+                page_offsets = [0]
+                if document.page_offsets is not None:
+                    page_offsets = json.loads(document.page_offsets)
+                if page < 1 or page > len(page_offsets):
+                    return None
+                begin_offset = page_offsets[page - 1]
+                end_offset = page_offsets[page] if page < len(page_offsets) else None
+
+            content = DocumentBlock.read(session, object_id, begin_offset, end_offset)
+            if content is None:
+                content = DocumentEntity._read_stored_content(
+                    session, object_id, begin_offset, end_offset
+                )
+
+        return {
+            "status": document.status,
+            "uploaded_date": document.uploaded_date,
+            "page": page,
+            "begin_offset": begin_offset,
+            "end_offset": begin_offset + len(content) if content is not None else None,
+            "content": content
+        }
+
+    @staticmethod
+    def _read_stored_content(session, object_id: int, begin_offset: int, end_offset: int):
+        """Returns a range of the content stored in the document table by a previous version
+        A text content is cut by SQLite, a compressed content is decompressed then cut.
+        Returns:
+            str: text of the range, None if the document has no content.
+        """
+        storage = session.execute(
+            select(func.typeof(DocumentEntity.content)).where(DocumentEntity.id == object_id)
+        ).scalar()
+        if storage == "blob":
+            return session.execute(
+                select(DocumentEntity.content).where(DocumentEntity.id == object_id)
+            ).scalar()[begin_offset:end_offset]
+        # SQLite counts the characters from 1
+        if end_offset is None:
+            part = func.substr(DocumentEntity.content, begin_offset + 1)
+        else:
+            part = func.substr(
+                DocumentEntity.content, begin_offset + 1, max(end_offset - begin_offset, 0)
+            )
+        return session.execute(select(part).where(DocumentEntity.id == object_id)).scalar()
+
+    @staticmethod
+    def move_contents_to_blocks(session, batch_size: int = 100) -> dict:
+        """Move the contents stored in the document table by a previous version
+        to compressed blocks, see DocumentBlock. One transaction per batch of documents.
+        Args:
+            session (Session): session used for the queries.
+            batch_size (int): number of documents per transaction.
+        Returns:
+            dict: number of documents, size of the contents before and after the compression.
+        """
+        report = {"documents": 0, "text_bytes": 0, "compressed_bytes": 0}
+        table = DocumentEntity.__table__
+        rows = None
+        # The moved contents are NULL, so each batch reads the next documents
+        while rows is None or len(rows) == batch_size:
+            rows = session.execute(
+                select(table.c.id, table.c.content, table.c.page_offsets)
+                .where(table.c.content.isnot(None))
+                .limit(batch_size)
+            ).all()
+            for row in rows:
+                page_offsets = None
+                if row.page_offsets is not None:
+                    page_offsets = json.loads(row.page_offsets)
+                blocks = DocumentBlock.split(row.content, page_offsets)
+                DocumentBlock.insert_blocks(session, row.id, blocks)
+                session.execute(
+                    table.update().where(table.c.id == row.id).values(content=None)
+                )
+                report["documents"] += 1
+                report["text_bytes"] += len(row.content.encode("utf-8"))
+                report["compressed_bytes"] += sum(
+                    len(text if isinstance(text, bytes) else text.encode("utf-8"))
+                    for _, _, text in blocks
+                )
+            session.commit()
+
+        if report["compressed_bytes"] > 0:
+            report["ratio"] = round(report["text_bytes"] / report["compressed_bytes"], 3)
+        return report
+
+    def clone(self, source_id: int, object_id: int = None):
+        """Copy an object of the database, with its content blocks and its named entities
+        Args:
+            source_id (int): id of the database line to copy.
+            object_id (int): id of the database line where to copy,
+            if None, a new line is inserted.
+        Returns:
+            int: ID of the copy in the database.
+        """
+
+        with session_scope() as session:
+            source = session.query(DocumentEntity) \
+                .options(undefer(DocumentEntity.content)) \
+                .get(source_id)
+            if object_id is None:
+                target = self
+                session.add(target)
+            else:
+                target = session.query(DocumentEntity).get(object_id)
+            target.status = source.status
+            target.uploaded_date = datetime.today().strftime("%Y-%m-%d-%H-%M-%S.%f")
+            target.author = source.author
+            target.creator = source.creator
+            target.producer = source.producer
+            target.subject = source.subject
+            target.title = source.title
+            target.number_of_pages = source.number_of_pages
+            target.raw_info = source.raw_info
+            target.content = source.content
+            target.named_entities = source.named_entities
+            target.content_hash = source.content_hash
+            target.page_offsets = source.page_offsets
+            # We need the ID of the copy for its named entities
+            session.flush()
+            DocumentNamedEntity.copy_named_entities(session, source_id, target.id)
+            NamedEntityIndex.copy_postings(session, source_id, target.id)
+            DocumentBlock.copy_blocks(session, source_id, target.id)
+            session.commit()
+            # We save the ID cause it will wiped after the session.close()
+            self.internal_id = target.id
+            status = target.status
+
+        StatusNotifier.get_instance().notify(self.internal_id, status)
 
         return self.internal_id
 
+    @staticmethod
+    def compute_content_hash(filename: Path) -> str:
+        """Returns the SHA-256 of a file, in hexadecimal"""
+        sha256 = hashlib.sha256()
+        with open(filename, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def delete(object_id: int):
+        """Delete an object from the database"""
+
+        with session_scope() as session:
+            session.query(DocumentEntity).filter(DocumentEntity.id == object_id).delete()
+            session.commit()
+
     def _async_ner(self, filename: Path, object_id: int):
         """Private method to extract named entities then update a PDF object in the database
         You must use insert() without parameter before,
@@ -241,34 +512,100 @@ class DocumentEntity(Base):
         Returns:
             int: ID of the persisted object in the database.
         """
-        try:
-            # Extracting data end metadata of the document
-            document = self.extract_document(filename)
-        except IOError:
-            print(
-                "Error: the file", filename.absolute, "does not appear to exist",
-                file=sys.stderr
+        self.async_ner_batch([(filename, object_id)])
+        return self.internal_id
+
+    def async_ner_batch(self, tasks: list, saved_ids: set = None):
+        """Extract the named entities of several documents together,
+        then update the objects in the database
+        The named entities of all the documents are extracted by the same NER calls,
+        see extract_named_entities_batch(). This method is called by the workers
+        of the NerWorkerPool, in their own process.
+
+        Args:
+            tasks (list<tuple>): list of (filename, object_id) tuples, see _async_ner()
+            saved_ids (set<int>): if not None, the ids of the documents whose result
+            is saved are added to it, so the caller knows them if an error stops the batch.
+        """
+        documents = []
+        object_ids = []
+        for filename, object_id in tasks:
+            try:
+                # Extracting data end metadata of the document
+                documents.append(self.extract_document(filename))
+                object_ids.append(object_id)
+            except IOError:
+                print(
+                    "Error: the file", filename.absolute, "does not appear to exist",
+                    file=sys.stderr
+                    )
+                # Set the ERROR in database
+                self.save_result(
+                    object_id,
+                    "ERROR",
+                    datetime.today().strftime("%Y-%m-%d-%H-%M-%S.%f")
                 )
-            # Set the ERROR in database
-            self.update(
-                object_id,
-                "ERROR",
-                datetime.today().strftime("%Y-%m-%d-%H-%M-%S.%f")
-            )
-            return self.internal_id
+                if saved_ids is not None:
+                    saved_ids.add(object_id)
+            finally:
+                # The text is extracted, so the uploaded file is no longer needed
+                Path(filename).unlink(missing_ok=True)
 
+        if len(documents) > 0:
+            self._ner_and_update(documents, object_ids, saved_ids)
+
+    def _ner_and_update(self, documents: list, object_ids: list, saved_ids: set = None):
+        """Private method to extract named entities of the documents
+        then update the objects in the database
+
+        Args:
+            documents (list<DocumentEntity>): documents returned by extract_document()
+            object_ids (list<int>): id of the database line to update, for each document
+            saved_ids (set<int>): if not None, the ids of the saved documents are added to it
+        """
+        # Indexes of the documents whose named entities are incomplete
+        incomplete_documents = set()
         try:
             # We extract the named entities
-            named_entities = self.extract_named_entities(document.content)
-            # We convert named entities to json
-            json_named_entities = json.dumps(named_entities, cls=NamedEntityEncoder)
+            named_entities_list = self.extract_named_entities_batch(
+                [document.content for document in documents], incomplete_documents
+            )
         except ValueError as err:
+            if len(documents) > 1:
+                # We don't know which document failed,
+                # so we process them one by one to set the ERROR to this document only
+                for document, object_id in zip(documents, object_ids):
+                    self._ner_and_update([document], [object_id], saved_ids)
+                return
+
             print("Error when extracting named entities:", err)
             # Set the ERROR in database
-            self.update(
-                object_id,
+            self.save_result(
+                object_ids[0],
                 "ERROR",
                 datetime.today().strftime("%Y-%m-%d-%H-%M-%S.%f"),
+                documents[0].author,
+                documents[0].creator,
+                documents[0].producer,
+                documents[0].subject,
+                documents[0].title,
+                documents[0].number_of_pages,
+                documents[0].raw_info,
+                documents[0].content,
+                page_offsets=documents[0].page_offsets
+            )
+            if saved_ids is not None:
+                saved_ids.add(object_ids[0])
+            return
+
+        for index, (document, object_id, named_entities) in enumerate(zip(
+                documents, object_ids, named_entities_list)):
+            DocumentEntity._set_pages(named_entities, document.page_offsets)
+            # Saving content to the database
+            self.save_result(
+                object_id,
+                "PARTIAL" if index in incomplete_documents else "SUCCESS",
+                datetime.today().strftime("%Y-%m-%d-%H-%M-%S.%f"),
                 document.author,
                 document.creator,
                 document.producer,
@@ -276,70 +613,113 @@ class DocumentEntity(Base):
                 document.title,
                 document.number_of_pages,
                 document.raw_info,
-                document.content
+                document.content,
+                named_entities,
+                page_offsets=document.page_offsets
             )
-            return self.internal_id
-
-        # Saving content to the database
-        self.update(
-            object_id,
-            "SUCCESS",
-            datetime.today().strftime("%Y-%m-%d-%H-%M-%S.%f"),
-            document.author,
-            document.creator,
-            document.producer,
-            document.subject,
-            document.title,
-            document.number_of_pages,
-            document.raw_info,
-            document.content,
-            json_named_entities
-        )
-        return self.internal_id
+            if saved_ids is not None:
+                saved_ids.add(object_id)
 
-    def extract_named_entities(self, text: str):
-        """This method extracted the named entities from the text"""
+    @staticmethod
+    def _set_pages(named_entities: list, page_offsets: list):
+        """Set the page (numbered from 1) of each named entity, from its begin offset
+        Args:
+            named_entities (list<NamedEntity>): named entities of a document.
+            page_offsets (list<int>): offset of the first character of each page,
+            nothing is set if None.
+        """
+        if page_offsets is None:
+            return
+        for named_entity in named_entities:
+            named_entity.page = bisect_right(page_offsets, named_entity.begin_offset)
 
+    def _get_ner_services(self) -> list:
+        """Returns the NER services enabled in the config file"""
         ner_services = []
         ner_methods = self.config.get_ner_methods()
+        result_cache = NerResultCache.get_instance(self.config)
         if "aws-comprehend" in ner_methods:
             ner_services.append(AwsComprehendNerService(
                 self.config.get_aws_region(),
-                self.config.get_max_char_per_aws_request()))
+                self.config.get_max_char_per_aws_request(),
+                self.config.get_aws_max_in_flight(),
+                rate_limiter=RateLimiter.get_instance(
+                    "aws-comprehend", self.config.get_aws_max_requests_per_second()
+                ),
+                max_retries=self.config.get_aws_max_retries(),
+                result_cache=result_cache))
         if "nltk" in ner_methods:
             print("NLTK NER method not supported yet")
         if "spacy" in ner_methods:
-            ner_services.append(SpacyNerService())
+            ner_services.append(SpacyNerService(
+                self.config.get_spacy_model(),
+                self.config.get_spacy_excluded_components(),
+                self.config.get_ner_chunk_size(),
+                self.config.get_ner_chunk_overlap(),
+                self.config.get_ner_chunk_processes(),
+                result_cache))
+        return ner_services
 
-        # Now, we must split the text in two parts (before and after "References" key word)
+    def extract_named_entities(self, text: str):
+        """This method extracted the named entities from the text"""
+        return self.extract_named_entities_batch([text])[0]
+
+    def extract_named_entities_batch(self, texts: list, incomplete_texts: set = None):
+        """This method extracted the named entities from several texts
+        Each NER service processes the texts of all the documents together.
+        Args:
+            texts (list<str>): content of each document.
+            incomplete_texts (set<int>): if not None, the indexes of the texts
+            whose named entities are incomplete (a NER service failed) are added to it.
+        Returns:
+            list<list<NamedEntity>>: named entities of each text, in the same order.
+        """
+        # Now, we must split each text in two parts (before and after "References" key word)
         references_word = "References"
-        splited_text = text.rsplit(references_word, 1)
-
-        named_entities = []
-        # For each NER service
-        for ner_service in ner_services:
-            # We get the named entities list
-            named_entities_quoted = ner_service.extract(
-                splited_text[0], NamedEntityRelationshipEnum.QUOTED
-                )
-            # Because the 2nd part of the text (i.e. splited_text[1]), start from 0,
-            # The NER object will locate the named entities from 0, so we have to set an offset,
-            # To take account of the first splited text (before references key word)
-            try:
-                named_entities_referenced = ner_service.extract(
+        segments = []
+        # Index of the text of each segment
+        segments_text_index = []
+        for index, text in enumerate(texts):
+            splited_text = text.rsplit(references_word, 1)
+            segments.append((splited_text[0], NamedEntityRelationshipEnum.QUOTED, 0))
+            segments_text_index.append(index)
+            # If the "References" key word has not been found,
+            # there is no referenced named entities
+            if len(splited_text) > 1:
+                # Because the 2nd part of the text (i.e. splited_text[1]), start from 0,
+                # The NER object will locate the named entities from 0,
+                # so we have to set an offset,
+                # To take account of the first splited text (before references key word)
+                segments.append((
                     splited_text[1], NamedEntityRelationshipEnum.REFERENCED,
                     len(splited_text[0]) + len(references_word)
+                ))
+                segments_text_index.append(index)
+
+        # Named entities of each text, then of each NER service
+        named_entities_lists = [[] for _ in texts]
+        for ner_service in self._get_ner_services():
+            # We get the named entities lists of all the segments
+            service_named_entities_list = [[] for _ in texts]
+            try:
+                segments_named_entities = ner_service.extract_batch(segments)
+            except IncompleteExtractionError as err:
+                # The named entities found are kept, and the texts are reported as incomplete
+                print(f"Incomplete extraction of the named entities: {err}", file=sys.stderr)
+                segments_named_entities = err.named_entities_list
+                if incomplete_texts is not None:
+                    incomplete_texts.update(
+                        segments_text_index[index] for index in err.incomplete_segments
                     )
-            except IndexError:
-                # If except, the "References" key word has not been found
-                # So, we empty the named_entities_referenced list
-                named_entities_referenced = []
-            # We merge the named entities list with the previous list
-            named_entities = self._merge(
-                named_entities, named_entities_quoted+named_entities_referenced
-                )
+            for index, named_entities in zip(segments_text_index, segments_named_entities):
+                # The quoted part is before the referenced part, so the list stays sorted
+                service_named_entities_list[index] += named_entities
+            for index, named_entities in enumerate(service_named_entities_list):
+                named_entities_lists[index].append(named_entities)
 
-        return named_entities
+        # We merge the lists of all the services in one pass
+        merger = NamedEntityMerger(self.config.get_ner_merge_min_overlap())
+        return [merger.merge(named_entities) for named_entities in named_entities_lists]
 
     def extract_document(self, filename: Path):
         """Method for extracting data and metadata from a document
@@ -349,43 +729,132 @@ class DocumentEntity(Base):
         See PdfEntity for example.
         Returns:
             document (DocumentEntity): You must fill the following attributes of the document;
-            author, creator, producer, subject, title, number_of_pages, info, content."""
+            author, creator, producer, subject, title, number_of_pages, info, content,
+            page_offsets (list<int>, offset of the first character of each page)."""
         with open(filename, "r", encoding='utf-8') as file:
             # Extracting the text (content)
             content = file.read()
             document = DocumentEntity(self.config)
             document.content = content
+            # A text file has a single page
+            document.page_offsets = [0]
             return document
 
-    def start_ner(self, filename: Path):
+    def start_ner(self, filename: Path, content_hash: str = None, callback_url: str = None):
         """Start the recognition of named entities
         Public method to extract then persist a document in the database
         First, this method ask an ID for the futur line in the database, then,
-        this method create a process for extracting data and
+        this method send the document to the NER worker pool, for extracting data and
         persisting the object in the database.
         This method returns the ID of the object in the database
-        which will be inserted when the process will finish.
+        which will be updated when a worker will finish.
+
+        If the same file has already been uploaded, according to the deduplication
+        parameter of the config file, this method returns the ID of the existing document,
+        or a copy of its result, without extracting the document again.
+        With a callback_url, the existing document is never returned (its completion
+        may already be sent), so a SUCCESS document is copied, otherwise processed again.
 
-        This method calls _async_ner() method and execute it in a separated process.
+        This method calls _async_ner() method and execute it in a worker process.
         You must overwrite extract_document() by your own code
         if you would extract data and metadata from a specific document.
         See PdfEntity for example.
 
         Args:
-            filename (str): filename of the target file
+            filename (str): filename of the target file, removed by the worker once its text
+            is extracted, or here if the document is not sent to the worker pool
+            content_hash (str): SHA-256 of the file, computed if None
+            callback_url (str): URL receiving the completion of the document, see WebhookSender
 
         Returns:
             int: ID of the persisted object in the database,
             otherwise - returns None if the file's type is not supported.
+
+        Raises:
+            QueueFullError: if the NER worker pool can't accept more documents.
         """
+        if content_hash is None:
+            content_hash = self.compute_content_hash(filename)
+
+        deduplication = self.config.get_deduplication()
+        if deduplication != "off":
+            document = self.find_by_content_hash(content_hash)
+            if document is not None:
+                if deduplication == "id" and callback_url is None:
+                    # The existing document (SUCCESS or PENDING) is returned,
+                    # so the uploaded file will never be processed
+                    Path(filename).unlink(missing_ok=True)
+                    return document.id
+                if document.status == "SUCCESS":
+                    # The result of the existing document is copied,
+                    # the copy notifies its completion to the callback_url
+                    Path(filename).unlink(missing_ok=True)
+                    self.callback_url = callback_url
+                    return self.clone(document.id)
+
         # We persist an empty object just to get the ID of the line in the database
-        object_id = self.insert()
-        # We launch the process
-        process = Process(target=self._async_ner, args=(filename, object_id))
-        process.start()
+        object_id = self.insert(content_hash=content_hash, callback_url=callback_url)
+        try:
+            # We send the document to the worker pool
+            NerWorkerPool.get_instance(self.config).submit(self, filename, object_id)
+        except QueueFullError:
+            # The document will never be processed, so we remove it, with its file
+            self.delete(object_id)
+            Path(filename).unlink(missing_ok=True)
+            raise
         # Returning the id in the database
         return object_id
 
+    def start_ner_after_download(self, download, callback_url: str = None):
+        """Start the recognition of named entities of a document being downloaded
+        This method returns immediately the ID of the object in the database, with a PENDING
+        status. When the download finishes, the document is sent to the NER worker pool,
+        or its status is set to ERROR if the download failed.
+
+        Args:
+            download (concurrent.futures.Future): download of the document,
+            see DocumentFetcher.fetch()
+            callback_url (str): URL receiving the completion of the document, see WebhookSender
+
+        Returns:
+            int: ID of the persisted object in the database.
+        """
+        # We persist an empty object just to get the ID of the line in the database
+        object_id = self.insert(callback_url=callback_url)
+        download.add_done_callback(
+            lambda future: self._on_downloaded(future, object_id)
+        )
+        return object_id
+
+    def _on_downloaded(self, download, object_id: int):
+        """Private method called by the thread of the download, when it finishes"""
+        try:
+            filename, content_hash = download.result()
+        # The exceptions of the download are ValueError and OSError (including FetchError)
+        except (ValueError, OSError) as err:
+            print(f"Error when downloading the document {object_id}: {err}", file=sys.stderr)
+            self.update(object_id, "ERROR", datetime.today().strftime("%Y-%m-%d-%H-%M-%S.%f"))
+            return
+
+        if self.config.get_deduplication() != "off":
+            document = self.find_by_content_hash(content_hash)
+            if document is not None and document.status == "SUCCESS":
+                # The ID is already given, so we copy the result of the existing document
+                Path(filename).unlink(missing_ok=True)
+                self.clone(document.id, object_id)
+                return
+
+        self.update(object_id, "PENDING", content_hash=content_hash)
+        try:
+            # We are not in a request thread, so we wait for a free place in the queue
+            NerWorkerPool.get_instance(self.config).submit(
+                self, filename, object_id, self.config.get_download_timeout()
+            )
+        except QueueFullError as err:
+            print(f"Error when processing the document {object_id}: {err}", file=sys.stderr)
+            self.update(object_id, "ERROR", datetime.today().strftime("%Y-%m-%d-%H-%M-%S.%f"))
+            Path(filename).unlink(missing_ok=True)
+
 class DocumentEncoder(json.JSONEncoder):
     """Class for converting full object to JSON string"""
 
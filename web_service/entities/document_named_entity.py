@@ -0,0 +1,119 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Index
+from sqlalchemy import insert
+from web_service.common.base import Base, copy_document_rows
+from .named_entity import NamedEntity, NamedEntityRelationshipEnum
+from .named_entity import NamedEntityScoreEnum, NamedEntityTypeEnum
+
+class DocumentNamedEntity(Base):
+    """Class for representing a named entity of a document in the database
+    Each named entity is a row, so the named entities can be filtered in SQL.
+    """
+
+    # Table name in the database
+    __tablename__ = "named_entity"
+    __table_args__ = (
+        Index("ix_named_entity_document_id_type", "document_id", "type"),
+    )
+    # ID primary key in the database, it keeps the order of the named entities
+    id = Column("id", Integer, primary_key=True)
+    # ID of the document where the named entity was found
+    document_id = Column("document_id", Integer, ForeignKey("document.id"), nullable=False)
+    # Text of the named entity
+    text = Column("text", String(255), index=True)
+    # Name of the NamedEntityTypeEnum
+    type = Column("type", String(32))
+    # Name of the NamedEntityRelationshipEnum
+    relationship = Column("relationship", String(32), index=True)
+    # Name of the NamedEntityScoreEnum
+    score = Column("score", String(32))
+    # Score given by AWS Comprehend only
+    aws_score = Column("aws_score", Float)
+    # Location of the named entity in the document content
+    begin_offset = Column("begin_offset", Integer)
+    end_offset = Column("end_offset", Integer)
+    # Page of the named entity, numbered from 1
+    page = Column("page", Integer)
+
+    # Columns copied by copy_named_entities()
+    _copied_columns = [
+        "text", "type", "relationship", "score", "aws_score", "begin_offset", "end_offset",
+        "page"
+    ]
+
+    @staticmethod
+    def _to_mapping(document_id: int, named_entity: NamedEntity) -> dict:
+        """Convert a NamedEntity to a row of the named_entity table"""
+        return {
+            "document_id": document_id,
+            "text": named_entity.text,
+            "type": named_entity.type.name,
+            "relationship": named_entity.relationship.name,
+            "score": named_entity.score.name,
+            "aws_score": named_entity.aws_score,
+            "begin_offset": named_entity.begin_offset,
+            "end_offset": named_entity.end_offset,
+            "page": named_entity.page
+        }
+
+    def to_named_entity(self) -> NamedEntity:
+        """Convert the row to a NamedEntity"""
+        return NamedEntity(
+            self.text,
+            NamedEntityScoreEnum[self.score],
+            # The aws_score field is None for the non AWS named entities
+            self.aws_score,
+            NamedEntityTypeEnum[self.type],
+            self.begin_offset,
+            self.end_offset,
+            NamedEntityRelationshipEnum[self.relationship],
+            self.page
+        )
+
+    @staticmethod
+    def insert_named_entities(session, document_id: int, named_entities: list):
+        """Insert the named entities of a document with a single bulk INSERT
+        The caller must commit the session.
+        Args:
+            session (Session): session of the transaction.
+            document_id (int): id of the document.
+            named_entities (list<NamedEntity>): named entities of the document.
+        """
+        session.query(DocumentNamedEntity) \
+            .filter(DocumentNamedEntity.document_id == document_id) \
+            .delete(synchronize_session=False)
+        if len(named_entities) > 0:
+            session.execute(
+                insert(DocumentNamedEntity.__table__),
+                [DocumentNamedEntity._to_mapping(document_id, named_entity)
+                 for named_entity in named_entities]
+            )
+
+    @staticmethod
+    def copy_named_entities(session, source_document_id: int, document_id: int):
+        """Copy the named entities of a document to another document, in SQL
+        The caller must commit the session.
+        """
+        copy_document_rows(
+            session, DocumentNamedEntity.__table__, DocumentNamedEntity._copied_columns,
+            source_document_id, document_id
+        )
+
+    @staticmethod
+    def find_named_entities(session, document_id: int) -> list:
+        """Returns the named entities of a document, in their original order
+        Args:
+            session (Session): session used for the query.
+            document_id (int): id of the document.
+        Returns:
+            list<NamedEntity>: named entities of the document.
+        """
+        rows = session.query(DocumentNamedEntity) \
+            .filter(DocumentNamedEntity.document_id == document_id) \
+            .order_by(DocumentNamedEntity.id)
+        return [row.to_named_entity() for row in rows]
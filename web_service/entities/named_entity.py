@@ -47,46 +47,62 @@ class NamedEntityRelationshipEnum(Enum):
     REFERENCED = "REFERENCED"
 
 class NamedEntity:
-    """Named entity class"""
+    """Named entity class
+    The attributes are slots, so a named entity has no __dict__:
+    the documents have tens of thousands of named entities.
+    """
+    __slots__ = (
+        "text", "score", "aws_score", "type", "begin_offset", "end_offset", "relationship", "page"
+    )
     text: str
     score: NamedEntityScoreEnum
-    # Score in percentage given by AWS Comprehend only
+    # Score in percentage given by AWS Comprehend only, None for the other services
     aws_score: float
     type: NamedEntityTypeEnum
     begin_offset: int
     end_offset: int
     relationship: NamedEntityRelationshipEnum
+    # Page of the named entity, numbered from 1, None if the document has no pages
+    page: int
+
+    def __init__(self, text: str = None, score: NamedEntityScoreEnum = None,
+                 aws_score: float = None, named_entity_type: NamedEntityTypeEnum = None,
+                 begin_offset: int = None, end_offset: int = None,
+                 relationship: NamedEntityRelationshipEnum = None, page: int = None):
+        self.text = text
+        self.score = score
+        self.aws_score = aws_score
+        self.type = named_entity_type
+        self.begin_offset = begin_offset
+        self.end_offset = end_offset
+        self.relationship = relationship
+        self.page = page
+
+    def to_json(self) -> dict:
+        """Returns the JSON representation of the named entity
+        All the attributes always exist, so no attribute is probed.
+        """
+        json_data = {
+            "text": self.text,
+            "begin_offset": self.begin_offset,
+            "end_offset": self.end_offset,
+            "relationship": self.relationship.name,
+            "score": self.score.name,
+            "type": self.type.name
+        }
+        # It's normal to not have this field for non AWS named entities
+        if self.aws_score is not None:
+            json_data["aws_score"] = self.aws_score
+        if self.page is not None:
+            json_data["page"] = self.page
+        return json_data
 
 class NamedEntityEncoder(json.JSONEncoder):
     """Class for converting full object to JSON string"""
 
     def default(self, o):
         if isinstance(o, NamedEntity):
-
-            json_data = {
-                "text": o.text,
-                "begin_offset": o.begin_offset,
-                "end_offset": o.end_offset,
-                "relationship": o.relationship.name
-                }
-
-            try:
-                json_data["score"] = o.score.name
-            except AttributeError:
-                pass
-
-            try:
-                json_data["type"] = o.type.name
-            except AttributeError:
-                pass
-
-            try:
-                json_data["aws_score"] = o.aws_score
-            except AttributeError:
-                # It's normal to not have this field for non AWS named entities
-                pass
-
-            return json_data
+            return o.to_json()
 
         # Base class will raise the TypeError.
         return super().default(o)
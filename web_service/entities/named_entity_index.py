@@ -0,0 +1,138 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+from sqlalchemy import Column, Integer, String, insert, select, func
+from web_service.common.base import Base, copy_document_rows
+from .named_entity import NamedEntityScoreEnum
+
+class NamedEntityIndex(Base):
+    """Class for representing the inverted index of the named entities
+    Each row counts the mentions of a named entity (normalized text, type, relationship)
+    in a document. The primary key starts with (term, document_id),
+    so the documents mentioning a named entity are read in document_id order,
+    without sorting, for the keyset pagination.
+    """
+
+    # Table name in the database
+    __tablename__ = "named_entity_index"
+    # Normalized text of the named entity, see normalize()
+    term = Column("term", String(255), primary_key=True)
+    # ID of the document where the named entity was found
+    document_id = Column("document_id", Integer, primary_key=True)
+    # Name of the NamedEntityTypeEnum
+    type = Column("type", String(32), primary_key=True)
+    # Name of the NamedEntityRelationshipEnum
+    relationship = Column("relationship", String(32), primary_key=True)
+    # Text of the first mention of the named entity in the document
+    text = Column("text", String(255))
+    # Number of mentions in the document
+    count = Column("count", Integer)
+    # Best score of the mentions, see SCORE_RANKS
+    score_rank = Column("score_rank", Integer)
+
+    # Rank of each score, to filter the named entities by minimum score
+    SCORE_RANKS = {
+        NamedEntityScoreEnum.LOW.name: 1,
+        NamedEntityScoreEnum.MEDIUM.name: 2,
+        NamedEntityScoreEnum.HIGH.name: 3
+    }
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Returns the term of a named entity text, case and spaces insensitive"""
+        return " ".join(text.split()).casefold()
+
+    @staticmethod
+    def index_named_entities(session, document_id: int, named_entities: list):
+        """Update the index with the named entities of a document
+        The caller must commit the session.
+        Args:
+            session (Session): session of the transaction.
+            document_id (int): id of the document.
+            named_entities (list<NamedEntity>): named entities of the document.
+        """
+        session.query(NamedEntityIndex) \
+            .filter(NamedEntityIndex.document_id == document_id) \
+            .delete(synchronize_session=False)
+
+        postings = {}
+        for named_entity in named_entities:
+            key = (
+                NamedEntityIndex.normalize(named_entity.text),
+                named_entity.type.name,
+                named_entity.relationship.name
+            )
+            score_rank = NamedEntityIndex.SCORE_RANKS[named_entity.score.name]
+            posting = postings.get(key)
+            if posting is None:
+                postings[key] = {
+                    "term": key[0],
+                    "document_id": document_id,
+                    "type": key[1],
+                    "relationship": key[2],
+                    "text": named_entity.text,
+                    "count": 1,
+                    "score_rank": score_rank
+                }
+            else:
+                posting["count"] += 1
+                posting["score_rank"] = max(posting["score_rank"], score_rank)
+
+        if len(postings) > 0:
+            session.execute(insert(NamedEntityIndex.__table__), list(postings.values()))
+
+    @staticmethod
+    def copy_postings(session, source_document_id: int, document_id: int):
+        """Copy the postings of a document to another document, in SQL
+        The caller must commit the session.
+        """
+        copy_document_rows(
+            session, NamedEntityIndex.__table__,
+            ["term", "type", "relationship", "text", "count", "score_rank"],
+            source_document_id, document_id
+        )
+
+    @staticmethod
+    def search(session, text: str, named_entity_type: str = None, relationship: str = None,
+               minimum_score: str = None, after_document_id: int = 0, limit: int = 100) -> list:
+        """Returns the documents mentioning a named entity, by document_id order
+        Args:
+            session (Session): session used for the query.
+            text (str): text of the named entity.
+            named_entity_type (str): name of a NamedEntityTypeEnum, to filter the mentions.
+            relationship (str): name of a NamedEntityRelationshipEnum, to filter the mentions.
+            minimum_score (str): name of a NamedEntityScoreEnum, to filter the mentions.
+            after_document_id (int): only the documents after this id are returned,
+            use the last id of the previous page to get the next page.
+            limit (int): maximum number of documents returned.
+        Returns:
+            list<dict>: id, number of mentions and best score of each document.
+        """
+        stmt = select(
+            NamedEntityIndex.document_id,
+            func.sum(NamedEntityIndex.count),
+            func.max(NamedEntityIndex.score_rank)
+        ).where(
+            NamedEntityIndex.term == NamedEntityIndex.normalize(text),
+            NamedEntityIndex.document_id > after_document_id
+        )
+        if named_entity_type is not None:
+            stmt = stmt.where(NamedEntityIndex.type == named_entity_type)
+        if relationship is not None:
+            stmt = stmt.where(NamedEntityIndex.relationship == relationship)
+        if minimum_score is not None:
+            stmt = stmt.where(
+                NamedEntityIndex.score_rank >= NamedEntityIndex.SCORE_RANKS[minimum_score]
+            )
+        stmt = stmt.group_by(NamedEntityIndex.document_id) \
+            .order_by(NamedEntityIndex.document_id) \
+            .limit(limit)
+
+        scores = {rank: score for score, rank in NamedEntityIndex.SCORE_RANKS.items()}
+        return [
+            {"id": document_id, "count": count, "score": scores[score_rank]}
+            for document_id, count, score_rank in session.execute(stmt)
+        ]
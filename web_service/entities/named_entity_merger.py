@@ -0,0 +1,124 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import heapq
+from .named_entity import NamedEntityScoreEnum
+
+class NamedEntityMerger:
+    """Merge the named entities found by several NER services, in one linear pass
+    The sorted lists are merged with a k-way merge (heap of the k next named entities),
+    and each named entity is matched with the named entities of the other services
+    still overlapping it (the active groups, indexed by end_offset in a heap).
+    """
+
+    # Next score of a named entity found by one more service
+    _NEXT_SCORES = {
+        NamedEntityScoreEnum.LOW: NamedEntityScoreEnum.MEDIUM,
+        NamedEntityScoreEnum.MEDIUM: NamedEntityScoreEnum.HIGH,
+        NamedEntityScoreEnum.HIGH: NamedEntityScoreEnum.HIGH
+    }
+
+    def __init__(self: object, min_overlap: float = 0.5):
+        """Initialize the object
+        Args:
+            min_overlap (float): two named entities of different services are merged
+            if the length of their intersection is at least this ratio of their union,
+            1.0 to merge the named entities with the exact same span only.
+        """
+        self.min_overlap = min_overlap
+
+    @staticmethod
+    def _sorted(named_entities: list) -> list:
+        """Returns the list sorted by begin_offset, without sorting an already sorted list"""
+        previous_begin_offset = 0
+        for named_entity in named_entities:
+            if named_entity.begin_offset < previous_begin_offset:
+                return sorted(named_entities, key=lambda entity: entity.begin_offset)
+            previous_begin_offset = named_entity.begin_offset
+        return named_entities
+
+    def merge(self, named_entities_lists: list) -> list:
+        """Merge the named entities lists of several services
+        Args:
+            named_entities_lists (list<list<NamedEntity>>): named entities of each service,
+            sorted by begin_offset. The first services win the conflicts.
+        Returns:
+            list<NamedEntity>: merged list, sorted by begin_offset.
+            The score of a named entity is raised for each other service which found it,
+            and its aws_score is taken from the AWS named entity.
+        """
+        named_entities_lists = [self._sorted(named_entities)
+                                for named_entities in named_entities_lists]
+        number_of_services = len(named_entities_lists)
+        # Position of the next named entity of each service
+        positions = [0] * number_of_services
+        # Heap of the next named entity of each service, by begin_offset then service.
+        # The heaps only contain integers (no tuple for each named entity),
+        # to keep the merge linear without stressing the garbage collector
+        next_named_entities = [
+            named_entities[0].begin_offset * number_of_services + service
+            for service, named_entities in enumerate(named_entities_lists)
+            if len(named_entities) > 0
+        ]
+        heapq.heapify(next_named_entities)
+
+        # Each group is a kept named entity, with the services which found it (bit mask)
+        groups = []
+        groups_begin_offset = []
+        groups_services = []
+        # Heap of the groups which may overlap the next named entities,
+        # each group is stored as its end_offset << 32 | its index
+        active_groups = []
+        while next_named_entities:
+            service = next_named_entities[0] % number_of_services
+            named_entities = named_entities_lists[service]
+            position = positions[service]
+            named_entity = named_entities[position]
+            positions[service] = position + 1
+            if position + 1 < len(named_entities):
+                heapq.heapreplace(
+                    next_named_entities,
+                    named_entities[position + 1].begin_offset * number_of_services + service
+                )
+            else:
+                heapq.heappop(next_named_entities)
+
+            begin_offset = named_entity.begin_offset
+            end_offset = named_entity.end_offset
+            # The groups ending before this named entity can't match it anymore
+            while active_groups and active_groups[0] >> 32 <= begin_offset:
+                heapq.heappop(active_groups)
+
+            service_bit = 1 << service
+            best_group = -1
+            best_overlap = self.min_overlap
+            for active_group in active_groups:
+                group = active_group & 0xFFFFFFFF
+                if groups_services[group] & service_bit:
+                    continue
+                # The group begins before this named entity and ends after its begin_offset,
+                # so the ratio is the intersection by the union of the two spans
+                group_end_offset = active_group >> 32
+                overlap = (min(group_end_offset, end_offset) - begin_offset) \
+                    / (max(group_end_offset, end_offset) - groups_begin_offset[group])
+                if overlap >= best_overlap:
+                    best_group = group
+                    best_overlap = overlap
+
+            if best_group == -1:
+                heapq.heappush(active_groups, end_offset << 32 | len(groups))
+                groups.append(named_entity)
+                groups_begin_offset.append(begin_offset)
+                groups_services.append(service_bit)
+            else:
+                groups_services[best_group] |= service_bit
+                kept_named_entity = groups[best_group]
+                kept_named_entity.score = self._NEXT_SCORES[kept_named_entity.score]
+                if named_entity.aws_score is not None:
+                    kept_named_entity.aws_score = named_entity.aws_score
+
+        # The groups are created in begin_offset order
+        return groups
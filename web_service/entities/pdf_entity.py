@@ -4,6 +4,7 @@ Authors: Jonathan CASSAING
 Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
 """
 
+from itertools import accumulate
 from pathlib import Path
 # pdftotext is used to extract PDF content (text body)
 import pdftotext
@@ -24,8 +25,13 @@ class PdfEntity(DocumentEntity):
         with open(filename, "rb") as file:
             document = DocumentEntity(self.config)
             # Extracting the text (content)
-            data = pdftotext.PDF(file)
-            document.content = "".join(data)
+            pages = list(pdftotext.PDF(file))
+            document.content = "".join(pages)
+            # The boundaries of the pages are kept, for the page of the named entities
+            # and for reading the content page by page
+            document.page_offsets = list(
+                accumulate((len(page) for page in pages[:-1]), initial=0)
+            )
 
             # Extracting meta data
             pdf = PdfFileReader(file)
@@ -10,6 +10,15 @@ from web_service.services import Api
 
 bp = Blueprint("router", __name__, template_folder="templates")
 
+@bp.app_errorhandler(413)
+def request_entity_too_large(_):
+    """Request larger than the MAX_CONTENT_LENGTH of the app.
+
+    Returns:
+        flask.Response: standard flask HTTP response.
+    """
+    return Api.request_entity_too_large()
+
 @swag_from("swagger/get_document_upload.yml", methods=["GET"])
 @swag_from("swagger/post_document_upload.yml", methods=["POST"])
 @bp.route("/", methods=["GET", "POST"])
@@ -23,6 +32,41 @@ def post_document():
     doc_url = request.args.get('doc_url')
     return Api.post_document(request, doc_url)
 
+@swag_from("swagger/post_documents_batch.yml", methods=["POST"])
+@bp.route("/documents/batch", methods=["POST"])
+def post_documents_batch():
+    """Batch of documents.
+    POST method uploads several documents at once, from a list of URLs or a set of files.
+        See README.md for response format.
+    Returns:
+        flask.Response: standard flask HTTP response.
+    """
+    return Api.post_documents_batch(request)
+
+@swag_from("swagger/get_documents_batch.yml", methods=["GET"])
+@bp.route("/documents/batch/<int:batch_id>", methods=["GET"])
+def get_documents_batch(batch_id):
+    """Progress of a batch of documents.
+    GET method returns the status of the documents of the batch,
+    specified by the ID parameter, and its aggregate progress.
+        See README.md for response format.
+    Returns:
+        flask.Response: standard flask HTTP response.
+    """
+    return Api.get_documents_batch(request, batch_id)
+
+@swag_from("swagger/get_documents_events.yml", methods=["GET"])
+@bp.route("/documents/events", methods=["GET"])
+def get_documents_events():
+    """Status changes of documents.
+    GET method returns a stream of server-sent events with the status changes
+    of the documents, specified by the ids parameter.
+        See README.md for response format.
+    Returns:
+        flask.Response: standard flask HTTP response.
+    """
+    return Api.get_documents_events(request)
+
 @swag_from("swagger/document_metadata.yml", methods=["GET"])
 @bp.route("/document/metadata/<int:doc_id>", methods=["GET"])
 def get_document_metadata(doc_id):
@@ -46,3 +90,26 @@ def get_document_content(doc_id):
         flask.Response: standard flask HTTP response.
     """
     return Api.get_document_content(request, doc_id)
+
+@swag_from("swagger/entities_search.yml", methods=["GET"])
+@bp.route("/entities/search", methods=["GET"])
+def search_entities():
+    """Search of a named entity in all the documents.
+    GET method returns the documents mentioning the named entity,
+    specified by the text parameter.
+        See README.md for response format.
+    Returns:
+        flask.Response: standard flask HTTP response.
+    """
+    return Api.search_entities(request)
+
+@swag_from("swagger/metrics.yml", methods=["GET"])
+@bp.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Metrics of the web service.
+    GET method returns the runtime metrics of the web service,
+    like the loading statistics of the NER models.
+    Returns:
+        flask.Response: standard flask HTTP response.
+    """
+    return Api.get_metrics(request)
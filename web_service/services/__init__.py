@@ -5,6 +5,8 @@ Web service specialized in Named Entity Recognition (NER), in Natural Language P
 """
 
 from .api import Api
-from .ner_interface import NerInterface
+from .ner_interface import NerInterface, IncompleteExtractionError
+from .ner_result_cache import NerResultCache
 from .spacy_ner_service import SpacyNerService
+from .spacy_model_registry import SpacyModelRegistry
 from .aws_comprehend_ner_service import AwsComprehendNerService
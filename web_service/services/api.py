@@ -5,18 +5,34 @@ Web service specialized in Named Entity Recognition (NER), in Natural Language P
 """
 
 import json
-import urllib.request
-from json import JSONDecodeError
+import queue
+import sys
+import time
+import uuid
 from pathlib import Path
+from urllib.parse import urlsplit
 from flask import Response, render_template, current_app
 from werkzeug.utils import secure_filename
 from sqlalchemy import select
 from web_service.entities import DocumentEntity, PdfEntity, MessageEntity, MessageEncoder
-from web_service.common import session_factory
+from web_service.entities import DocumentNamedEntity, NamedEntityEncoder, NamedEntityIndex
+from web_service.entities import NamedEntityTypeEnum, NamedEntityRelationshipEnum
+from web_service.entities import NamedEntityScoreEnum, BatchEntity
+from web_service.common import session_scope, NerWorkerPool, QueueFullError
+from web_service.common import ResponseCache, CachedResponse, StatusNotifier, RateLimiter
+from web_service.common import TooManySubscribersError
+from .spacy_model_registry import SpacyModelRegistry
+from .stream_saver import StreamSaver, FileTooLargeError
+from .document_fetcher import DocumentFetcher
+from .webhook_sender import WebhookSender
+from .ner_result_cache import NerResultCache
 
 class Api:
     """Api controller of the arXiv Intelligence NER Web Service"""
 
+    # Interval (in seconds) of the comments sent to keep an event stream open
+    EVENTS_KEEP_ALIVE = 15
+
     def __init__(self: object):
         pass
 
@@ -34,197 +50,744 @@ class Api:
             in current_app.project_config.get_allowed_extensions()
         )
 
+    @staticmethod
+    def _get_stream_saver():
+        """Returns a StreamSaver configured according to the config.cfg file"""
+        return StreamSaver(
+            current_app.project_config.get_max_upload_size(),
+            current_app.project_config.get_download_timeout(),
+            current_app.project_config.get_download_chunk_size()
+        )
+
+    @staticmethod
+    def _check_callback_url(callback_url: str) -> bool:
+        """Check the callback_url parameter of an upload, and start the WebhookSender
+        The host of the URL must be public, or in the webhook_allowed_hosts of the config file.
+        Args:
+            callback_url (str): URL receiving the completions of the documents, or None.
+        Returns:
+            bool: False if the URL is incorrect or not allowed.
+        """
+        if callback_url is None:
+            return True
+        parts = urlsplit(callback_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname \
+           or len(callback_url) > DocumentEntity.callback_url.type.length:
+            return False
+        if not WebhookSender.is_allowed_url(
+                callback_url, current_app.project_config.get_webhook_allowed_hosts()):
+            return False
+        # The sender must listen to the status changes before the documents are processed
+        WebhookSender.get_instance(current_app.project_config)
+        return True
+
+    @staticmethod
+    def request_entity_too_large():
+        """Returns the response of a request larger than max_upload_size,
+        refused before its body is read"""
+        return Api._message_response(
+            "The request is too large, the maximum size of a file is "
+            f"{current_app.project_config.get_max_upload_size()} bytes", 413
+        )
+
+    @staticmethod
+    def _message_response(message: str, status: int, headers: dict = None):
+        """Returns a response made of a MessageEntity, with an error status"""
+        return Response(
+            json.dumps(MessageEntity(message), cls=MessageEncoder),
+            mimetype="application/json;charset=utf-8",
+            headers=headers,
+        ), status
+
+    @staticmethod
+    def _check_file(file) -> str:
+        """Check an uploaded file before saving it
+        Args:
+            file (werkzeug.datastructures.FileStorage): uploaded file, or None.
+        Returns:
+            str: the error message, None if the file can be saved.
+        """
+        if file is None:
+            return "No file part"
+        # if user does not select file, browser also
+        # submit an empty part without filename
+        if file.filename == "":
+            return "No selected file"
+        if Api.allowed_file(file.filename) is False:
+            return "This file's type is not allowed!"
+        return None
+
+    @staticmethod
+    def _save_and_start(file_or_url, callback_url: str):
+        """Save an uploaded file, or download the document of an URL,
+        then send the document to the NER worker pool
+        Args:
+            file_or_url (FileStorage or str): uploaded file, or URL of the document.
+            callback_url (str): URL receiving the completion of the document, or None.
+        Returns:
+            int: ID of the document, None if the file's type is not supported.
+        Raises:
+            FileTooLargeError: if the document exceeds the maximum size.
+            ValueError: if the URL is incorrect.
+            OSError: if the document can't be saved or downloaded (TimeoutError included).
+            QueueFullError: if the NER worker pool can't accept the document.
+        """
+        config = current_app.project_config
+        if isinstance(file_or_url, str):
+            # The document is downloaded by the fetcher, with pooled connections,
+            # we wait for the end of the download to check the URL
+            filepath, content_hash = DocumentFetcher.get_instance(config) \
+                .fetch(file_or_url).result()
+        else:
+            filepath = Path().joinpath(
+                config.get_upload_temp_folder(),
+                # Check user input,
+                # a unique prefix avoids the collisions between files with the same name
+                uuid.uuid4().hex + "_" + secure_filename(file_or_url.filename)
+            )
+            # The file is saved chunk by chunk, and hashed on the fly,
+            # the incomplete file is removed by the saver
+            content_hash = Api._get_stream_saver().save(file_or_url.stream, filepath)
+        # The file is removed by start_ner() if the document is not processed
+        return PdfEntity(config).start_ner(filepath, content_hash, callback_url)
+
+    @staticmethod
+    def _error_response(err: Exception, file_or_url):
+        """Returns the response of a document which can't be saved or processed,
+        see _save_and_start()"""
+        if isinstance(err, QueueFullError):
+            # The NER workers are overloaded, the client must retry later
+            return Api._message_response(
+                "The service is overloaded, please retry later", 503,
+                {"Retry-After": str(current_app.project_config.get_ner_retry_after())}
+            )
+        if isinstance(err, FileTooLargeError):
+            return Api._message_response(str(err), 413)
+        if isinstance(err, TimeoutError):
+            return Api._message_response(str(err), 408)
+        if isinstance(file_or_url, str):
+            # Error in the given URL, or the URL can't be fetched (unknown host, HTTP error...)
+            return Api._message_response(f"Incorrect URL: {err}", 400)
+        return Api._message_response(f"The file can't be saved: {err}", 400)
+
     @staticmethod
     def post_document(request, doc_url):
         """Index of the API.
         GET method returns a welcome message or retreive the doc_url parameter.
         POST method can be used to upload a PDF file.
+        With the callback_url parameter, the completion of the document is sent to this URL.
             See README.md for response format.
 
         Returns:
             flask.Response: standard flask HTTP response.
         """
-        # If it's a POST method OR
-        # it's a GET method and no doc_url are given OR
-        if request.method == "POST" or \
-           (request.method == "GET" and doc_url is not None):
-
-            # If it's a POST request (the client try to send a file)
-            if request.method == "POST":
-                # check if the post request has the file part
-                if "file" not in request.files:
-                    return Response(
-                        json.dumps(MessageEntity("No file part"), cls=MessageEncoder),
-                        mimetype="application/json;charset=utf-8",
-                    ), 400
+        # If it's a basic GET method (no doc_url given)
+        if request.method != "POST" and doc_url is None:
+            # Generate an index HTML page with an outstanding look & feel
+            return render_template("index.html", title="NER Web Service")
 
-                # Else, we get the file
-                file = request.files["file"]
+        callback_url = request.values.get("callback_url")
+        if not Api._check_callback_url(callback_url):
+            return Api._message_response(f"Incorrect callback_url: {callback_url}", 400)
 
-                # if user does not select file, browser also
-                # submit an empty part without filename
-                if file.filename == "":
-                    return Response(
-                        json.dumps(MessageEntity("No selected file"), cls=MessageEncoder),
-                        mimetype="application/json;charset=utf-8",
-                    ), 400
+        # If it's a POST request, the client try to send a file,
+        # else, it's a GET method with a doc_url
+        file_or_url = doc_url
+        if request.method == "POST":
+            file_or_url = request.files.get("file")
+            message = Api._check_file(file_or_url)
+            if message is not None:
+                return Api._message_response(message, 400)
 
-                # If the file's type is not allowed
-                if Api.allowed_file(file.filename) is False:
-                    return Response(
-                        json.dumps(
-                            MessageEntity("This file's type is not allowed!"), cls=MessageEncoder
-                        ),
-                        mimetype="application/json;charset=utf-8",
-                    ), 400
+        # Save and extract the file, then persist it in the database
+        try:
+            doc_id = Api._save_and_start(file_or_url, callback_url)
+        except (FileTooLargeError, ValueError, OSError, QueueFullError) as err:
+            return Api._error_response(err, file_or_url)
+        # If failed
+        if None is doc_id:
+            # Returns the appropriate error
+            return Api._message_response("This file's type is not allowed!", 400)
+        if isinstance(file_or_url, str):
+            filename = DocumentFetcher.get_filename(file_or_url)
+        else:
+            filename = secure_filename(file_or_url.filename)
+        # Else, returning the ID of the object in the database
+        return Response(
+            json.dumps(
+                MessageEntity(
+                    "The file '" + filename + "' has been received successfully!",
+                    doc_id,
+                ),
+                cls=MessageEncoder,
+            ),
+            mimetype="application/json;charset=utf-8",
+        ), 201
 
-                # All it's OK, so we save the file in an upload folder
-                filepath = Path().joinpath(
-                    current_app.project_config.get_upload_temp_folder(),
-                    # Check user input
-                    secure_filename(file.filename)
-                    )
-                file.save(filepath)
+    @staticmethod
+    def _read_batch_request(request):
+        """Returns the URLs or the files of a batch, and its callback_url
+        Returns:
+            tuple: list of URLs or of files, callback_url, and the error response (None if
+            the batch is correct).
+        """
+        if request.is_json:
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict):
+                body = {}
+            urls = body.get("urls")
+            if not isinstance(urls, list) or len(urls) == 0 \
+               or not all(isinstance(url, str) for url in urls):
+                return None, None, Api._message_response("No urls list", 400)
+            return urls, body.get("callback_url"), None
+
+        files = request.files.getlist("files")
+        if len(files) == 0:
+            return None, None, Api._message_response("No files part", 400)
+        for file in files:
+            message = Api._check_file(file)
+            if message is not None:
+                return None, None, Api._message_response(f"'{file.filename}': {message}", 400)
+        return files, request.form.get("callback_url"), None
+
+    @staticmethod
+    def post_documents_batch(request):
+        """Batch of documents.
+        POST method uploads several documents at once, with a JSON body
+        containing a list of URLs, or with a multipart set of files.
+        The documents are downloaded and processed in background,
+        the batch ID can be used to follow their progress.
+        With a callback_url (in the JSON body or as a form field), the completions
+        of the documents are sent to this URL.
+            See README.md for response format.
+
+        Returns:
+            flask.Response: standard flask HTTP response.
+        """
+        if request.method != "POST":
+            return Api._message_response("Incorrect HTTP method", 405)
+
+        config = current_app.project_config
+        documents, callback_url, error_response = Api._read_batch_request(request)
+        if error_response is not None:
+            return error_response
+        if callback_url is not None and (
+                not isinstance(callback_url, str) or not Api._check_callback_url(callback_url)):
+            return Api._message_response(f"Incorrect callback_url: {callback_url}", 400)
+
+        number_of_documents = len(documents)
+        if number_of_documents > config.get_max_batch_size():
+            return Api._message_response(
+                f"Too many documents, the maximum is {config.get_max_batch_size()}", 400
+            )
 
-            # Else, it's a GET method and no doc_url are given
-            elif request.method == "GET" and doc_url is not None:
+        # The whole batch is refused if the NER queue can't accept it
+        free_places = NerWorkerPool.get_instance(config).get_free_places()
+        if free_places is not None and free_places < number_of_documents:
+            return Api._error_response(QueueFullError("The NER queue is full"), None)
+
+        document_ids = []
+        # Names of the files refused, and the error response of the last one
+        rejected_files = []
+        if request.is_json:
+            # The downloads run in the threads of the fetcher,
+            # each document is sent to the NER worker pool at the end of its download
+            fetcher = DocumentFetcher.get_instance(config)
+            for url in documents:
+                document_ids.append(
+                    PdfEntity(config).start_ner_after_download(fetcher.fetch(url), callback_url)
+                )
+        else:
+            for file in documents:
                 try:
-                    # We open the URL
-                    with urllib.request.urlopen(doc_url) as response:
-                        # We split the URL to get the filename
-                        filename = doc_url.rsplit('/', 1).pop()
-                        # All seems OK, so we save the file in an upload folder
-                        filepath = Path().joinpath(
-                            current_app.project_config.get_upload_temp_folder(),
-                            # Check user input
-                            secure_filename(filename)
-                        )
-                        # Save the file in an upload folder
-                        with open(filepath, "wb") as file:
-                            file.write(response.read())
-                            file.close()
-                # Except, error in the given URL
-                except ValueError as err:
-                    return Response(
-                        json.dumps(MessageEntity(f"Incorrect URL: {err}"), cls=MessageEncoder),
-                        mimetype="application/json;charset=utf-8",
-                    ), 400
-                except urllib.error.URLError as err:
-                    return Response(
-                        json.dumps(MessageEntity(f"Incorrect URL: {err}"), cls=MessageEncoder),
-                        mimetype="application/json;charset=utf-8",
-                    ), 400
+                    document_ids.append(Api._save_and_start(file, callback_url))
+                except (FileTooLargeError, OSError, QueueFullError) as err:
+                    # The file is not in the batch, the client can send it again
+                    document_ids.append(None)
+                    rejected_files.append(file.filename)
+                    error_response = Api._error_response(err, file)
+                    print(f"The file '{file.filename}' is refused: {err}", file=sys.stderr)
+
+        if len(rejected_files) == number_of_documents:
+            return error_response
+
+        batch_id = BatchEntity().insert(
+            [document_id for document_id in document_ids if document_id is not None]
+        )
+        data = {}
+        data["id"] = batch_id
+        data["documents"] = document_ids
+        data["rejected_files"] = rejected_files
+        if len(rejected_files) > 0:
+            # Some documents are in the batch, the client must send the others again later
+            data["message"] = \
+                f"{number_of_documents - len(rejected_files)} of {number_of_documents} " \
+                "documents have been received successfully, the others were refused " \
+                "(the service is overloaded or the file can't be saved), " \
+                "please retry them later"
+            return Response(
+                json.dumps(data), mimetype="application/json;charset=utf-8",
+                headers={"Retry-After": str(config.get_ner_retry_after())}
+            ), 207
+        data["message"] = f"{number_of_documents} documents have been received successfully!"
+        return Response(
+            json.dumps(data), mimetype="application/json;charset=utf-8"
+        ), 201
 
-            # Here, we have the uploaded file saved in a folder
-            # The full file path is filepath
-            # Extract and persist the file in the database
-            doc_id = PdfEntity(current_app.project_config).start_ner(filepath)
-            # If failed
-            if None is doc_id:
-                # Returns the appropriate error
+    @staticmethod
+    def get_documents_batch(request, batch_id: int):
+        """Progress of a batch of documents.
+        GET method returns the status of each document of the batch,
+        and the aggregate progress of the batch.
+            See README.md for response format.
+        Returns:
+            flask.Response: standard flask HTTP response.
+        """
+        if request.method == "GET":
+            data = BatchEntity.get_status(batch_id)
+            if data is None:
                 return Response(
-                    json.dumps(
-                        MessageEntity("This file's type is not allowed!"),
-                        cls=MessageEncoder,
-                    ),
+                    json.dumps(MessageEntity("No batch found"), cls=MessageEncoder),
                     mimetype="application/json;charset=utf-8",
-                ), 400
-            # Else, returning the ID of the object in the database
-            return Response(
-                json.dumps(
-                    MessageEntity(
-                        "The file '" + filepath.name + "' has been received successfully!",
-                        doc_id,
-                    ),
-                    cls=MessageEncoder,
-                ),
-                mimetype="application/json;charset=utf-8",
-            ), 201
+                ), 404
+            return Response(json.dumps(data), mimetype="application/json;charset=utf-8")
+        return Response(
+            json.dumps(MessageEntity("Incorrect HTTP method"), cls=MessageEncoder),
+            mimetype="application/json;charset=utf-8",
+        ), 405
+
+    @staticmethod
+    def _make_conditional_response(request, cached_response: CachedResponse):
+        """Returns the response with its ETag and Last-Modified headers,
+        or a 304 response if the client already has it (If-None-Match, If-Modified-Since)"""
+        response = Response(cached_response.body, mimetype="application/json;charset=utf-8")
+        response.set_etag(cached_response.etag)
+        # The clients must revalidate the response, it changes until the end of the NER
+        response.cache_control.no_cache = True
+        if cached_response.last_modified is not None:
+            response.last_modified = cached_response.last_modified
+        return response.make_conditional(request)
 
-        # Else, it's a basic GET method
-        # Generate an index HTML page with an outstanding look & feel
-        return render_template("index.html", title="NER Web Service")
+    @staticmethod
+    def dumps_with_named_entities(data: dict, named_entities_json: str) -> str:
+        """Returns the JSON string of data, with the named entities already in JSON
+        The named entities are spliced at the end of the JSON object, without decoding them.
+        The output is the same as json.dumps() with the "named_entities" key last.
+        """
+        return json.dumps(data)[:-1] + ', "named_entities": ' + named_entities_json + "}"
 
     @staticmethod
     def get_document_metadata(request, doc_id: int):
         """Information about a document.
         GET method returns metadata, named entities and RDF triples about the document,
         specified by the ID parameter.
+        With the wait parameter (in seconds), the response waits for the end of the processing
+        of a PENDING document (long-poll), at most this time.
             See README.md for response format.
         Returns:
             flask.Response: standard flask HTTP response.
         """
         if request.method == "GET":
-            # Preparing the query for the ID
-            stmt = select(DocumentEntity).where(DocumentEntity.id == doc_id)
-            # Retreive the session
-            session = session_factory()
-            # Executing the query
-            result = session.execute(stmt)
-            # Parsing the result
-            for user_obj in result.scalars():
-                data = {}
-                data["id"] = user_obj.id
-                data["status"] = user_obj.status
-                data["uploaded_date"] = user_obj.uploaded_date
-                data["author"] = user_obj.author
-                data["creator"] = user_obj.creator
-                data["producer"] = user_obj.producer
-                data["subject"] = user_obj.subject
-                data["title"] = user_obj.title
-                data["number_of_pages"] = user_obj.number_of_pages
-                data["raw_info"] = user_obj.raw_info
-                if user_obj.named_entities is not None:
-                    try:
-                        data["named_entities"] = json.loads(user_obj.named_entities)
-                    except JSONDecodeError:
-                        data["named_entities"] = None
-                # Converting the object to JSON string
-                json_data = json.dumps(data)
-                # We leave the for and return the first element
-                # (cause "normaly", there is only one row)
-                return Response(json_data, mimetype="application/json;charset=utf-8")
-            # Else, no document found
-            return Response(
-                json.dumps(MessageEntity("No document found"), cls=MessageEncoder),
-                mimetype="application/json;charset=utf-8",
-            ), 404
+            wait = request.args.get("wait", type=float)
+            if wait is None and "wait" in request.args:
+                return Response(
+                    json.dumps(
+                        MessageEntity(f"Incorrect wait: {request.args['wait']}"),
+                        cls=MessageEncoder
+                    ),
+                    mimetype="application/json;charset=utf-8",
+                ), 400
+            cache = ResponseCache.get_instance(current_app.project_config)
+            cached_response = cache.get(("metadata", doc_id))
+            if cached_response is None and wait is not None and wait > 0:
+                try:
+                    Api._wait_while_pending(
+                        doc_id, min(wait, current_app.project_config.get_max_wait())
+                    )
+                except TooManySubscribersError:
+                    return Api._too_many_waiting_requests()
+                # The finished documents are cached by the other requests meanwhile
+                cached_response = cache.get(("metadata", doc_id))
+            if cached_response is None:
+                # Preparing the query for the ID, the deferred content is not read
+                stmt = select(DocumentEntity).where(DocumentEntity.id == doc_id)
+                # Retreive the session, it is closed at the end of the block
+                with session_scope() as session:
+                    # Executing the query
+                    user_obj = session.execute(stmt).scalars().first()
+                    # If no document found
+                    if user_obj is None:
+                        return Response(
+                            json.dumps(MessageEntity("No document found"), cls=MessageEncoder),
+                            mimetype="application/json;charset=utf-8",
+                        ), 404
+                    data = {}
+                    data["id"] = user_obj.id
+                    data["status"] = user_obj.status
+                    data["uploaded_date"] = user_obj.uploaded_date
+                    data["author"] = user_obj.author
+                    data["creator"] = user_obj.creator
+                    data["producer"] = user_obj.producer
+                    data["subject"] = user_obj.subject
+                    data["title"] = user_obj.title
+                    data["number_of_pages"] = user_obj.number_of_pages
+                    data["raw_info"] = user_obj.raw_info
+                    # The offset of the first character of each page, for /document/content
+                    data["page_offsets"] = None
+                    if user_obj.page_offsets is not None:
+                        data["page_offsets"] = json.loads(user_obj.page_offsets)
+                    if user_obj.named_entities is not None:
+                        # The named entities were serialized when the document was processed
+                        json_data = Api.dumps_with_named_entities(data, user_obj.named_entities)
+                    else:
+                        if user_obj.status in ("SUCCESS", "PARTIAL"):
+                            # Document processed without the serialized named entities
+                            data["named_entities"] = DocumentNamedEntity.find_named_entities(
+                                session, user_obj.id
+                            )
+                        # Converting the object to JSON string
+                        json_data = json.dumps(data, cls=NamedEntityEncoder)
+                    # The response is cached only if the document is finished
+                    cached_response = cache.put(
+                        ("metadata", doc_id), user_obj.status, json_data,
+                        ResponseCache.parse_date(user_obj.uploaded_date)
+                    )
+            return Api._make_conditional_response(request, cached_response)
         return Response(
             json.dumps(MessageEntity("Incorrect HTTP method"), cls=MessageEncoder),
             mimetype="application/json;charset=utf-8",
         ), 405
 
+    @staticmethod
+    def _too_many_waiting_requests():
+        """Returns the response of a request rejected because max_waiting_requests
+        requests are already waiting for status changes"""
+        return Api._message_response(
+            "Too many requests are waiting, please retry later", 503,
+            {"Retry-After": str(current_app.project_config.get_ner_retry_after())}
+        )
+
+    @staticmethod
+    def _wait_while_pending(doc_id: int, wait: float):
+        """Wait until the document is not PENDING anymore, at most wait seconds
+        The request is woken up by the StatusNotifier, without polling the database.
+        Raises:
+            TooManySubscribersError: if max_waiting_requests requests are already waiting.
+        """
+        notifier = StatusNotifier.get_instance()
+        # The request subscribes before reading the status, so no change is missed
+        subscriber = notifier.subscribe([doc_id])
+        try:
+            if DocumentEntity.find_statuses([doc_id]).get(doc_id) != "PENDING":
+                return
+            deadline = time.monotonic() + wait
+            status = "PENDING"
+            while status == "PENDING":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    _, status = subscriber.get(timeout=remaining)
+                except queue.Empty:
+                    return
+        finally:
+            notifier.unsubscribe(subscriber, [doc_id])
+
+    @staticmethod
+    def get_documents_events(request):
+        """Status changes of documents.
+        GET method returns a stream of server-sent events, with the status of each document
+        specified by the ids parameter, then each change of these statuses.
+        The stream ends when no document is PENDING anymore, or after the max_wait
+        of the config file.
+            See README.md for response format.
+        Returns:
+            flask.Response: standard flask HTTP response.
+        """
+        if request.method == "GET":
+            config = current_app.project_config
+            try:
+                doc_ids = list(dict.fromkeys(
+                    int(doc_id) for doc_id in request.args.get("ids", "").split(",")
+                ))
+            except ValueError:
+                return Response(
+                    json.dumps(
+                        MessageEntity("The ids parameter must be IDs separated by commas"),
+                        cls=MessageEncoder
+                    ),
+                    mimetype="application/json;charset=utf-8",
+                ), 400
+            if len(doc_ids) > config.get_max_batch_size():
+                return Response(
+                    json.dumps(
+                        MessageEntity(
+                            f"Too many documents, the maximum is {config.get_max_batch_size()}"
+                        ),
+                        cls=MessageEncoder
+                    ),
+                    mimetype="application/json;charset=utf-8",
+                ), 400
+
+            notifier = StatusNotifier.get_instance()
+            # The stream subscribes before reading the statuses, so no change is missed
+            try:
+                subscriber = notifier.subscribe(doc_ids)
+            except TooManySubscribersError:
+                return Api._too_many_waiting_requests()
+            response = Response(
+                Api._stream_status_events(subscriber, doc_ids, config.get_max_wait()),
+                mimetype="text/event-stream"
+            )
+            # The subscriber is removed even if the stream is closed before its start
+            response.call_on_close(lambda: notifier.unsubscribe(subscriber, doc_ids))
+            response.headers["Cache-Control"] = "no-cache"
+            # The events must not be buffered by a reverse proxy
+            response.headers["X-Accel-Buffering"] = "no"
+            return response
+        return Response(
+            json.dumps(MessageEntity("Incorrect HTTP method"), cls=MessageEncoder),
+            mimetype="application/json;charset=utf-8",
+        ), 405
+
+    @staticmethod
+    def _stream_status_events(subscriber: queue.SimpleQueue, doc_ids: list, max_wait: float):
+        """Generator of the server-sent events of the status of the documents,
+        from the queue subscribed to the StatusNotifier"""
+        statuses = DocumentEntity.find_statuses(doc_ids)
+        pending_ids = set()
+        for doc_id in doc_ids:
+            # The status of a document not found is null
+            status = statuses.get(doc_id)
+            yield Api._format_status_event(doc_id, status)
+            if status == "PENDING":
+                pending_ids.add(doc_id)
+
+        deadline = time.monotonic() + max_wait
+        while len(pending_ids) > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                doc_id, status = subscriber.get(
+                    timeout=min(remaining, Api.EVENTS_KEEP_ALIVE)
+                )
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if doc_id in pending_ids:
+                yield Api._format_status_event(doc_id, status)
+                if status != "PENDING":
+                    pending_ids.discard(doc_id)
+        yield "event: end\ndata: " + json.dumps({"pending": sorted(pending_ids)}) + "\n\n"
+
+    @staticmethod
+    def _format_status_event(doc_id: int, status: str) -> str:
+        """Returns the server-sent event of the status of a document"""
+        return "event: status\ndata: " + json.dumps({"id": doc_id, "status": status}) + "\n\n"
+
     @staticmethod
     def get_document_content(request, doc_id: int):
         """Content inside a document.
         GET method returns content about the document,
         specified by the ID parameter.
+        With the page parameter (numbered from 1), only this page is returned.
+        With the begin_offset and end_offset parameters, only this range of characters is
+        returned. A page or a range is cut by the database, the content is never fully loaded.
             See README.md for response format.
         Returns:
             flask.Response: standard flask HTTP response.
         """
         if request.method == "GET":
-            # Preparing the query for the ID
-            stmt = select(DocumentEntity).where(DocumentEntity.id == doc_id)
-            # Retreive the session
-            session = session_factory()
-            # Executing the query
-            result = session.execute(stmt)
-            # Parsing the result
-            for user_obj in result.scalars():
+            page = request.args.get("page", type=Api._positive_int)
+            begin_offset = request.args.get("begin_offset", type=Api._positive_int)
+            end_offset = request.args.get("end_offset", type=Api._positive_int)
+            # Flask returns None for the values which can't be converted, so we check them
+            for parameter, value in [("page", page), ("begin_offset", begin_offset),
+                                     ("end_offset", end_offset)]:
+                if value is None and parameter in request.args:
+                    return Response(
+                        json.dumps(
+                            MessageEntity(f"Incorrect {parameter}: {request.args[parameter]}"),
+                            cls=MessageEncoder
+                        ),
+                        mimetype="application/json;charset=utf-8",
+                    ), 400
+            if page is not None and (begin_offset is not None or end_offset is not None):
+                return Response(
+                    json.dumps(
+                        MessageEntity("The page and the range parameters are exclusive"),
+                        cls=MessageEncoder
+                    ),
+                    mimetype="application/json;charset=utf-8",
+                ), 400
+
+            if page is not None:
+                return Api._get_document_content_part(request, doc_id, ("page", page), page)
+            if begin_offset is not None or end_offset is not None:
+                begin_offset = begin_offset or 0
+                if end_offset is not None and end_offset < begin_offset:
+                    return Response(
+                        json.dumps(
+                            MessageEntity("The end_offset must be after the begin_offset"),
+                            cls=MessageEncoder
+                        ),
+                        mimetype="application/json;charset=utf-8",
+                    ), 400
+                return Api._get_document_content_part(
+                    request, doc_id, ("range", begin_offset, end_offset), None,
+                    begin_offset, end_offset
+                )
+
+            cache = ResponseCache.get_instance(current_app.project_config)
+            cached_response = cache.get(("content", doc_id))
+            if cached_response is None:
+                # The whole content is read from its blocks
+                part = DocumentEntity.find_content_part(doc_id)
+                # If no document found
+                if part is None:
+                    return Response(
+                        json.dumps(MessageEntity("No document found"), cls=MessageEncoder),
+                        mimetype="application/json;charset=utf-8",
+                    ), 404
                 data = {}
-                data["id"] = user_obj.id
-                data["content"] = user_obj.content
-                # Converting the object to JSON string
-                json_data = json.dumps(data)
-                # We leave the for and return the first element
-                # (cause "normaly", there is only one row)
-                return Response(json_data, mimetype="application/json;charset=utf-8")
-            # Else, no document found
-            return Response(
-                json.dumps(MessageEntity("No document found"), cls=MessageEncoder),
-                mimetype="application/json;charset=utf-8",
-            ), 404
+                data["id"] = doc_id
+                data["content"] = part["content"]
+                # The response is cached only if the document is finished
+                cached_response = cache.put(
+                    ("content", doc_id), part["status"], json.dumps(data),
+                    ResponseCache.parse_date(part["uploaded_date"])
+                )
+            return Api._make_conditional_response(request, cached_response)
+        return Response(
+            json.dumps(MessageEntity("Incorrect HTTP method"), cls=MessageEncoder),
+            mimetype="application/json;charset=utf-8",
+        ), 405
+
+    @staticmethod
+    def _positive_int(value: str) -> int:
+        """Converts a query parameter to a positive or zero integer"""
+        number = int(value)
+        if number < 0:
+            raise ValueError(f"{value} is negative")
+        return number
+
+    @staticmethod
+    def _get_document_content_part(request, doc_id: int, part_key: tuple, page: int = None,
+                                   begin_offset: int = 0, end_offset: int = None):
+        """Returns the response of a page or a range of the content of a document"""
+        cache = ResponseCache.get_instance(current_app.project_config)
+        cached_response = cache.get(("content", doc_id) + part_key)
+        if cached_response is None:
+            part = DocumentEntity.find_content_part(doc_id, page, begin_offset, end_offset)
+            if part is None:
+                message = "No document found" if page is None else "No page found"
+                return Response(
+                    json.dumps(MessageEntity(message), cls=MessageEncoder),
+                    mimetype="application/json;charset=utf-8",
+                ), 404
+            data = {}
+            data["id"] = doc_id
+            if page is not None:
+                data["page"] = page
+            data["begin_offset"] = part["begin_offset"]
+            data["end_offset"] = part["end_offset"]
+            data["content"] = part["content"]
+            # The response is cached only if the document is finished
+            cached_response = cache.put(
+                ("content", doc_id) + part_key, part["status"], json.dumps(data),
+                ResponseCache.parse_date(part["uploaded_date"])
+            )
+        return Api._make_conditional_response(request, cached_response)
+
+    @staticmethod
+    def search_entities(request):
+        """Search of a named entity in all the documents.
+        GET method returns the documents mentioning the named entity,
+        from the inverted index of the named entities, with a keyset pagination.
+            See README.md for response format.
+        Returns:
+            flask.Response: standard flask HTTP response.
+        """
+        if request.method == "GET":
+            text = request.args.get("text")
+            if text is None or text.strip() == "":
+                return Response(
+                    json.dumps(MessageEntity("The text parameter is missing"), cls=MessageEncoder),
+                    mimetype="application/json;charset=utf-8",
+                ), 400
+
+            # The filters must match with the enums of the named entities
+            filters = {}
+            for parameter, enum in [("type", NamedEntityTypeEnum),
+                                    ("relationship", NamedEntityRelationshipEnum),
+                                    ("score", NamedEntityScoreEnum)]:
+                filters[parameter] = request.args.get(parameter)
+                if filters[parameter] is not None and filters[parameter] not in enum.__members__:
+                    return Response(
+                        json.dumps(
+                            MessageEntity(f"Incorrect {parameter}: {filters[parameter]}"),
+                            cls=MessageEncoder
+                        ),
+                        mimetype="application/json;charset=utf-8",
+                    ), 400
+
+            try:
+                after = int(request.args.get("after", 0))
+                limit = min(max(int(request.args.get("limit", 100)), 1), 1000)
+            except ValueError as err:
+                return Response(
+                    json.dumps(MessageEntity(f"Incorrect pagination: {err}"), cls=MessageEncoder),
+                    mimetype="application/json;charset=utf-8",
+                ), 400
+
+            with session_scope() as session:
+                documents = NamedEntityIndex.search(
+                    session, text, filters["type"], filters["relationship"], filters["score"],
+                    after, limit
+                )
+
+            data = {}
+            data["text"] = text
+            data["documents"] = documents
+            # The id to use as "after" parameter for the next page, if the page is full
+            data["next"] = documents[-1]["id"] if len(documents) == limit else None
+            return Response(json.dumps(data), mimetype="application/json;charset=utf-8")
+        return Response(
+            json.dumps(MessageEntity("Incorrect HTTP method"), cls=MessageEncoder),
+            mimetype="application/json;charset=utf-8",
+        ), 405
+
+    @staticmethod
+    def get_metrics(request):
+        """Metrics of the web service.
+        GET method returns the runtime metrics of the web service.
+            See README.md for response format.
+        Returns:
+            flask.Response: standard flask HTTP response.
+        """
+        if request.method == "GET":
+            data = {}
+            data["spacy_models"] = SpacyModelRegistry.get_stats()
+            data["ner_worker_pool"] = NerWorkerPool.get_instance(
+                current_app.project_config
+            ).get_stats()
+            data["document_fetcher"] = DocumentFetcher.get_instance(
+                current_app.project_config
+            ).get_stats()
+            data["response_cache"] = ResponseCache.get_instance(
+                current_app.project_config
+            ).get_stats()
+            data["status_notifier"] = StatusNotifier.get_instance().get_stats()
+            # The limiters are shared by the NER processes, so their statistics too
+            data["rate_limiters"] = RateLimiter.get_all_stats()
+            # The sender is started by the first upload with a callback_url only
+            data["webhook_sender"] = WebhookSender.get_instance_stats()
+            # The statistics of the cache are shared by the NER processes too
+            ner_result_cache = NerResultCache.get_instance(current_app.project_config)
+            data["ner_result_cache"] = \
+                ner_result_cache.get_stats() if ner_result_cache is not None else None
+            return Response(json.dumps(data), mimetype="application/json;charset=utf-8")
         return Response(
             json.dumps(MessageEntity("Incorrect HTTP method"), cls=MessageEncoder),
             mimetype="application/json;charset=utf-8",
@@ -4,19 +4,96 @@ Authors: Jonathan CASSAING
 Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
 """
 
-import textwrap
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import NoCredentialsError, ClientError, EndpointConnectionError
 from web_service.entities.named_entity import NamedEntity, NamedEntityTypeEnum, NamedEntityScoreEnum
 from web_service.entities.named_entity import NamedEntityRelationshipEnum
-from .ner_interface import NerInterface
+from web_service.common.rate_limiter import RateLimiter
+from .ner_interface import NerInterface, IncompleteExtractionError
+from .ner_result_cache import NerResultCache
+from .text_chunker import ByteBudgetChunker
 
 class AwsComprehendNerService(NerInterface):
-    """NER Service from AWS Comprehend"""
+    """NER Service from AWS Comprehend
+    The texts are split in chunks of max_bytes_per_request UTF-8 bytes,
+    sent by batch (batch_detect_entities),
+    several batches at once, with the boto3 client of the process.
+    The requests are paced by a RateLimiter. The throttled requests and the transient errors
+    are retried, then the texts whose chunks still failed are reported as incomplete.
+    The chunks found in the NerResultCache are not sent.
+    """
 
-    def __init__(self, aws_region: str = "us-east-1", max_char_per_request: int = 4900):
+    # Maximum number of chunks of a batch_detect_entities request
+    BATCH_SIZE = 25
+    # Error codes of the throttled requests
+    THROTTLING_ERRORS = ("ThrottlingException", "TooManyRequestsException")
+    # Error codes of the transient errors, of a request or of a chunk of a batch
+    TRANSIENT_ERRORS = ("InternalServerException", "ServiceUnavailableException")
+    # Delay before the first retry of a transient error, doubled at each retry, in seconds
+    RETRY_DELAY = 0.5
+    # AWS doesn't give the version of its model, the cached chunks are kept by the LRU eviction
+    # only, change this version to ignore them
+    MODEL_VERSION = "batch_detect_entities-en-1"
+
+    # boto3 clients, by (process id, region), see get_client()
+    _clients = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, aws_region: str = "us-east-1", max_bytes_per_request: int = 4900,
+                 max_in_flight: int = 4, client=None, rate_limiter: RateLimiter = None,
+                 max_retries: int = 5, result_cache: NerResultCache = None):
+        """Initialize the object
+        Args:
+            aws_region (str): region of AWS Comprehend.
+            max_bytes_per_request (int): maximum number of UTF-8 bytes of a chunk,
+            the limit of AWS Comprehend is 5000 bytes.
+            max_in_flight (int): maximum number of concurrent requests.
+            client (botocore.client.Comprehend): client used for the requests,
+            the client of the process if None.
+            rate_limiter (RateLimiter): limiter of the requests,
+            the "aws-comprehend" limiter if None.
+            max_retries (int): maximum number of retries of a throttled or failed request.
+            result_cache (NerResultCache): cache of the named entities of the chunks,
+            no cache if None.
+        """
         self.aws_region = aws_region
-        self.max_char_per_request = max_char_per_request
+        self.chunker = ByteBudgetChunker(max_bytes_per_request)
+        self.max_in_flight = max(max_in_flight, 1)
+        self.client = client
+        self.rate_limiter = rate_limiter
+        if rate_limiter is None:
+            self.rate_limiter = RateLimiter.get_instance("aws-comprehend")
+        self.max_retries = max(max_retries, 0)
+        self.result_cache = result_cache
+
+    @classmethod
+    def get_client(cls, aws_region: str, max_in_flight: int = 4):
+        """Returns the boto3 client of the current process for a region
+        The client is created once, and its connections are reused by the next requests
+        (a boto3 client can be used by several threads, but not by several processes).
+        Args:
+            aws_region (str): region of AWS Comprehend.
+            max_in_flight (int): number of connections kept in the pool of the client.
+        """
+        key = (os.getpid(), aws_region)
+        with cls._clients_lock:
+            client = cls._clients.get(key)
+            if client is None:
+                client = boto3.client(
+                    service_name="comprehend", region_name=aws_region,
+                    config=BotoConfig(
+                        max_pool_connections=max(max_in_flight, 10),
+                        # The retries are done by the service, paced by its RateLimiter
+                        retries={"mode": "standard", "total_max_attempts": 1}
+                    )
+                )
+                cls._clients[key] = client
+            return client
 
     @staticmethod
     def _convert_type_to_type_enum(type_str: str) -> NamedEntityTypeEnum:
@@ -44,41 +121,198 @@ class AwsComprehendNerService(NerInterface):
             ne_type_enum = NamedEntityTypeEnum.OTHER
         return ne_type_enum
 
+    def _convert_entities(self, entities: list) -> list:
+        """Convert the AWS entities of a chunk to a list of NamedEntity,
+        located from the beginning of the chunk, without relationship"""
+        named_entities = []
+        for entity in entities:
+            named_entity = NamedEntity()
+            named_entity.text = entity["Text"]
+            named_entity.type = self._convert_type_to_type_enum(entity["Type"])
+            named_entity.begin_offset = entity["BeginOffset"]
+            named_entity.end_offset = entity["EndOffset"]
+            named_entity.aws_score = entity["Score"]
+            named_entity.score = NamedEntityScoreEnum.LOW
+            named_entities.append(named_entity)
+        return named_entities
+
     def extract(self: object, text: str,
                 relationship: NamedEntityRelationshipEnum = NamedEntityRelationshipEnum.QUOTED,
                 offset: int = 0):
-        # We split the text for each 'max_char_per_request' caracters
-        lines = textwrap.wrap(text, self.max_char_per_request, break_long_words=False)
+        return self.extract_batch([(text, relationship, offset)])[0]
 
-        # We init AWS Comprehend
-        comprehend = boto3.client(service_name='comprehend', region_name=self.aws_region)
+    def _send_request(self, comprehend, text_list: list):
+        """Send a batch_detect_entities request, paced by the limiter
+        Args:
+            comprehend (botocore.client.Comprehend): client used for the request.
+            text_list (list<str>): chunks of text, at most BATCH_SIZE.
+        Returns:
+            tuple: the AWS response, None if the request failed,
+            and the decision after a failure: "throttled" or "retry" to send the request again,
+            "stop" to give up, None if the request succeeded.
+        """
+        self.rate_limiter.acquire()
+        try:
+            # We launch an AWS request
+            data = comprehend.batch_detect_entities(TextList=text_list, LanguageCode='en')
+        except NoCredentialsError as err:
+            print(f"NoCredentialsError: Unable to locate AWS credentials; {err}")
+            self.rate_limiter.on_failure()
+            return None, "stop"
+        except EndpointConnectionError as err:
+            print(f"EndpointConnectionError: {err}")
+            self.rate_limiter.on_failure()
+            return None, "retry"
+        except ClientError as err:
+            code = err.response.get("Error", {}).get("Code")
+            if code in self.THROTTLING_ERRORS:
+                # The limiter slows down the next requests, including the retry
+                self.rate_limiter.on_throttle()
+                return None, "throttled"
+            print(f"ClientError: {err}")
+            self.rate_limiter.on_failure()
+            return None, "retry" if code in self.TRANSIENT_ERRORS else "stop"
 
-        named_entities = []
-        lines_offset = 0 + offset
-        for line in lines:
-            try:
-                # We launch an AWS request
-                data = comprehend.detect_entities(Text=line, LanguageCode='en')
-                # We create the entities
-                for entity in data["Entities"]:
-                    named_entity = NamedEntity()
-                    named_entity.text = entity["Text"]
-                    named_entity.type = self._convert_type_to_type_enum(entity["Type"])
-                    named_entity.begin_offset = entity["BeginOffset"] + lines_offset
-                    named_entity.end_offset = entity["EndOffset"] + lines_offset
-                    named_entity.aws_score = entity["Score"]
-                    named_entity.score = NamedEntityScoreEnum.LOW
-                    named_entity.relationship = relationship
-                    named_entities.append(named_entity)
-            except NoCredentialsError as err:
-                print(f"NoCredentialsError: Unable to locate AWS credentials; {err}")
-            except EndpointConnectionError as err:
-                print(f"EndpointConnectionError: {err}")
-            except ClientError as err:
-                print(f"ClientError: {err}")
-            lines_offset += len(line)
-
-        # We must sort the list by begin_offset
-        named_entities.sort(key=lambda named_entity: named_entity.begin_offset)
+        self.rate_limiter.on_success(sum(len(text.encode("utf-8")) for text in text_list))
+        return data, None
 
-        return named_entities
+    def _read_response(self, data: dict, pending: list, entities: list):
+        """Store the entities of the successful chunks of a response
+        Args:
+            data (dict): response of a batch_detect_entities request.
+            pending (list<int>): indexes of the chunks sent by the request.
+            entities (list<list<dict>>): the AWS entities of each chunk, updated.
+        Returns:
+            tuple: the sorted indexes of the throttled or failed chunks to send again,
+            and True if chunks were throttled.
+        """
+        for result in data["ResultList"]:
+            entities[pending[result["Index"]]] = result["Entities"]
+        failed = []
+        throttled = False
+        for error in data["ErrorList"]:
+            if error["ErrorCode"] in self.THROTTLING_ERRORS:
+                failed.append(pending[error["Index"]])
+                if not throttled:
+                    self.rate_limiter.on_throttle()
+                    throttled = True
+            elif error["ErrorCode"] in self.TRANSIENT_ERRORS:
+                failed.append(pending[error["Index"]])
+            else:
+                print(f"BatchItemError: {error['ErrorCode']}: {error['ErrorMessage']}")
+        return sorted(failed), throttled
+
+    def _detect_entities(self, comprehend, lines: list) -> list:
+        """Send a batch_detect_entities request, and retry the throttled or failed chunks
+        Args:
+            comprehend (botocore.client.Comprehend): client used for the request.
+            lines (list<str>): chunks of text, at most BATCH_SIZE.
+        Returns:
+            list<list<dict>>: the AWS entities of each chunk, in the same order,
+            None for the chunks which failed.
+        """
+        entities = [None for _ in lines]
+        # Indexes of the chunks to send
+        pending = list(range(len(lines)))
+        # The throttled requests are delayed by the limiter, the others by a backoff
+        throttled = False
+        for attempt in range(self.max_retries + 1):
+            if len(pending) == 0:
+                break
+            if attempt > 0 and not throttled:
+                time.sleep(self.RETRY_DELAY * 2 ** (attempt - 1))
+            data, decision = self._send_request(comprehend, [lines[index] for index in pending])
+            if decision == "stop":
+                break
+            throttled = decision == "throttled"
+            if data is not None:
+                pending, throttled = self._read_response(data, pending, entities)
+        return entities
+
+    def _extract_missing_chunks(self, chunks: list, chunks_named_entities: list,
+                                missing_chunks: list):
+        """Send the chunks missing from the cache, then cache the successful ones
+        Args:
+            chunks (list<tuple>): (index of the text, chunk, offset) of each chunk.
+            chunks_named_entities (list<list<NamedEntity>>): named entities of each chunk,
+            updated, None for the chunks which failed.
+            missing_chunks (list<int>): indexes of the chunks to send.
+        """
+        comprehend = self.client
+        if comprehend is None:
+            comprehend = self.get_client(self.aws_region, self.max_in_flight)
+
+        # The batches are sent concurrently, at most max_in_flight at once
+        batches = [
+            missing_chunks[begin:begin + self.BATCH_SIZE]
+            for begin in range(0, len(missing_chunks), self.BATCH_SIZE)
+        ]
+        with ThreadPoolExecutor(min(self.max_in_flight, len(batches))) as executor:
+            batches_entities = list(executor.map(
+                lambda batch: self._detect_entities(
+                    comprehend, [chunks[chunk_index][1] for chunk_index in batch]
+                ),
+                batches
+            ))
+
+        processed_chunks = []
+        for batch, batch_entities in zip(batches, batches_entities):
+            for chunk_index, entities in zip(batch, batch_entities):
+                # The named entities of a failed chunk are lost (None)
+                if entities is not None:
+                    chunks_named_entities[chunk_index] = self._convert_entities(entities)
+                    processed_chunks.append(chunk_index)
+        # Only the successful chunks are cached, before their named entities are moved
+        if self.result_cache is not None:
+            self.result_cache.put_many(
+                "aws-comprehend", self.MODEL_VERSION,
+                [chunks[chunk_index][1] for chunk_index in processed_chunks],
+                [chunks_named_entities[chunk_index] for chunk_index in processed_chunks]
+            )
+
+    def extract_batch(self: object, segments: list):
+        # We split each text in chunks of 'max_bytes_per_request' bytes, located in the text,
+        # the chunks of all the texts are sent together
+        chunks = []
+        for index, (text, _, offset) in enumerate(segments):
+            for chunk in self.chunker.iter_chunks(text):
+                # AWS Comprehend refuses the empty texts
+                if not chunk.text.isspace():
+                    chunks.append((index, chunk.text, chunk.begin_offset + offset))
+
+        # The chunks already processed are taken from the cache, the others are sent
+        chunks_named_entities = [None for _ in chunks]
+        if self.result_cache is not None:
+            chunks_named_entities = self.result_cache.get_many(
+                "aws-comprehend", self.MODEL_VERSION, [line for _, line, _ in chunks]
+            )
+        missing_chunks = [
+            chunk_index for chunk_index, named_entities in enumerate(chunks_named_entities)
+            if named_entities is None
+        ]
+
+        if len(missing_chunks) > 0:
+            self._extract_missing_chunks(chunks, chunks_named_entities, missing_chunks)
+
+        named_entities_list = [[] for _ in segments]
+        incomplete_segments = set()
+        for (index, _, chunk_offset), named_entities in zip(chunks, chunks_named_entities):
+            if named_entities is None:
+                # The named entities of this chunk are lost, the segment is incomplete
+                incomplete_segments.add(index)
+                continue
+            # The named entities are located in the full text
+            relationship = segments[index][1]
+            for named_entity in named_entities:
+                named_entity.begin_offset += chunk_offset
+                named_entity.end_offset += chunk_offset
+                named_entity.relationship = relationship
+            named_entities_list[index] += named_entities
+
+        # We must sort the lists by begin_offset
+        for named_entities in named_entities_list:
+            named_entities.sort(key=lambda named_entity: named_entity.begin_offset)
+
+        if len(incomplete_segments) > 0:
+            raise IncompleteExtractionError(named_entities_list, incomplete_segments)
+        return named_entities_list
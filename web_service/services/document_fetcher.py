@@ -0,0 +1,313 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import http.client
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+from werkzeug.utils import secure_filename
+from web_service.common.config import Config
+from .stream_saver import StreamSaver, FileTooLargeError
+
+class FetchError(OSError):
+    """Raised when a document can't be fetched (HTTP error, too many redirects...)"""
+
+class FetchTransport(ABC):
+    """Transport interface used by the DocumentFetcher to open the URLs"""
+
+    @abstractmethod
+    def open(self: object, url: str, timeout: float = 60):
+        """This function must send a GET request to the URL
+        Args:
+            url (str): URL of the document.
+            timeout (float): timeout of the socket operations, in seconds.
+        Returns:
+            file-like object: the response body, with a read(size) method, a headers attribute
+            (with a get(name) method) and a close() method, usable as a context manager.
+        Raises:
+            ValueError: if the URL is incorrect.
+            OSError: if the document can't be fetched."""
+
+    def get_stats(self: object) -> dict:
+        """Returns the statistics of the transport"""
+        return {}
+
+class _PooledResponse:
+    """Response of the PooledHttpTransport, which gives back its connection to the pool"""
+
+    def __init__(self: object, transport, key: tuple, connection, response):
+        self._transport = transport
+        self._key = key
+        self._connection = connection
+        self._response = response
+        self.status = response.status
+        self.headers = response.headers
+
+    def read(self, size: int = None) -> bytes:
+        """Read the response body"""
+        return self._response.read(size)
+
+    def close(self):
+        """Release the connection, it is kept alive if the body has been entirely read"""
+        if self._connection is None:
+            return
+        reusable = self._response.isclosed() and not self._response.will_close
+        if not reusable:
+            self._response.close()
+        self._transport.release(self._key, self._connection, reusable)
+        self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class PooledHttpTransport(FetchTransport):
+    """HTTP(S) transport with a pool of keep-alive connections per host,
+    and a maximum number of concurrent connections per host"""
+
+    # Status codes of the redirections followed by the transport
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+    def __init__(self: object, max_connections_per_host: int = 4, max_redirects: int = 5):
+        self.max_connections_per_host = max(max_connections_per_host, 1)
+        self.max_redirects = max_redirects
+        self._lock = threading.Lock()
+        # Idle connections, by (scheme, host, port)
+        self._idle_connections = {}
+        # Semaphore limiting the concurrent connections, by (scheme, host, port)
+        self._semaphores = {}
+        # Number of new and reused connections, by host
+        self._new_connections = {}
+        self._reused_connections = {}
+
+    def _acquire(self, key: tuple, timeout: float):
+        """Wait for a free slot for the host, then returns an idle connection, or None"""
+        with self._lock:
+            semaphore = self._semaphores.setdefault(
+                key, threading.BoundedSemaphore(self.max_connections_per_host)
+            )
+        if not semaphore.acquire(timeout=timeout):
+            raise TimeoutError(f"No connection available for the host {key[1]}")
+        with self._lock:
+            idle_connections = self._idle_connections.get(key, [])
+            return idle_connections.pop() if len(idle_connections) > 0 else None
+
+    def release(self, key: tuple, connection, reusable: bool):
+        """Give back a connection to the pool, or close it if it is not reusable"""
+        if reusable:
+            with self._lock:
+                self._idle_connections.setdefault(key, []).append(connection)
+        else:
+            connection.close()
+        self._semaphores[key].release()
+
+    def _count(self, counters: dict, host: str):
+        """Increment the counter of the host"""
+        with self._lock:
+            counters[host] = counters.get(host, 0) + 1
+
+    def _request(self, key: tuple, path: str, timeout: float,
+                 method: str = "GET", body: bytes = None, headers: dict = None):
+        """Send the request on an idle connection, or on a new one"""
+        headers = {"Connection": "keep-alive", **(headers or {})}
+        connection = self._acquire(key, timeout)
+        try:
+            if connection is not None:
+                try:
+                    connection.request(method, path, body, headers)
+                    response = connection.getresponse()
+                    self._count(self._reused_connections, key[1])
+                    return connection, response
+                except (http.client.HTTPException, ConnectionError):
+                    # The server closed the idle connection, we retry with a new one
+                    connection.close()
+
+            scheme, host, port = key
+            if scheme == "https":
+                connection = http.client.HTTPSConnection(host, port, timeout=timeout)
+            else:
+                connection = http.client.HTTPConnection(host, port, timeout=timeout)
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            self._count(self._new_connections, host)
+            return connection, response
+        except BaseException:
+            if connection is not None:
+                connection.close()
+            self._semaphores[key].release()
+            raise
+
+    @staticmethod
+    def _split_url(url: str):
+        """Returns the (scheme, host, port) key of the pool and the path of an URL"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or parts.hostname is None:
+            raise ValueError(f"unknown url type: {url!r}")
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        return (parts.scheme, parts.hostname, parts.port), path
+
+    def open(self: object, url: str, timeout: float = 60):
+        for _ in range(self.max_redirects + 1):
+            key, path = self._split_url(url)
+            connection, response = self._request(key, path, timeout)
+            pooled_response = _PooledResponse(self, key, connection, response)
+            if response.status in self.REDIRECT_STATUSES and response.getheader("Location"):
+                # We read the body, so the connection can be reused for the redirection
+                with pooled_response:
+                    pooled_response.read()
+                url = urljoin(url, response.getheader("Location"))
+                continue
+            if response.status >= 400:
+                with pooled_response:
+                    pooled_response.read()
+                raise FetchError(f"HTTP Error {response.status}: {response.reason}")
+            return pooled_response
+        raise FetchError(f"Too many redirections: {url}")
+
+    def post(self: object, url: str, body: bytes, content_type: str = "application/json",
+             timeout: float = 60) -> int:
+        """Send a POST request to the URL, on a pooled connection
+        The redirections are not followed, and the response body is ignored.
+        Args:
+            url (str): URL receiving the request.
+            body (bytes): body of the request.
+            content_type (str): type of the body.
+            timeout (float): timeout of the socket operations, in seconds.
+        Returns:
+            int: status code of the response.
+        Raises:
+            ValueError: if the URL is incorrect.
+            OSError: if the request can't be sent.
+        """
+        key, path = self._split_url(url)
+        connection, response = self._request(
+            key, path, timeout, "POST", body,
+            {"Content-Type": content_type, "Content-Length": str(len(body))}
+        )
+        with _PooledResponse(self, key, connection, response) as pooled_response:
+            # The body is read, so the connection can be reused
+            pooled_response.read()
+        return response.status
+
+    def get_stats(self: object) -> dict:
+        with self._lock:
+            return {
+                host: {
+                    "new_connections": self._new_connections.get(host, 0),
+                    "reused_connections": self._reused_connections.get(host, 0),
+                    "idle_connections": sum(
+                        len(connections) for key, connections in self._idle_connections.items()
+                        if key[1] == host
+                    )
+                }
+                for host in self._new_connections
+            }
+
+class DocumentFetcher:
+    """Download the remote documents in background threads, through a FetchTransport
+    The downloads don't block the request threads, fetch() returns a Future.
+    """
+
+    # Fetcher of the current process, see get_instance()
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self: object, upload_folder: Path, transport: FetchTransport = None,
+                 stream_saver: StreamSaver = None, max_workers: int = 8):
+        """Initialize the object
+        Args:
+            upload_folder (Path): folder where the documents are saved.
+            transport (FetchTransport): transport used to open the URLs,
+            a PooledHttpTransport if None.
+            stream_saver (StreamSaver): used to save the documents, with its size and time limits.
+            max_workers (int): maximum number of concurrent downloads.
+        """
+        self.upload_folder = Path(upload_folder)
+        self.transport = transport if transport is not None else PooledHttpTransport()
+        self.stream_saver = stream_saver if stream_saver is not None else StreamSaver()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="fetcher")
+        self._stats_lock = threading.Lock()
+        self._pending_downloads = 0
+        self._completed_downloads = 0
+        self._failed_downloads = 0
+
+    @classmethod
+    def get_instance(cls, config: Config):
+        """Returns the fetcher of the current process, configured at the first call"""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = DocumentFetcher(
+                    config.get_upload_temp_folder(),
+                    PooledHttpTransport(config.get_fetcher_connections_per_host()),
+                    StreamSaver(
+                        config.get_max_upload_size(),
+                        config.get_download_timeout(),
+                        config.get_download_chunk_size()
+                    ),
+                    config.get_fetcher_workers()
+                )
+            return cls._instance
+
+    @staticmethod
+    def get_filename(url: str) -> str:
+        """Returns the secured filename of an URL"""
+        return secure_filename(urlsplit(url).path.rsplit("/", 1).pop())
+
+    def fetch(self, url: str):
+        """Start the download of a document
+        Args:
+            url (str): URL of the document.
+        Returns:
+            concurrent.futures.Future: the result is a (filepath, content_hash) tuple,
+            or the exception raised by the download (ValueError, OSError, FileTooLargeError).
+        """
+        with self._stats_lock:
+            self._pending_downloads += 1
+        return self._executor.submit(self._download, url)
+
+    def _download(self, url: str):
+        """Download a document, in a background thread"""
+        try:
+            timeout = self.stream_saver.timeout
+            with self.transport.open(url, timeout) as response:
+                # We refuse a too large file before downloading it
+                content_length = response.headers.get("Content-Length")
+                if content_length is not None and content_length.isdigit() and \
+                   int(content_length) > self.stream_saver.max_size:
+                    raise FileTooLargeError(
+                        f"The file exceeds the maximum size of {self.stream_saver.max_size} bytes"
+                    )
+                # A unique prefix avoids the collisions between concurrent downloads
+                filepath = self.upload_folder.joinpath(
+                    uuid.uuid4().hex + "_" + self.get_filename(url)
+                )
+                content_hash = self.stream_saver.save(response, filepath)
+        except BaseException:
+            with self._stats_lock:
+                self._pending_downloads -= 1
+                self._failed_downloads += 1
+            raise
+        with self._stats_lock:
+            self._pending_downloads -= 1
+            self._completed_downloads += 1
+        return filepath, content_hash
+
+    def get_stats(self) -> dict:
+        """Returns the statistics of the downloads and of the connections"""
+        with self._stats_lock:
+            return {
+                "pending_downloads": self._pending_downloads,
+                "completed_downloads": self._completed_downloads,
+                "failed_downloads": self._failed_downloads,
+                "hosts": self.transport.get_stats()
+            }
@@ -7,8 +7,24 @@ Web service specialized in Named Entity Recognition (NER), in Natural Language P
 from abc import ABC, abstractmethod
 from web_service.entities.named_entity import NamedEntityRelationshipEnum
 
+class IncompleteExtractionError(Exception):
+    """Raised by a NER service when a part of some texts could not be processed
+    (after the retries), so their named entities are incomplete
+    Attributes:
+        named_entities_list (list<list<NamedEntity>>): named entities found in each segment.
+        incomplete_segments (set<int>): indexes of the incomplete segments.
+    """
+
+    def __init__(self: object, named_entities_list: list, incomplete_segments: set):
+        super().__init__(f"{len(incomplete_segments)} incomplete segments")
+        self.named_entities_list = named_entities_list
+        self.incomplete_segments = incomplete_segments
+
 class NerInterface(ABC):
-    """NER Interface for services"""
+    """NER Interface for services
+    The remote services, whose requests are limited in bytes, split the texts
+    with a ByteBudgetChunker, the local services with a TextChunker (see text_chunker).
+    """
 
     @abstractmethod
     def extract(self: object, text: str,
@@ -22,3 +38,20 @@ class NerInterface(ABC):
             offset (int): to set an offset for the named entity location, in the text
         Returns:
             list<NamedEntity>: list of the named entities, must be sorted by begin_offset."""
+
+    def extract_batch(self: object, segments: list):
+        """This function extracts named entities from several texts at once
+        The default implementation calls extract() for each text,
+        the services which can process several texts together should overwrite it.
+        Args:
+            segments (list<tuple>): list of (text, relationship, offset) tuples,
+            with the same meaning as the parameters of extract().
+        Returns:
+            list<list<NamedEntity>>: one list of named entities for each segment, in the same order,
+            each list must be sorted by begin_offset.
+        Raises:
+            IncompleteExtractionError: if some segments are incomplete."""
+        return [
+            self.extract(text, relationship, offset)
+            for text, relationship, offset in segments
+        ]
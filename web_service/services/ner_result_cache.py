@@ -0,0 +1,292 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from web_service.common.config import Config
+from web_service.entities.named_entity import NamedEntity, NamedEntityTypeEnum
+from web_service.entities.named_entity import NamedEntityScoreEnum
+
+class NerResultCache:
+    """Disk cache of the named entities of the chunks of text, with a LRU eviction
+    The papers share a lot of text (references, licences, versions of the same paper),
+    so the NER services look up their chunks before processing them. A chunk is identified
+    by the name of the service, the version of its model and the hash of its text.
+    Its named entities are stored located from the beginning of the chunk,
+    the services locate them in the full text (as for a processed chunk).
+    The cache is a SQLite database, separate from the database of the documents,
+    shared by the NER processes. The least recently used chunks are removed
+    when the cache exceeds its maximum size.
+    """
+
+    # Cache of the current process (and of its parent), see get_instance()
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    # Maximum number of keys of a query
+    QUERY_SIZE = 500
+    # The eviction removes the least recently used chunks down to this ratio of the max size
+    EVICTION_RATIO = 0.9
+
+    def __init__(self: object, path: Path = Path("instance/ner_cache.db"),
+                 max_size: int = 256 * 1024 * 1024, busy_timeout: float = 5):
+        """Initialize the object
+        Args:
+            path (Path): file of the SQLite database, created if needed.
+            max_size (int): maximum total size of the stored named entities, in bytes.
+            busy_timeout (float): maximum waiting time of a lock of the database, in seconds.
+        """
+        self.path = Path(path)
+        self.max_size = max_size
+        self.busy_timeout = busy_timeout
+        # Connection of the current process, see _connect()
+        self._connection = None
+        self._connection_pid = None
+        self._connection_lock = threading.Lock()
+        # The statistics are in shared memory, so the metrics include all the NER processes
+        self._stats_lock = multiprocessing.Lock()
+        self._lookups = multiprocessing.RawValue("q", 0)
+        self._hits = multiprocessing.RawValue("q", 0)
+        self._saved_bytes = multiprocessing.RawValue("q", 0)
+        self._errors = multiprocessing.RawValue("q", 0)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS ner_cache ("
+                "key BLOB PRIMARY KEY, named_entities BLOB NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ner_cache_last_used ON ner_cache (last_used)"
+            )
+            # Total size of the named entities, updated with the rows
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS ner_cache_size (total_size INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "INSERT INTO ner_cache_size SELECT total(size) FROM ner_cache "
+                "WHERE NOT EXISTS (SELECT * FROM ner_cache_size)"
+            )
+
+    @classmethod
+    def get_instance(cls, config: Config):
+        """Returns the cache of the current process, created at the first call,
+        None if the cache is disabled
+        Call it before the NER processes are forked, so they share the statistics.
+        """
+        if config.get_ner_cache_size() <= 0:
+            return None
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = NerResultCache(
+                    config.get_ner_cache_path(),
+                    config.get_ner_cache_size(),
+                    config.get_db_busy_timeout()
+                )
+            return cls._instance
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns the connection of the current process
+        A connection inherited from the parent process must not be used."""
+        if self._connection_pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, check_same_thread=False
+            )
+            # With the Write-Ahead Log, the readers are not blocked by the writer
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection_pid = os.getpid()
+            self._connection_lock = threading.Lock()
+        return self._connection
+
+    @staticmethod
+    def make_key(service: str, model_version: str, text: str) -> bytes:
+        """Returns the key of a chunk of text"""
+        return hashlib.sha256(
+            "\0".join([service, model_version, text]).encode("utf-8", "surrogatepass")
+        ).digest()
+
+    @staticmethod
+    def _dumps(named_entities: list) -> bytes:
+        """Returns the stored value of the named entities of a chunk"""
+        return json.dumps([
+            [
+                named_entity.text,
+                named_entity.type.value if named_entity.type is not None else None,
+                named_entity.begin_offset,
+                named_entity.end_offset,
+                named_entity.score.value if named_entity.score is not None else None,
+                named_entity.aws_score
+            ]
+            for named_entity in named_entities
+        ], separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    def _loads(value: bytes) -> list:
+        """Returns the named entities of a stored value, without relationship"""
+        return [
+            NamedEntity(
+                text,
+                NamedEntityScoreEnum(score) if score is not None else None,
+                aws_score,
+                NamedEntityTypeEnum(named_entity_type) if named_entity_type is not None else None,
+                begin_offset,
+                end_offset
+            )
+            for text, named_entity_type, begin_offset, end_offset, score, aws_score
+            in json.loads(value)
+        ]
+
+    def get_many(self, service: str, model_version: str, texts: list) -> list:
+        """Returns the cached named entities of some chunks of text
+        Args:
+            service (str): name of the NER service.
+            model_version (str): version of the model of the service.
+            texts (list<str>): text of each chunk.
+        Returns:
+            list<list<NamedEntity>>: the named entities of each chunk, located from
+            the beginning of the chunk, without relationship, None if the chunk is not cached.
+        """
+        keys = [self.make_key(service, model_version, text) for text in texts]
+        values = {}
+        try:
+            connection = self._connect()
+            with self._connection_lock, connection:
+                for begin in range(0, len(keys), self.QUERY_SIZE):
+                    query_keys = list(set(keys[begin:begin + self.QUERY_SIZE]))
+                    placeholders = ",".join("?" * len(query_keys))
+                    values.update(connection.execute(
+                        f"SELECT key, named_entities FROM ner_cache WHERE key IN ({placeholders})",
+                        query_keys
+                    ))
+                    # The hits become the most recently used chunks
+                    found_keys = [key for key in query_keys if key in values]
+                    if len(found_keys) > 0:
+                        connection.execute(
+                            "UPDATE ner_cache SET last_used = ? "
+                            f"WHERE key IN ({','.join('?' * len(found_keys))})",
+                            [time.time()] + found_keys
+                        )
+        except sqlite3.Error as err:
+            # The cache must never stop the NER, the chunks are processed
+            print(f"Error when reading the NER cache: {err}", file=sys.stderr)
+            self._count_error()
+
+        named_entities_list = [
+            self._loads(values[key]) if key in values else None for key in keys
+        ]
+        with self._stats_lock:
+            self._lookups.value += len(keys)
+            for text, named_entities in zip(texts, named_entities_list):
+                if named_entities is not None:
+                    self._hits.value += 1
+                    self._saved_bytes.value += len(text.encode("utf-8", "surrogatepass"))
+        return named_entities_list
+
+    def put_many(self, service: str, model_version: str, texts: list, named_entities_list: list):
+        """Store the named entities of some chunks of text, then evict the least recently
+        used chunks if the cache is too large
+        Args:
+            service (str): name of the NER service.
+            model_version (str): version of the model of the service.
+            texts (list<str>): text of each chunk.
+            named_entities_list (list<list<NamedEntity>>): named entities of each chunk,
+            located from the beginning of the chunk.
+        """
+        now = time.time()
+        rows = [
+            (self.make_key(service, model_version, text), self._dumps(named_entities))
+            for text, named_entities in zip(texts, named_entities_list)
+        ]
+        if len(rows) == 0:
+            return
+        try:
+            connection = self._connect()
+            with self._connection_lock, connection:
+                added_size = 0
+                for key, value in rows:
+                    cursor = connection.execute(
+                        "INSERT OR IGNORE INTO ner_cache VALUES (?, ?, ?, ?)",
+                        (key, value, len(value), now)
+                    )
+                    if cursor.rowcount == 1:
+                        added_size += len(value)
+                connection.execute(
+                    "UPDATE ner_cache_size SET total_size = total_size + ?", (added_size,)
+                )
+                total_size = connection.execute(
+                    "SELECT total_size FROM ner_cache_size"
+                ).fetchone()[0]
+                if total_size > self.max_size:
+                    self._evict(connection, total_size)
+        except sqlite3.Error as err:
+            print(f"Error when writing the NER cache: {err}", file=sys.stderr)
+            self._count_error()
+
+    def _evict(self, connection: sqlite3.Connection, total_size: int):
+        """Remove the least recently used chunks, in the transaction of the caller"""
+        target_size = self.max_size * self.EVICTION_RATIO
+        while total_size > target_size:
+            rows = connection.execute(
+                "SELECT key, size FROM ner_cache ORDER BY last_used LIMIT ?",
+                (self.QUERY_SIZE,)
+            ).fetchall()
+            if len(rows) == 0:
+                break
+            evicted_keys = []
+            evicted_size = 0
+            for key, size in rows:
+                if total_size - evicted_size <= target_size:
+                    break
+                evicted_keys.append(key)
+                evicted_size += size
+            connection.execute(
+                f"DELETE FROM ner_cache WHERE key IN ({','.join('?' * len(evicted_keys))})",
+                evicted_keys
+            )
+            connection.execute(
+                "UPDATE ner_cache_size SET total_size = total_size - ?", (evicted_size,)
+            )
+            total_size -= evicted_size
+
+    def _count_error(self):
+        """Count an error of the database"""
+        with self._stats_lock:
+            self._errors.value += 1
+
+    def get_stats(self) -> dict:
+        """Returns the hit ratio, the size of the texts not processed again, and the size
+        of the cache"""
+        with self._stats_lock:
+            lookups = self._lookups.value
+            hits = self._hits.value
+            stats = {
+                "lookups": lookups,
+                "hits": hits,
+                "hit_ratio": round(hits / lookups, 3) if lookups else 0,
+                "saved_bytes": self._saved_bytes.value,
+                "errors": self._errors.value
+            }
+        try:
+            connection = self._connect()
+            with self._connection_lock:
+                stats["chunks"] = connection.execute(
+                    "SELECT count(*) FROM ner_cache"
+                ).fetchone()[0]
+                stats["size"] = connection.execute(
+                    "SELECT total_size FROM ner_cache_size"
+                ).fetchone()[0]
+        except sqlite3.Error as err:
+            print(f"Error when reading the NER cache: {err}", file=sys.stderr)
+        stats["max_size"] = self.max_size
+        return stats
@@ -0,0 +1,83 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import resource
+import threading
+import time
+import spacy
+
+class SpacyModelRegistry:
+    """Process-wide registry of the loaded spaCy pipelines
+    Each pipeline is loaded only one time per process, without the components
+    which are not used by the NER, then it is warmed up.
+    Processes forked after the loading share the pipeline with the parent process.
+    """
+
+    # Text used to warm up a freshly loaded pipeline
+    WARMUP_TEXT = "Jonathan Cassaing works at the University of Paris since March 2022."
+
+    # Loaded pipelines, by (model name, excluded components)
+    _models = {}
+    # Loading statistics, by (model name, excluded components)
+    _stats = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _get_rss() -> int:
+        """Returns the resident memory of the current process, in bytes"""
+        try:
+            with open("/proc/self/statm", "r", encoding="utf-8") as file:
+                return int(file.read().split()[1]) * resource.getpagesize()
+        except (OSError, IndexError, ValueError):
+            # Not a Linux system, we fallback to the peak resident memory
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    @classmethod
+    def get(cls, model_name: str = "en_core_web_sm", excluded_components: list = None):
+        """Returns the pipeline of the model, the pipeline is loaded at the first call
+        Args:
+            model_name (str): name of the spaCy model to load.
+            excluded_components (list<str>): pipeline components not loaded,
+            because the NER doesn't need them (example: tagger, parser, lemmatizer).
+        Returns:
+            spacy.language.Language: the loaded pipeline.
+        """
+        # The same model without other components is another pipeline
+        key = (model_name, tuple(sorted(excluded_components or [])))
+        nlp = cls._models.get(key)
+        if nlp is not None:
+            return nlp
+
+        with cls._lock:
+            # Another thread may have loaded the model while we were waiting
+            nlp = cls._models.get(key)
+            if nlp is not None:
+                return nlp
+
+            rss_before = cls._get_rss()
+            start = time.perf_counter()
+            nlp = spacy.load(model_name, exclude=list(key[1]))
+            load_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            nlp(cls.WARMUP_TEXT)
+            warmup_time = time.perf_counter() - start
+
+            cls._stats[key] = {
+                "model_name": model_name,
+                "components": list(nlp.pipe_names),
+                "excluded_components": list(key[1]),
+                "load_time": round(load_time, 3),
+                "warmup_time": round(warmup_time, 3),
+                "memory_bytes": max(cls._get_rss() - rss_before, 0)
+            }
+            cls._models[key] = nlp
+            return nlp
+
+    @classmethod
+    def get_stats(cls) -> list:
+        """Returns the loading statistics of each loaded pipeline"""
+        return [dict(stats) for stats in cls._stats.values()]
@@ -4,14 +4,36 @@ Authors: Jonathan CASSAING
 Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
 """
 
-import spacy
 from web_service.entities.named_entity import NamedEntity, NamedEntityTypeEnum, NamedEntityScoreEnum
 from web_service.entities.named_entity import NamedEntityRelationshipEnum
 from .ner_interface import NerInterface
+from .ner_result_cache import NerResultCache
+from .spacy_model_registry import SpacyModelRegistry
+from .text_chunker import TextChunker
 
 class SpacyNerService(NerInterface):
     """NER Service from Spacy library"""
 
+    def __init__(self, model_name: str = "en_core_web_sm", excluded_components: list = None,
+                 max_chunk_size: int = 20000, chunk_overlap: int = 200, n_process: int = 1,
+                 result_cache: NerResultCache = None):
+        """Initialize the object
+        Args:
+            model_name (str): name of the spaCy model.
+            excluded_components (list<str>): pipeline components not loaded.
+            max_chunk_size (int): the texts are split in chunks of this maximum size,
+            it must be lower than the max_length of the spaCy pipeline.
+            chunk_overlap (int): number of characters shared by two consecutive chunks.
+            n_process (int): number of processes used to process the chunks of a text.
+            result_cache (NerResultCache): cache of the named entities of the chunks,
+            no cache if None.
+        """
+        self.model_name = model_name
+        self.excluded_components = excluded_components
+        self.chunker = TextChunker(max_chunk_size, chunk_overlap)
+        self.n_process = max(n_process, 1)
+        self.result_cache = result_cache
+
     @staticmethod
     def _convert_label_to_type_enum(label_: str) -> NamedEntityTypeEnum:
         """Convert a text label to NamedEntityTypeEnum
@@ -40,12 +62,8 @@ class SpacyNerService(NerInterface):
             type_enum = NamedEntityTypeEnum.OTHER
         return type_enum
 
-    def extract(self: object, text: str,
-                relationship: NamedEntityRelationshipEnum = NamedEntityRelationshipEnum.QUOTED,
-                offset: int = 0):
-        nlp = spacy.load("en_core_web_sm")
-        doc = nlp(text)
-
+    def _convert_doc(self, doc, relationship: NamedEntityRelationshipEnum, offset: int):
+        """Convert the entities of a spaCy Doc to a list of NamedEntity"""
         named_entities = []
 
         for ent in doc.ents:
@@ -65,3 +83,65 @@ class SpacyNerService(NerInterface):
             named_entities.append(named_entity)
 
         return named_entities
+
+    def _get_model_version(self, nlp) -> str:
+        """Returns the version of the pipeline, part of the keys of the cached chunks"""
+        excluded_components = " ".join(sorted(self.excluded_components or []))
+        return f"{nlp.meta.get('lang')}_{nlp.meta.get('name')}-{nlp.meta.get('version')}" \
+            f" excluding {excluded_components}"
+
+    def extract(self: object, text: str,
+                relationship: NamedEntityRelationshipEnum = NamedEntityRelationshipEnum.QUOTED,
+                offset: int = 0):
+        return self.extract_batch([(text, relationship, offset)])[0]
+
+    def extract_batch(self: object, segments: list):
+        # The pipeline is loaded only one time per process
+        nlp = SpacyModelRegistry.get(self.model_name, self.excluded_components)
+
+        # Each text is split in chunks, so a long text doesn't exceed the max_length
+        # of the pipeline, and its chunks can be processed in parallel
+        segments_chunks = [self.chunker.split(text) for text, _, _ in segments]
+        chunks = [chunk for segment_chunks in segments_chunks for chunk in segment_chunks]
+
+        # The chunks already processed are taken from the cache
+        chunks_named_entities = [None for _ in chunks]
+        if self.result_cache is not None:
+            model_version = self._get_model_version(nlp)
+            chunks_named_entities = self.result_cache.get_many(
+                "spacy", model_version, [chunk.text for chunk in chunks]
+            )
+        missing_chunks = [
+            index for index, named_entities in enumerate(chunks_named_entities)
+            if named_entities is None
+        ]
+
+        if len(missing_chunks) > 0:
+            # The other chunks go through the pipeline together,
+            # nlp.pipe() keeps the order, so each Doc matches with its chunk
+            docs = nlp.pipe(
+                (chunks[index].text for index in missing_chunks),
+                n_process=max(min(self.n_process, len(missing_chunks)), 1)
+            )
+            for index, doc in zip(missing_chunks, docs):
+                chunks_named_entities[index] = self._convert_doc(doc, None, 0)
+            # The named entities are cached before rebase(), which moves them
+            if self.result_cache is not None:
+                self.result_cache.put_many(
+                    "spacy", model_version,
+                    [chunks[index].text for index in missing_chunks],
+                    [chunks_named_entities[index] for index in missing_chunks]
+                )
+
+        named_entities_list = []
+        chunks_named_entities = iter(chunks_named_entities)
+        for segment_chunks, (_, relationship, offset) in zip(segments_chunks, segments):
+            segment_named_entities = [next(chunks_named_entities) for _ in segment_chunks]
+            for chunk_named_entities in segment_named_entities:
+                for named_entity in chunk_named_entities:
+                    named_entity.relationship = relationship
+            # The named entities of each chunk are located in the full text
+            named_entities_list.append(
+                self.chunker.rebase(segment_chunks, segment_named_entities, offset)
+            )
+        return named_entities_list
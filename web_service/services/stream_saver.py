@@ -0,0 +1,66 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import hashlib
+import time
+from pathlib import Path
+
+class FileTooLargeError(Exception):
+    """Raised when a stream exceeds the maximum file size"""
+
+class StreamSaver:
+    """Save a stream (uploaded file or HTTP response) to a file, chunk by chunk
+    The stream is never loaded entirely in memory, its size and duration are limited,
+    and its SHA-256 is computed on the fly.
+    """
+
+    def __init__(self: object, max_size: int = 100 * 1024 * 1024, timeout: float = 60,
+                 chunk_size: int = 64 * 1024):
+        """Initialize the object
+        Args:
+            max_size (int): maximum size of the file, in bytes.
+            timeout (float): maximum duration of the saving, in seconds.
+            chunk_size (int): size of the chunks read from the stream, in bytes.
+        """
+        self.max_size = max_size
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+
+    def save(self, stream, filepath: Path) -> str:
+        """Save the stream to a file
+        Args:
+            stream (file-like object): stream to read, with a read(size) method.
+            filepath (Path): file where to save the stream.
+        Returns:
+            str: SHA-256 of the file, in hexadecimal.
+        Raises:
+            FileTooLargeError: if the stream exceeds max_size.
+            TimeoutError: if the saving exceeds timeout.
+            OSError: if the file can't be written.
+            In all cases (and if the stream fails), the incomplete file is removed.
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        deadline = time.monotonic() + self.timeout
+        try:
+            with open(filepath, "wb") as file:
+                for chunk in iter(lambda: stream.read(self.chunk_size), b""):
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise FileTooLargeError(
+                            f"The file exceeds the maximum size of {self.max_size} bytes"
+                        )
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(
+                            f"The download exceeds the maximum duration of {self.timeout} seconds"
+                        )
+                    sha256.update(chunk)
+                    file.write(chunk)
+        # Any error of the stream too (a client disconnected during an upload...)
+        except Exception:
+            Path(filepath).unlink(missing_ok=True)
+            raise
+        return sha256.hexdigest()
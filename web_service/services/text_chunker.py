@@ -0,0 +1,171 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+class TextChunk:
+    """Part of a text, located in the full text"""
+    text: str
+    # Location of the chunk in the full text
+    begin_offset: int
+    end_offset: int
+    # Part of the chunk owned by this chunk (the overlaps are shared with the neighbours)
+    # Only the named entities starting in this part are kept
+    own_begin_offset: int
+    own_end_offset: int
+
+    def __init__(self: object, text: str, begin_offset: int, end_offset: int):
+        self.text = text
+        self.begin_offset = begin_offset
+        self.end_offset = end_offset
+        self.own_begin_offset = begin_offset
+        self.own_end_offset = end_offset
+
+class TextChunker:
+    """Split a text in overlapping chunks, on page or paragraph boundaries if possible
+    The named entities cut at the end of a chunk are found entirely in the next chunk,
+    thanks to the overlap, see rebase().
+    """
+
+    # Separators where to cut a chunk, by order of preference:
+    # page, paragraph, line, sentence, word
+    SEPARATORS = ["\f", "\n\n", "\n", ". ", " "]
+
+    def __init__(self: object, max_chunk_size: int = 20000, overlap: int = 200):
+        """Initialize the object
+        Args:
+            max_chunk_size (int): maximum number of characters of a chunk.
+            overlap (int): number of characters shared by two consecutive chunks,
+            it must be longer than twice the longest named entity.
+        """
+        self.max_chunk_size = max(max_chunk_size, 1)
+        self.overlap = min(max(overlap, 0), self.max_chunk_size // 2)
+
+    def _find_cut(self, text: str, begin: int, end: int) -> int:
+        """Returns the best location to cut the text between begin and end"""
+        # We don't cut in the first half of the chunk, to avoid tiny chunks
+        minimum = begin + (end - begin) // 2
+        for separator in self.SEPARATORS:
+            index = text.rfind(separator, minimum, end)
+            if index != -1:
+                # We cut after the separator
+                return index + len(separator)
+        return end
+
+    def split(self, text: str) -> list:
+        """Split the text in chunks
+        Args:
+            text (str): text to split.
+        Returns:
+            list<TextChunk>: the chunks, sorted by begin_offset.
+        """
+        chunks = []
+        begin = 0
+        while True:
+            if len(text) - begin <= self.max_chunk_size:
+                end = len(text)
+            else:
+                end = self._find_cut(text, begin, begin + self.max_chunk_size)
+            chunks.append(TextChunk(text[begin:end], begin, end))
+            if end >= len(text):
+                break
+
+            # The next chunk starts before the end of this chunk, at the beginning of a word
+            next_begin = max(end - self.overlap, begin + 1)
+            index = text.find(" ", next_begin, end)
+            begin = index + 1 if index != -1 else end
+
+        # Each chunk owns the first half of the overlap with the next chunk,
+        # and the next chunk owns the second half
+        for previous, chunk in zip(chunks, chunks[1:]):
+            middle = (chunk.begin_offset + previous.end_offset) // 2
+            previous.own_end_offset = middle
+            chunk.own_begin_offset = middle
+
+        return chunks
+
+    @staticmethod
+    def rebase(chunks: list, named_entities_per_chunk: list, offset: int = 0) -> list:
+        """Locate the named entities of each chunk in the full text
+        and remove the named entities found twice in the overlaps
+        Args:
+            chunks (list<TextChunk>): chunks returned by split().
+            named_entities_per_chunk (list<list<NamedEntity>>): named entities of each chunk,
+            located from the beginning of their chunk.
+            offset (int): offset of the full text.
+        Returns:
+            list<NamedEntity>: named entities located in the full text, sorted by begin_offset.
+        """
+        named_entities = []
+        for chunk, chunk_named_entities in zip(chunks, named_entities_per_chunk):
+            for named_entity in chunk_named_entities:
+                begin_offset = named_entity.begin_offset + chunk.begin_offset
+                # The named entities starting in the overlap are kept by only one chunk
+                if chunk.own_begin_offset <= begin_offset < chunk.own_end_offset:
+                    named_entity.begin_offset = begin_offset + offset
+                    named_entity.end_offset += chunk.begin_offset + offset
+                    named_entities.append(named_entity)
+        return named_entities
+
+class ByteBudgetChunker:
+    """Split a text in chunks of a maximum size in UTF-8 bytes, for the remote NER services
+    The remote services limit the size of their requests in bytes (5000 bytes for
+    AWS Comprehend), not in characters. The chunks are cut after a sentence if possible,
+    otherwise after a whitespace, and the text is never changed, so the offsets of a chunk
+    locate it exactly in the full text. The chunks don't overlap.
+    """
+
+    # Ends of sentence and of paragraph, where to cut a chunk first
+    SENTENCE_SEPARATORS = ["\f", "\n\n", ". ", "? ", "! ", ".\n"]
+    # Whitespaces, where to cut a chunk otherwise
+    WHITESPACES = [" ", "\n", "\t", "\r"]
+
+    def __init__(self: object, max_chunk_bytes: int = 4900):
+        """Initialize the object
+        Args:
+            max_chunk_bytes (int): maximum number of UTF-8 bytes of a chunk,
+            at least 4 (the longest UTF-8 character).
+        """
+        self.max_chunk_bytes = max(max_chunk_bytes, 4)
+
+    def _find_end(self, text: str, begin: int) -> int:
+        """Returns the end of the longest chunk starting at begin, within the byte budget"""
+        # A character is at least one byte, so the chunk has at most max_chunk_bytes characters
+        end = min(begin + self.max_chunk_bytes, len(text))
+        encoded = text[begin:end].encode("utf-8")
+        if len(encoded) <= self.max_chunk_bytes:
+            return end
+        # The bytes are cut at the budget, and the incomplete last character is dropped
+        return begin + len(encoded[:self.max_chunk_bytes].decode("utf-8", "ignore"))
+
+    def _find_cut(self, text: str, begin: int, end: int) -> int:
+        """Returns the best location to cut the text between begin and end"""
+        # We don't cut in the first half of the chunk, to avoid tiny chunks
+        minimum = begin + (end - begin) // 2
+        for separators in (self.SENTENCE_SEPARATORS, self.WHITESPACES):
+            # We cut after the last separator
+            cut = max(text.rfind(separator, minimum, end) + len(separator)
+                      for separator in separators)
+            if cut > minimum:
+                return cut
+        return end
+
+    def iter_chunks(self, text: str):
+        """Split the text in chunks, one chunk at a time
+        Args:
+            text (str): text to split.
+        Returns:
+            iterator<TextChunk>: the chunks, sorted by begin_offset, covering the whole text.
+        """
+        begin = 0
+        while begin < len(text):
+            end = self._find_end(text, begin)
+            if end < len(text):
+                end = self._find_cut(text, begin, end)
+            yield TextChunk(text[begin:end], begin, end)
+            begin = end
+
+    def split(self, text: str) -> list:
+        """Returns the list of the chunks of the text, see iter_chunks()"""
+        return list(self.iter_chunks(text))
@@ -0,0 +1,239 @@
+"""
+Name: arXiv Intelligence NER Web Service
+Authors: Jonathan CASSAING
+Web service specialized in Named Entity Recognition (NER), in Natural Language Processing (NLP)
+"""
+
+import heapq
+import ipaddress
+import json
+import queue
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from web_service.common.batching import iter_batches
+from web_service.common.config import Config
+from web_service.common.status_notifier import StatusNotifier
+from web_service.entities import DocumentEntity
+from .document_fetcher import PooledHttpTransport
+
+class WebhookSender:
+    """Send the completions of the documents (SUCCESS, PARTIAL or ERROR) to their callback_url
+    The sender listens to the StatusNotifier, so the writers of the statuses are never
+    delayed by the receivers. A background thread reads the callback_url of the completed
+    documents, then sends them by batch, one POST request per callback_url and per batch,
+    on the kept-alive connections of a PooledHttpTransport:
+
+        {"documents": [{"id": 1, "status": "SUCCESS"}, {"id": 2, "status": "ERROR"}]}
+
+    A failed request (network error, timeout, 408, 429 or 5xx status) is sent again later,
+    with an exponential backoff. A document may be sent several times, so the receivers
+    must ignore the documents already received.
+    """
+
+    # Sender of the current process, see get_instance()
+    _instance = None
+    _lock = threading.Lock()
+
+    # Statuses of the completed documents
+    COMPLETED_STATUSES = ("SUCCESS", "PARTIAL", "ERROR")
+    # Status codes of the failed requests sent again
+    RETRY_STATUSES = (408, 429)
+    # Maximum delay between two retries, in seconds
+    MAX_RETRY_DELAY = 300
+
+    def __init__(self: object, transport: PooledHttpTransport = None, batch_size: int = 100,
+                 batch_timeout: float = 1, timeout: float = 10, max_retries: int = 6,
+                 retry_delay: float = 1):
+        """Initialize the object
+        Args:
+            transport (PooledHttpTransport): transport used to send the requests,
+            a PooledHttpTransport if None.
+            batch_size (int): maximum number of documents sent in the same request.
+            batch_timeout (float): time the sender waits for more documents to fill a batch,
+            in seconds.
+            timeout (float): timeout of the requests, in seconds.
+            max_retries (int): maximum number of retries of a failed request.
+            retry_delay (float): delay before the first retry, doubled at each retry, in seconds.
+        """
+        self.transport = transport if transport is not None else PooledHttpTransport()
+        self.batch_size = max(batch_size, 1)
+        self.batch_timeout = batch_timeout
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        # Ids of the completed documents, a None id stops the sender
+        self._queue = queue.SimpleQueue()
+        # Failed requests waiting for their retry: (time, sequence, url, documents, attempt)
+        self._retries = []
+        self._sequence = 0
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._sent_requests = 0
+        self._sent_documents = 0
+        self._failed_requests = 0
+        self._retried_requests = 0
+        self._dropped_documents = 0
+
+    @classmethod
+    def get_instance(cls, config: Config):
+        """Returns the sender of the current process, started at the first call"""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = WebhookSender(
+                    PooledHttpTransport(config.get_fetcher_connections_per_host()),
+                    config.get_webhook_batch_size(),
+                    config.get_webhook_batch_timeout(),
+                    config.get_webhook_timeout(),
+                    config.get_webhook_max_retries(),
+                    config.get_webhook_retry_delay()
+                )
+                cls._instance.start()
+            return cls._instance
+
+    @staticmethod
+    def is_allowed_url(url: str, allowed_hosts: list = ()) -> bool:
+        """Returns True if the completions can be sent to a callback_url
+        The hosts of allowed_hosts are always allowed. The other hosts must resolve
+        to public addresses only, so a client can't make the service send requests
+        to the private network, the loopback or the link-local addresses.
+        Args:
+            url (str): callback_url given by a client.
+            allowed_hosts (list<str>): hosts allowed even if their addresses are not public.
+        """
+        hostname = urlsplit(url).hostname
+        if not hostname:
+            return False
+        if hostname in allowed_hosts:
+            return True
+        try:
+            addresses = socket.getaddrinfo(hostname, None, proto=socket.IPPROTO_TCP)
+        except (OSError, UnicodeError):
+            # Unknown host
+            return False
+        for _, _, _, _, sockaddr in addresses:
+            # The scope of an IPv6 address is ignored (fe80::1%eth0)
+            address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+            if not address.is_global or address.is_multicast:
+                return False
+        return True
+
+    @classmethod
+    def get_instance_stats(cls) -> dict:
+        """Returns the statistics of the sender of the current process, without starting it
+        Returns:
+            dict: see get_stats(), None if the sender is not started.
+        """
+        with cls._lock:
+            instance = cls._instance
+        return instance.get_stats() if instance is not None else None
+
+    def start(self):
+        """Start the thread of the sender, and listen to the status changes"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        StatusNotifier.get_instance().add_listener(self.on_status)
+
+    def stop(self, timeout: float = 10):
+        """Stop the sender, after the documents already completed
+        The requests waiting for a retry are dropped.
+        Args:
+            timeout (float): time to wait for the sender, in seconds.
+        """
+        StatusNotifier.get_instance().remove_listener(self.on_status)
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def on_status(self, object_id: int, status: str):
+        """Listener of the StatusNotifier, the completed documents are sent"""
+        if status in self.COMPLETED_STATUSES:
+            self._queue.put(object_id)
+
+    def get_stats(self) -> dict:
+        """Returns the number of requests and documents sent"""
+        with self._stats_lock:
+            return {
+                "sent_requests": self._sent_requests,
+                "sent_documents": self._sent_documents,
+                "failed_requests": self._failed_requests,
+                "retried_requests": self._retried_requests,
+                "waiting_retries": len(self._retries),
+                "dropped_documents": self._dropped_documents,
+                "hosts": self.transport.get_stats()
+            }
+
+    def _get_retry_timeout(self) -> float:
+        """Returns the time until the next retry, None if no request waits for a retry"""
+        if len(self._retries) == 0:
+            return None
+        return max(self._retries[0][0] - time.monotonic(), 0)
+
+    def _run(self):
+        """Main loop of the sender thread"""
+        # The sender wakes up for the completed documents and for the retries (empty batch),
+        # a None id stops it, after the current batch
+        for batch in iter_batches(
+                self._queue, self.batch_size, self.batch_timeout, self._get_retry_timeout):
+            if len(batch) > 0:
+                try:
+                    callbacks = DocumentEntity.find_callbacks(batch)
+                except Exception as err: # pylint: disable=broad-except
+                    print(f"Error when reading the callbacks: {err}", file=sys.stderr)
+                    callbacks = {}
+                # The documents are grouped by callback_url, one request per callback_url
+                documents_by_url = {}
+                for object_id in batch:
+                    if object_id in callbacks:
+                        status, url = callbacks[object_id]
+                        documents_by_url.setdefault(url, []).append(
+                            {"id": object_id, "status": status}
+                        )
+                for url, documents in documents_by_url.items():
+                    self._send(url, documents, 0)
+            # The retries whose time has come
+            while len(self._retries) > 0 and self._retries[0][0] <= time.monotonic():
+                _, _, url, documents, attempt = heapq.heappop(self._retries)
+                with self._stats_lock:
+                    self._retried_requests += 1
+                self._send(url, documents, attempt)
+
+        with self._stats_lock:
+            self._dropped_documents += sum(len(retry[3]) for retry in self._retries)
+        self._retries = []
+
+    def _send(self, url: str, documents: list, attempt: int):
+        """Send a request to a callback_url, or schedule its retry if it failed"""
+        body = json.dumps({"documents": documents}).encode("utf-8")
+        try:
+            status = self.transport.post(url, body, timeout=self.timeout)
+            error = None if status < 400 else f"HTTP Error {status}"
+            retry = status >= 500 or status in self.RETRY_STATUSES
+        # The exceptions of the transport are ValueError and OSError (including timeouts)
+        except OSError as err:
+            error = str(err)
+            retry = True
+        except ValueError as err:
+            error = str(err)
+            retry = False
+
+        with self._stats_lock:
+            if error is None:
+                self._sent_requests += 1
+                self._sent_documents += len(documents)
+                return
+            self._failed_requests += 1
+            if not retry or attempt >= self.max_retries:
+                self._dropped_documents += len(documents)
+        if retry and attempt < self.max_retries:
+            delay = min(self.retry_delay * 2 ** attempt, self.MAX_RETRY_DELAY)
+            self._sequence += 1
+            heapq.heappush(
+                self._retries,
+                (time.monotonic() + delay, self._sequence, url, documents, attempt + 1)
+            )
+        else:
+            print(f"Error when sending the completions to {url}: {error}", file=sys.stderr)